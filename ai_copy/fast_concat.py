@@ -0,0 +1,131 @@
+"""
+基于 ffmpeg 的快速拼接: 片段编码参数一致时直接流拷贝拼接, 只混入背景音乐, 不重新编码.
+
+流拷贝拼接后整条视频只有第一个片段的 avcC(SPS/PPS), 因此只有全部片段的编码参数(含 level、
+采样宽高比、时间基)完全一致时才流拷贝; 任一片段不一致时, 所有片段都用同一套 libx264 参数转码后再拼接.
+无法走快速路径时抛出 FastConcatError, 由调用方回退到 moviepy 全量重编码.
+"""
+import json
+import os
+import subprocess
+import tempfile
+from collections import Counter
+
+
+class FastConcatError(Exception):
+    """快速拼接不可用或失败"""
+
+
+def ffmpeg_binary():
+    binary = os.getenv("FFMPEG_BINARY")
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def ffprobe_binary():
+    return os.getenv("FFPROBE_BINARY", "ffprobe")
+
+
+def _run(cmd):
+    try:
+        completed = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    except OSError as e:
+        raise FastConcatError(f"cannot run {cmd[0]}: {e}")
+    if completed.returncode != 0:
+        raise FastConcatError(completed.stderr.decode('utf-8', 'ignore')[-2000:])
+    return completed.stdout
+
+
+def probe_video_stream(path):
+    """
+    读取首个视频流的编码参数
+    :return: dict(codec, profile, level, width, height, pix_fmt, sar, fps, time_base)
+    """
+    output = _run([ffprobe_binary(), '-v', 'error', '-select_streams', 'v:0',
+                   '-show_entries', 'stream=codec_name,profile,level,width,height,pix_fmt,sample_aspect_ratio,'
+                                    'r_frame_rate,time_base',
+                   '-of', 'json', path])
+    try:
+        streams = json.loads(output or b'{}').get('streams') or []
+    except (ValueError, AttributeError) as e:
+        raise FastConcatError(f"cannot parse ffprobe output for {path}: {e}")
+    if not streams:
+        raise FastConcatError(f"no video stream in {path}")
+    stream = streams[0]
+    return {
+        'codec': stream.get('codec_name'),
+        'profile': stream.get('profile'),
+        'level': stream.get('level'),
+        'width': stream.get('width'),
+        'height': stream.get('height'),
+        'pix_fmt': stream.get('pix_fmt'),
+        'sar': stream.get('sample_aspect_ratio'),
+        'fps': stream.get('r_frame_rate'),
+        'time_base': stream.get('time_base'),
+    }
+
+
+def _signature(params):
+    return tuple(params[k] for k in ('codec', 'profile', 'level', 'width', 'height', 'pix_fmt', 'sar', 'fps',
+                                     'time_base'))
+
+
+# 统一转码的固定参数; 同一组参数编码出的片段 SPS/PPS 和时间基一致, 可以流拷贝拼接
+NORMALIZE_TIMESCALE = 90000
+
+
+def _normalize(path, reference, output_path):
+    """按参考片段的分辨率和帧率, 用固定的 libx264 参数转码"""
+    cmd = [ffmpeg_binary(), '-y', '-v', 'error', '-i', path, '-an',
+           '-vf', f"scale={reference['width']}:{reference['height']},setsar=1,fps={reference['fps']}",
+           '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20', '-profile:v', 'high',
+           '-pix_fmt', 'yuv420p', '-video_track_timescale', str(NORMALIZE_TIMESCALE), output_path]
+    _run(cmd)
+    return output_path
+
+
+def concat_segments(video_paths, audio_path, output_path):
+    """
+    拼接片段并混入背景音乐(循环或截断到视频时长)
+    :return: dict(output_path, transcoded) transcoded 为转码过的片段下标, 参数全部一致时为空
+    """
+    if not video_paths:
+        raise FastConcatError("no segments")
+    params = [probe_video_stream(path) for path in video_paths]
+    signatures = [_signature(p) for p in params]
+    # 分辨率和帧率取多数片段的, 尽量少改变画面
+    reference_signature, _ = Counter(signatures).most_common(1)[0]
+    reference = params[signatures.index(reference_signature)]
+
+    work_dir = tempfile.mkdtemp(prefix='concat_')
+    try:
+        if len(set(signatures)) == 1:
+            inputs = list(video_paths)
+            transcoded = []
+        else:
+            inputs = [_normalize(path, reference, os.path.join(work_dir, f'segment_{i}.mp4'))
+                      for i, path in enumerate(video_paths)]
+            transcoded = list(range(len(video_paths)))
+
+        list_path = os.path.join(work_dir, 'inputs.txt')
+        with open(list_path, 'w') as f:
+            for path in inputs:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        _run([ffmpeg_binary(), '-y', '-v', 'error',
+              '-f', 'concat', '-safe', '0', '-i', list_path,
+              '-stream_loop', '-1', '-i', audio_path,
+              '-map', '0:v:0', '-map', '1:a:0',
+              '-c:v', 'copy', '-c:a', 'aac', '-shortest',
+              '-movflags', '+faststart', output_path])
+        return {'output_path': output_path, 'transcoded': transcoded}
+    finally:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
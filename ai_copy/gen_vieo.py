@@ -1,12 +1,19 @@
-from moviepy.editor import ImageClip,CompositeVideoClip,AudioFileClip,TextClip,concatenate_videoclips,VideoFileClip
-from utils import *
+from utils import (get_key_frames, keyframe_params, extract_representative_frames, send_video_generation_request,
+                   check_video_gen_status, call_multi_model_gpt, parse_json_response)
 import os
 import tempfile
 import requests
 import random
 import string
 import mimetypes
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
+from upload.uploadfile import get_uploader
+from http_client import get_http_client
+from ai_copy.media_cache import get_media_cache, content_digest
+from ai_copy import fast_concat
+from concurrency import run_cpu_bound
 
 
 def get_file_extension_from_content(response: requests.Response) -> str:
@@ -30,43 +37,62 @@ def generate_unique_path(extension: str) -> str:
     return os.path.join(unique_folder, generate_random_filename(extension))
 
 
-def download_video(video_url: str) -> str:
-    """下载视频并返回唯一的本地路径"""
-    response = requests.get(video_url, stream=True)
+def download_video(video_url: str, use_cache: bool = True) -> str:
+    """下载视频并返回本地路径
+    use_cache 为 True 时返回媒体缓存中的文件(调用方不要删除), 否则下载到新的唯一路径
+    """
+    if use_cache:
+        return get_media_cache().fetch(video_url)
+    response = get_http_client().get(video_url, stream=True, timeout=(10, 300))
     response.raise_for_status()
 
     file_extension = get_file_extension_from_content(response)
     video_path = generate_unique_path(file_extension)
 
     with open(video_path, "wb") as video_file:
-        for chunk in response.iter_content(chunk_size=8192):
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
             video_file.write(chunk)
 
     return video_path
 
-def get_key_images(video_url: str) -> List[str]:
-    """输入视频 URL，返回关键帧图片的 URL 列表"""
+def get_key_images(video_url: str, cache=None, refresh: bool = False, ttl=None, **frame_params) -> List[str]:
+    """输入视频 URL，返回关键帧图片的 URL 列表
+    cache: 可选的 KeyframeCache, 按来源URL或视频内容哈希 + 提取参数复用已上传的关键帧
+    refresh: 为 True 时忽略缓存重新提取并覆盖缓存
+    ttl: 写入缓存的有效期(秒), 不超过 keyframe_cache.DEFAULT_TTL
+    frame_params: 透传给 get_key_frames 的 mode/downscale/frame_skip/detector
+    """
+    params = keyframe_params(**frame_params)
+    if cache is not None and not refresh:
+        cached = cache.get_by_url(video_url, params)
+        if cached is not None:
+            return cached
+
+    video_folder_path = ''
     try:
-        # 1. 下载视频
+        # 1. 下载视频(走媒体缓存, 文件由缓存淘汰)
         video_path = download_video(video_url)
-
-        # 2. 提取关键帧
-        video_folder_path = get_key_frames(video_path)
-
-        # 3. 遍历关键帧并上传
-        image_urls = []
-        for img_name in sorted(os.listdir(video_folder_path)):
-            img_path = os.path.join(video_folder_path, img_name)
-            json_data = upload_file(img_path)
-            img_url = json_data["preview_url"]
-            image_urls.append(img_url)
-
+        content_hash = content_digest(video_path)
+        if cache is not None and not refresh:
+            # 不同 URL 相同内容
+            cached = cache.get_by_content(content_hash, params)
+            if cached is not None:
+                cache.remember_url(video_url, content_hash, params)
+                return cached
+
+        # 2. 提取关键帧, 输出到独立目录避免同一视频的并发请求互相覆盖; 场景检测不占用 gevent hub
+        video_folder_path = run_cpu_bound(get_key_frames, video_path, output_dir=tempfile.mkdtemp(prefix='scenes_'),
+                                          **params)
+
+        # 3. 并发上传关键帧, 结果保持场景顺序
+        results = get_uploader().upload_directory(video_folder_path)
+        image_urls = [result["preview_url"] for result in results]
+        if cache is not None:
+            cache.put(video_url, content_hash, params, image_urls, ttl)
         return image_urls
     finally:
         # 4. 清理临时文件
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        if os.path.exists(video_folder_path):
+        if video_folder_path and os.path.exists(video_folder_path):
             for img_name in os.listdir(video_folder_path):
                 os.remove(os.path.join(video_folder_path, img_name))
             os.rmdir(video_folder_path)
@@ -91,25 +117,22 @@ def get_task_id(task_id):
             video_url = check_res[0]['url']
     return video_url
 
-def merge_videos(video_urls, product_info):
-    """合并视频,返回一个视频url
-    video_urls: 视频链接url列表
-    """
-    # 1.先下载所有视频片段到本地
-    video_paths = []
-    for video_url in video_urls:
-        video_paths.append(download_video(video_url))
+def _report(progress, stage):
+    """通知调用方进入新的处理阶段(progress 为空时忽略)"""
+    if progress is not None:
+        progress(stage)
+
 
+def _reencode_merge(video_paths, audio_path, final_video_path):
+    """用 moviepy 解码全部片段并以 libx264 重新编码整条时间线"""
+    # moviepy 导入较慢, 只在需要重新编码时导入
+    from moviepy.editor import AudioFileClip, concatenate_videoclips, VideoFileClip
     video_clips = []
     for video_path in video_paths:
         video_clip = VideoFileClip(video_path)
         video_clips.append(video_clip)
     final_clip = concatenate_videoclips(video_clips)
-
-    # 获取bgm
-    audio_names=os.listdir('tmp_audios')
-    audio_path_list=[os.path.join('tmp_audios',audio_name) for audio_name in audio_names]
-    audio_clip=AudioFileClip(random.choice(audio_path_list))
+    audio_clip=AudioFileClip(audio_path)
 
     # 处理音频和视频时长不一致的情况
     video_duration = final_clip.duration
@@ -129,52 +152,94 @@ def merge_videos(video_urls, product_info):
     final_clip=final_clip.set_audio(audio_clip)
 
     # 保存最终的视频
-    final_video_path = generate_unique_path(".mp4")
     final_clip.write_videofile(final_video_path, codec="libx264", fps=24)
+
+
+def _title_from_segments(product_info, video_paths, keyframe_urls=None, refresh=False):
+    """用各片段的代表帧(或已有的关键帧URL)生成标题, 不依赖合成后的视频"""
+    if keyframe_urls:
+        return get_video_title(product_info, image_urls=keyframe_urls, refresh=refresh)
+    frame_dir = tempfile.mkdtemp(prefix='title_frames_')
+    try:
+        image_paths = run_cpu_bound(extract_representative_frames, video_paths, frame_dir)
+        return get_video_title(product_info, image_paths=image_paths, refresh=refresh)
+    finally:
+        shutil.rmtree(frame_dir, ignore_errors=True)
+
+
+def merge_videos(video_urls, product_info, progress=None, keyframe_urls=None, refresh_titles=False):
+    """合并视频,返回一个视频url
+    video_urls: 视频链接url列表
+    progress: 可选回调,依次以 download/concat/encode/upload/title 阶段名调用;
+              concat 为 ffmpeg 快速拼接, encode 为 moviepy 重新编码(MERGE_MODE=reencode 或快速拼接失败时), 各自包住实际耗时
+    keyframe_urls: 可选, 片段已有的关键帧图片URL, 传入时直接用于标题生成
+    refresh_titles: 为 True 时忽略标题缓存重新生成
+    """
+    # 1.先下载所有视频片段到本地
+    _report(progress, 'download')
+    video_paths = get_media_cache().fetch_many(video_urls)
+
+    # 标题生成与编码、上传并行, 总耗时为两者的较大值
+    title_executor = ThreadPoolExecutor(max_workers=1)
+    title_future = title_executor.submit(_title_from_segments, product_info, video_paths, keyframe_urls,
+                                         refresh_titles)
+    title_executor.shutdown(wait=False)
+
+    # 获取bgm
+    audio_names=os.listdir('tmp_audios')
+    audio_path_list=[os.path.join('tmp_audios',audio_name) for audio_name in audio_names]
+    audio_path = random.choice(audio_path_list)
+
+    final_video_path = generate_unique_path(".mp4")
+    merge_mode = os.getenv("MERGE_MODE", "auto")
+    merged = False
+    if merge_mode != 'reencode':
+        # 片段参数全部一致时流拷贝拼接, 否则所有片段统一转码后拼接
+        _report(progress, 'concat')
+        try:
+            fast_concat.concat_segments(video_paths, audio_path, final_video_path)
+            merged = True
+        except fast_concat.FastConcatError as e:
+            print(f"fast concat unavailable, fall back to re-encode: {e}")
+    if not merged:
+        _report(progress, 'encode')
+        _reencode_merge(video_paths, audio_path, final_video_path)
+
     # 上传到文件服务器
+    _report(progress, 'upload')
     json_data = upload_file(final_video_path)
-    titles = get_video_title(product_info, final_video_path)
+    _report(progress, 'title')
+    titles = title_future.result()
     preview_url = json_data["preview_url"]
     video_url = json_data["url"]
 
     return {'video_url': video_url, 'preview_url': preview_url, 'titles': titles}
 
 
-def get_video_title(product_info, video_path):
-    frame_folder_path = get_key_frames(video_path)
-    # 展示关键帧
-    scene_images = os.listdir(frame_folder_path)
-    scene_images.sort()
-    image_paths = [os.path.join(frame_folder_path, frame_name) for frame_name in scene_images]
+def get_video_title(product_info, video_path=None, image_paths=None, image_urls=None, use_cache=True, refresh=False):
+    """生成广告标题
+    图片来源优先级: image_urls(关键帧URL) > image_paths(本地帧) > 对 video_path 做场景检测
+    相同产品信息和图片内容的结果会被缓存, use_cache/refresh 见 call_multi_model_gpt
+    """
+    if image_urls:
+        images, image_mode = image_urls, 'url'
+    else:
+        if image_paths is None:
+            frame_folder_path = run_cpu_bound(get_key_frames, video_path)
+            # 展示关键帧
+            scene_images = os.listdir(frame_folder_path)
+            scene_images.sort()
+            image_paths = [os.path.join(frame_folder_path, frame_name) for frame_name in scene_images]
+        images, image_mode = image_paths, 'local_path'
     # 结合用户输入的产品信息，组织prompt
     prompt_tmp = open("prompts/prompt_title_generation.txt").read()
     prompt = prompt_tmp.replace('aaaaa', product_info)
 
     # 调用gpt，产生标题信息
-    raw_title_res = call_multi_model_gpt(prompt, image_paths, image_mode='local_path')
+    raw_title_res = call_multi_model_gpt(prompt, images, image_mode=image_mode, use_cache=use_cache, refresh=refresh)
     title_res = parse_json_response(raw_title_res)
     return title_res['广告标题']
 
-def upload_file(img_path):
-    from io import BytesIO
-    from flask import current_app
-
-    with open(img_path, "rb") as f:
-        file_data = f.read()
-
-    # 使用 Flask `test_client()` 直接调用 API
-    with current_app.test_client() as client:
-        response = client.post(
-            "/api/upload/file",
-            data={"file": (BytesIO(file_data), img_path.split("/")[-1])},
-            content_type="multipart/form-data"
-        )
-
-    # 确保返回的是 JSON
-    return response.get_json()
-
-
-
-
-
-
+def upload_file(file_path):
+    """直接上传本地文件到对象存储, 返回 dict(url, preview_url, object_name)"""
+    return get_uploader().upload_path(file_path)
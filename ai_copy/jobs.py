@@ -0,0 +1,348 @@
+"""
+后台任务引擎: 把耗时的视频合成放到进程池中执行.
+
+提交接口立即返回 job_id, 任务状态与各阶段耗时持久化在 video_jobs 表中.
+应用启动时由 start_recovery 启动后台线程, 立即并按 JOB_RECOVERY_INTERVAL 周期性地把中断的任务重新排队、
+分发排队中的任务, 进程重启后遗留的任务不必等待新的提交.
+执行中的任务每 JOB_HEARTBEAT_INTERVAL 秒刷新 updated_at, 超过 stale_after 未刷新才视为中断.
+"""
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+
+# 子进程内使用的数据库连接, 由 _init_worker 初始化
+_worker_db = None
+
+
+def _init_worker():
+    """
+    进程池子进程初始化: 加载配置并创建独立的数据库连接池, 不导入 api 模块;
+    LLM_CACHE_BACKEND=mysql 时大模型缓存使用该连接池, 与 API 进程共享缓存
+    """
+    global _worker_db
+    from dotenv import load_dotenv
+    load_dotenv()
+    from db.db import DBManager
+    _worker_db = DBManager(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT", 3306)),
+                           user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+                           database=os.getenv("DB_DATABASE"), pool_size=3)
+    if os.getenv("LLM_CACHE_BACKEND") == "mysql":
+        from llm_cache import configure_llm_cache, create_cache
+        configure_llm_cache(create_cache("mysql", _worker_db))
+
+
+class _StageTracker:
+    """记录任务所处阶段和每个阶段的耗时, 并实时写回数据库"""
+
+    def __init__(self, db, job_id):
+        self.db = db
+        self.job_id = job_id
+        self.stages = {}
+        self.current = None
+        self.started = None
+
+    def enter(self, stage):
+        now = time.time()
+        self._close(now)
+        self.current = stage
+        self.started = now
+        self.stages[stage] = {'status': STATUS_RUNNING, 'duration': None}
+        self._save()
+
+    def finish(self, status=STATUS_SUCCEEDED):
+        self._close(time.time(), status)
+        self._save()
+
+    def durations(self):
+        return {stage: info['duration'] for stage, info in self.stages.items() if info['duration'] is not None}
+
+    def _close(self, now, status=STATUS_SUCCEEDED):
+        if self.current is not None:
+            self.stages[self.current] = {'status': status, 'duration': round(now - self.started, 3)}
+            self.current = None
+
+    def _save(self):
+        self.db.execute(
+            "UPDATE video_jobs SET stage = %s, stages = %s WHERE job_id = %s",
+            (self.current, json.dumps(self.stages), self.job_id))
+
+
+class _Heartbeat:
+    """
+    任务执行期间每 interval 秒刷新 updated_at; 单个阶段(如编码、标题生成)耗时再长,
+    其他进程的恢复线程也不会把仍在执行的任务当作中断重新排队
+    """
+
+    def __init__(self, db, job_id, interval):
+        self.db = db
+        self.job_id = job_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='job-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.db.execute("UPDATE video_jobs SET updated_at = NOW() WHERE job_id = %s AND status = %s",
+                                (self.job_id, STATUS_RUNNING))
+            except Exception as e:
+                print(f"job {self.job_id} heartbeat failed: {e}")
+
+
+def _handle_merge_videos(payload, tracker):
+    from ai_copy import gen_vieo
+    return gen_vieo.merge_videos(payload['video_fragments_urls'], payload['product_info'],
+                                 progress=tracker.enter, keyframe_urls=payload.get('keyframe_urls'),
+                                 refresh_titles=bool(payload.get('refresh_titles')))
+
+
+# 任务类型 -> 处理函数
+JOB_HANDLERS = {
+    'merge_videos': _handle_merge_videos,
+}
+
+
+class _NoopTracker:
+    """同步执行时不记录阶段"""
+
+    def enter(self, stage):
+        pass
+
+
+def _run_inline(job_type, payload):
+    """在子进程中直接执行处理函数, 不写 video_jobs; 结果经由 future 返回给同步请求"""
+    return JOB_HANDLERS[job_type](payload, _NoopTracker())
+
+
+def _run_job(job_id):
+    """在子进程中执行任务; 通过条件更新抢占任务, 避免多个进程重复执行"""
+    db = _worker_db
+    claimed = db.execute(
+        "UPDATE video_jobs SET status = %s, started_at = NOW(), attempts = attempts + 1 "
+        "WHERE job_id = %s AND status = %s",
+        (STATUS_RUNNING, job_id, STATUS_QUEUED))
+    if not claimed:
+        return {'job_id': job_id, 'skipped': True}
+
+    row = db.fetch_one("SELECT job_type, payload FROM video_jobs WHERE job_id = %s", (job_id,))
+    tracker = _StageTracker(db, job_id)
+    try:
+        handler = JOB_HANDLERS[row['job_type']]
+        with _Heartbeat(db, job_id, float(os.getenv("JOB_HEARTBEAT_INTERVAL", 60))):
+            result = handler(json.loads(row['payload']), tracker)
+        tracker.finish()
+        db.execute(
+            "UPDATE video_jobs SET status = %s, result = %s, finished_at = NOW() WHERE job_id = %s",
+            (STATUS_SUCCEEDED, json.dumps(result, ensure_ascii=False), job_id))
+        status = STATUS_SUCCEEDED
+    except Exception as e:
+        traceback.print_exc()
+        tracker.finish(STATUS_FAILED)
+        db.execute(
+            "UPDATE video_jobs SET status = %s, error = %s, finished_at = NOW() WHERE job_id = %s",
+            (STATUS_FAILED, str(e), job_id))
+        status = STATUS_FAILED
+    return {'job_id': job_id, 'status': status, 'stages': tracker.durations()}
+
+
+def _fmt_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+class JobManager:
+    """
+    任务管理器: 持久化任务并分发到有界进程池.
+    """
+
+    def __init__(self, db_manager, max_workers=2, stale_after=3600, mp_context='spawn', recovery_interval=60,
+                 sync_workers=2):
+        """
+        :param db_manager: DBManager 实例
+        :param max_workers: 进程池大小
+        :param sync_workers: 同步任务(run)进程池大小, 与后台任务分开, 同步请求不在排队任务后等待
+        :param stale_after: running 状态超过该秒数未更新(阶段切换或心跳)视为进程已退出, 重新排队;
+                            需明显大于 JOB_HEARTBEAT_INTERVAL
+        :param mp_context: 多进程启动方式, 默认 spawn 避免继承父进程的数据库连接
+        :param recovery_interval: 后台恢复线程的检查间隔(秒)
+        """
+        self.db_manager = db_manager
+        self.max_workers = max_workers
+        self.stale_after = stale_after
+        self.mp_context = mp_context
+        self.recovery_interval = recovery_interval
+        self.sync_workers = sync_workers
+        self._executor = None
+        self._sync_executor = None
+        self._recovery_thread = None
+        self._lock = threading.Lock()
+        self._inflight = set()
+        self._stage_stats = {}
+        self._finished = {STATUS_SUCCEEDED: 0, STATUS_FAILED: 0}
+
+    def _new_executor(self, max_workers):
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(self.mp_context),
+                                   initializer=_init_worker)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor(self.max_workers)
+            return self._executor
+
+    def _get_sync_executor(self):
+        with self._lock:
+            if self._sync_executor is None:
+                self._sync_executor = self._new_executor(self.sync_workers)
+            return self._sync_executor
+
+    def start_recovery(self):
+        """启动后台恢复线程(每个进程一个), 在应用启动时调用"""
+        with self._lock:
+            if self._recovery_thread is not None and self._recovery_thread.is_alive():
+                return
+            self._recovery_thread = threading.Thread(target=self._recovery_loop, name='job-recovery', daemon=True)
+            self._recovery_thread.start()
+
+    def _recovery_loop(self):
+        while True:
+            try:
+                self.recover()
+            except Exception as e:
+                print(f"job recovery failed: {e}")
+            time.sleep(self.recovery_interval)
+
+    def recover(self):
+        """把中断的任务重新排队, 并分发所有排队中的任务; 没有任务时不创建进程池"""
+        self.db_manager.execute(
+            "UPDATE video_jobs SET status = %s, stage = NULL "
+            "WHERE status = %s AND updated_at < NOW() - INTERVAL %s SECOND",
+            (STATUS_QUEUED, STATUS_RUNNING, int(self.stale_after)))
+        rows = self.db_manager.fetch_all(
+            "SELECT job_id FROM video_jobs WHERE status = %s ORDER BY created_at", (STATUS_QUEUED,))
+        for row in rows:
+            self._dispatch(row['job_id'])
+
+    def _dispatch(self, job_id):
+        with self._lock:
+            if job_id in self._inflight:
+                return
+            self._inflight.add(job_id)
+        try:
+            future = self._get_executor().submit(_run_job, job_id)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可用, 重建后重试
+            with self._lock:
+                self._executor = None
+                self._inflight.discard(job_id)
+            self._dispatch(job_id)
+            return
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+    def _on_done(self, job_id, future):
+        with self._lock:
+            self._inflight.discard(job_id)
+            if future.exception() is not None:
+                self._finished[STATUS_FAILED] += 1
+                return
+            outcome = future.result()
+            if outcome.get('skipped'):
+                return
+            self._finished[outcome['status']] += 1
+            for stage, duration in outcome['stages'].items():
+                stat = self._stage_stats.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0})
+                stat['count'] += 1
+                stat['total'] += duration
+                stat['max'] = max(stat['max'], duration)
+
+    def submit(self, job_type, payload):
+        """
+        持久化并提交任务
+        :return: job_id
+        """
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f'unknown job type: {job_type}')
+        job_id = uuid.uuid4().hex
+        self.db_manager.execute(
+            "INSERT INTO video_jobs (job_id, job_type, status, payload) VALUES (%s, %s, %s, %s)",
+            (job_id, job_type, STATUS_QUEUED, json.dumps(payload, ensure_ascii=False)))
+        self._dispatch(job_id)
+        return job_id
+
+    def run(self, job_type, payload, timeout=None):
+        """
+        在同步任务进程池中执行任务并等待结果, 不持久化; gevent 模式下等待 future 只挂起当前协程
+        :return: 处理函数的返回值
+        :raises concurrent.futures.TimeoutError: 超过 timeout 秒未完成
+        """
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f'unknown job type: {job_type}')
+        try:
+            future = self._get_sync_executor().submit(_run_inline, job_type, payload)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可用, 重建后重试
+            with self._lock:
+                self._sync_executor = None
+            future = self._get_sync_executor().submit(_run_inline, job_type, payload)
+        return future.result(timeout=timeout)
+
+    def get(self, job_id):
+        """查询任务状态, 不存在时返回 None"""
+        row = self.db_manager.fetch_one(
+            "SELECT job_id, job_type, status, stage, stages, result, error, attempts, "
+            "created_at, started_at, finished_at FROM video_jobs WHERE job_id = %s", (job_id,))
+        if not row:
+            return None
+        return {
+            'job_id': row['job_id'],
+            'job_type': row['job_type'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'stages': json.loads(row['stages']) if row['stages'] else {},
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'attempts': row['attempts'],
+            'created_at': _fmt_time(row['created_at']),
+            'started_at': _fmt_time(row['started_at']),
+            'finished_at': _fmt_time(row['finished_at']),
+        }
+
+    def stats(self):
+        """队列深度和各阶段耗时统计"""
+        rows = self.db_manager.fetch_all(
+            "SELECT status, COUNT(*) AS cnt FROM video_jobs WHERE status IN (%s, %s) GROUP BY status",
+            (STATUS_QUEUED, STATUS_RUNNING))
+        counts = {row['status']: row['cnt'] for row in rows}
+        with self._lock:
+            stages = {
+                stage: {'count': s['count'], 'avg': round(s['total'] / s['count'], 3), 'max': s['max']}
+                for stage, s in self._stage_stats.items()
+            }
+            return {
+                'workers': self.max_workers,
+                'sync_workers': self.sync_workers,
+                'inflight': len(self._inflight),
+                'queue_depth': counts.get(STATUS_QUEUED, 0),
+                'running': counts.get(STATUS_RUNNING, 0),
+                'succeeded': self._finished[STATUS_SUCCEEDED],
+                'failed': self._finished[STATUS_FAILED],
+                'stages': stages,
+            }
@@ -0,0 +1,107 @@
+"""
+关键帧结果缓存: 以视频内容哈希 + 提取参数为键, 把已上传的关键帧 URL 保存在 keyframe_cache 表中.
+
+同时记录来源 URL 的键, 重复提交同一个 URL 时不需要下载视频即可命中.
+"""
+import hashlib
+import json
+import threading
+
+from ai_copy.media_cache import normalize_url
+
+# 关键帧 preview_url 是 7 天有效的预签名地址, 缓存有效期需要小于该值
+DEFAULT_TTL = 6 * 24 * 3600
+
+
+def params_key(params):
+    """把提取参数序列化成稳定的字符串键"""
+    return ';'.join(f'{k}={params[k]}' for k in sorted(params))
+
+
+def url_key(video_url):
+    return hashlib.sha1(normalize_url(video_url).encode('utf-8')).hexdigest()
+
+
+class KeyframeCache:
+    """
+    关键帧结果缓存(MySQL)
+    """
+
+    def __init__(self, db_manager, ttl=DEFAULT_TTL):
+        self.db_manager = db_manager
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def get_by_url(self, video_url, params):
+        """按来源 URL 查找未过期的结果, 未命中返回 None"""
+        row = self.db_manager.fetch_one(
+            "SELECT keyframe_urls FROM keyframe_cache "
+            "WHERE source_url_key = %s AND params_key = %s AND expires_at > NOW() "
+            "ORDER BY updated_at DESC LIMIT 1",
+            (url_key(video_url), params_key(params)))
+        return self._hit_or_miss(row)
+
+    def get_by_content(self, content_hash, params):
+        """按视频内容哈希查找未过期的结果, 未命中返回 None"""
+        row = self.db_manager.fetch_one(
+            "SELECT keyframe_urls FROM keyframe_cache "
+            "WHERE content_hash = %s AND params_key = %s AND expires_at > NOW()",
+            (content_hash, params_key(params)))
+        return self._hit_or_miss(row)
+
+    def _hit_or_miss(self, row):
+        if not row:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return json.loads(row['keyframe_urls'])
+
+    def _ttl(self, ttl):
+        """有效期不超过 DEFAULT_TTL, 否则命中的 preview_url 可能已过期"""
+        return min(int(ttl if ttl is not None else self.ttl), DEFAULT_TTL)
+
+    def put(self, video_url, content_hash, params, keyframe_urls, ttl=None):
+        """保存新提取的结果, 同一内容和参数的旧记录会被覆盖"""
+        self.db_manager.execute(
+            "INSERT INTO keyframe_cache (content_hash, params_key, source_url_key, keyframe_urls, expires_at) "
+            "VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND) "
+            "ON DUPLICATE KEY UPDATE source_url_key = VALUES(source_url_key), "
+            "keyframe_urls = VALUES(keyframe_urls), expires_at = VALUES(expires_at)",
+            (content_hash, params_key(params), url_key(video_url), json.dumps(keyframe_urls), self._ttl(ttl)))
+        self._count('stores')
+
+    def remember_url(self, video_url, content_hash, params):
+        """
+        按内容哈希命中后记录新的来源 URL, 保留原有的 expires_at:
+        关键帧地址是首次上传时签名的, 不能随重复命中延长有效期
+        """
+        self.db_manager.execute(
+            "UPDATE keyframe_cache SET source_url_key = %s WHERE content_hash = %s AND params_key = %s",
+            (url_key(video_url), content_hash, params_key(params)))
+
+    def invalidate(self, video_url=None, content_hash=None):
+        """
+        删除缓存记录, 按来源 URL 或内容哈希(同时传入时两者都删除)
+        :return: 删除的记录数
+        """
+        deleted = 0
+        if video_url:
+            deleted += self.db_manager.execute(
+                "DELETE FROM keyframe_cache WHERE source_url_key = %s", (url_key(video_url),))
+        if content_hash:
+            deleted += self.db_manager.execute(
+                "DELETE FROM keyframe_cache WHERE content_hash = %s", (content_hash,))
+        self._count('invalidations', deleted)
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
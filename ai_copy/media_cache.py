@@ -0,0 +1,248 @@
+"""
+本地媒体缓存: 按 URL 和内容哈希缓存下载的视频片段, 超出磁盘预算时按 LRU 淘汰.
+
+目录结构(多个进程可共享同一目录):
+    <root>/objects/<sha256><ext>   内容寻址的文件, 相同内容只保存一份
+    <root>/urls/<sha1(url)>        URL 到内容哈希的映射, 内容为 "<sha256> <ext>"
+文件的 mtime 作为最近访问时间.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from http_client import get_http_client
+
+CHUNK_SIZE = 1024 * 1024
+
+# 预签名 URL 中每次都会变化的签名参数, 不参与缓存键
+_SIGNING_PARAMS = {
+    'x-amz-algorithm', 'x-amz-credential', 'x-amz-date', 'x-amz-expires', 'x-amz-signedheaders',
+    'x-amz-signature', 'x-amz-security-token', 'signature', 'expires', 'ossaccesskeyid',
+    'accesskeyid', 'auth_key', 'sign',
+}
+
+
+def normalize_url(url):
+    """去掉签名类查询参数, 使同一对象的不同预签名 URL 命中同一缓存"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in _SIGNING_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ''))
+
+
+def _guess_extension(content_type):
+    extension = mimetypes.guess_extension((content_type or '').split(';')[0].strip())
+    return extension if extension else ".mp4"
+
+
+def content_digest(path):
+    """缓存文件名即内容的 sha256"""
+    return os.path.basename(path).split('.')[0]
+
+
+class MediaCache:
+    """
+    内容寻址的下载缓存
+    """
+
+    def __init__(self, root, max_bytes=5 * 1024 ** 3, min_age=300, client=None):
+        """
+        :param root: 缓存目录
+        :param max_bytes: 磁盘预算, 超出后淘汰最久未访问的文件
+        :param min_age: 最近访问不足该秒数的文件不淘汰, 避免删除正在使用的文件
+        :param client: HttpClient, 默认使用进程内共享的出站客户端
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.objects_dir = os.path.join(root, 'objects')
+        self.urls_dir = os.path.join(root, 'urls')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.urls_dir, exist_ok=True)
+        self.client = client or get_http_client()
+
+        self._lock = threading.Lock()
+        # URL -> [锁, 持有和等待者数]
+        self._key_locks = {}
+        self._stats = {'hits': 0, 'misses': 0, 'bytes_downloaded': 0, 'bytes_saved': 0, 'evictions': 0}
+        self._size = self._scan_size()
+
+    def _scan_size(self):
+        total = 0
+        for name in os.listdir(self.objects_dir):
+            try:
+                total += os.path.getsize(os.path.join(self.objects_dir, name))
+            except OSError:
+                pass
+        return total
+
+    def _url_entry(self, url):
+        key = hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+        return os.path.join(self.urls_dir, key)
+
+    def _lookup(self, url):
+        """返回 URL 对应的缓存文件路径, 未命中返回 None"""
+        try:
+            with open(self._url_entry(url)) as f:
+                digest, extension = f.read().split()
+        except (OSError, ValueError):
+            return None
+        path = os.path.join(self.objects_dir, digest + extension)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    @contextmanager
+    def _key_lock(self, url):
+        """同一 URL 的下载互斥; 锁按持有和等待者计数, 归零时删除, 不随访问过的 URL 数增长"""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def fetch(self, url):
+        """
+        返回 URL 对应的本地文件路径, 未缓存时下载
+        调用方不应删除返回的文件, 由缓存统一淘汰
+        """
+        path = self._lookup(url)
+        if path is None:
+            # 同一 URL 并发请求时只下载一次
+            with self._key_lock(url):
+                path = self._lookup(url)
+                if path is None:
+                    return self._download(url)
+        with self._lock:
+            self._stats['hits'] += 1
+            self._stats['bytes_saved'] += os.path.getsize(path)
+        return path
+
+    def fetch_many(self, urls, max_workers=8):
+        """并发获取多个 URL, 返回与输入顺序一致的本地路径列表"""
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+            return list(executor.map(self.fetch, urls))
+
+    def _download(self, url):
+        response = self.client.get(url, stream=True, timeout=(10, 300))
+        response.raise_for_status()
+        extension = _guess_extension(response.headers.get("Content-Type", ""))
+
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+            digest = sha256.hexdigest()
+            path = os.path.join(self.objects_dir, digest + extension)
+            if os.path.exists(path):
+                # 不同 URL 相同内容, 复用已有文件
+                os.remove(tmp_path)
+                os.utime(path)
+                added = 0
+            else:
+                os.replace(tmp_path, path)
+                added = size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # 多个进程共享缓存目录, 临时文件名由 mkstemp 保证唯一
+        entry = self._url_entry(url)
+        fd, tmp_entry = tempfile.mkstemp(dir=self.urls_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(f'{digest} {extension}')
+            os.replace(tmp_entry, entry)
+        except BaseException:
+            if os.path.exists(tmp_entry):
+                os.remove(tmp_entry)
+            raise
+
+        with self._lock:
+            self._stats['misses'] += 1
+            self._stats['bytes_downloaded'] += size
+            self._size += added
+            over_budget = self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+        return path
+
+    def evict(self):
+        """删除最久未访问的文件直到低于磁盘预算"""
+        entries = []
+        for name in os.listdir(self.objects_dir):
+            if name.endswith('.part'):
+                continue
+            path = os.path.join(self.objects_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        evicted = 0
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if now - mtime < self.min_age:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._size = total
+            self._stats['evictions'] += evicted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size_bytes'] = self._size
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_media_cache = None
+_media_cache_lock = threading.Lock()
+
+
+def get_media_cache():
+    """进程内共享的媒体缓存, 目录和预算由 MEDIA_CACHE_DIR / MEDIA_CACHE_MAX_BYTES 配置"""
+    global _media_cache
+    if _media_cache is None:
+        with _media_cache_lock:
+            if _media_cache is None:
+                root = os.getenv("MEDIA_CACHE_DIR") or os.path.join(tempfile.gettempdir(), 'adify_media_cache')
+                _media_cache = MediaCache(root, max_bytes=int(os.getenv("MEDIA_CACHE_MAX_BYTES", 5 * 1024 ** 3)))
+    return _media_cache
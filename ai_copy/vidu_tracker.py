@@ -0,0 +1,209 @@
+"""
+Vidu 生成任务跟踪器: 后台线程统一轮询所有未完成的 task_id.
+
+- 轮询间隔自适应: 任务状态未变化时按倍数退避, 直到 max_interval
+- 使用共享的出站客户端(keep-alive 连接池), 同一轮到期的任务并发查询
+- 终态结果(成功/失败)缓存 terminal_ttl 秒, 查询不再访问 Vidu
+- Vidu 不存在的任务视为失败; 超过 max_age 秒仍未完成的任务标记为 expired, 不再轮询
+- subscribe() 返回事件队列, 任务状态变化时推送, 供 SSE 接口使用
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import get_http_client
+from utils import get_video_gen_task
+
+STATE_PENDING = 'pending'
+STATE_SUCCESS = 'success'
+STATE_FAILED = 'failed'
+STATE_EXPIRED = 'expired'
+TERMINAL_STATES = (STATE_SUCCESS, STATE_FAILED, STATE_EXPIRED)
+
+
+def parse_task(res):
+    """把 Vidu 任务响应转成 (state, video_url)"""
+    if res is None:
+        return STATE_PENDING, ''
+    creations = res.get('creations') or []
+    video_url = creations[0].get('url', '') if creations else ''
+    state = res.get('state') or (STATE_SUCCESS if video_url else STATE_PENDING)
+    if state == STATE_SUCCESS and not video_url:
+        state = STATE_PENDING
+    return state, video_url
+
+
+class _Task:
+    __slots__ = ('task_id', 'state', 'video_url', 'interval', 'next_poll', 'updated_at', 'expires_at', 'created')
+
+    def __init__(self, task_id, interval):
+        self.task_id = task_id
+        self.created = time.time()
+        self.state = STATE_PENDING
+        self.video_url = ''
+        self.interval = interval
+        self.next_poll = 0.0
+        self.updated_at = None
+        self.expires_at = None
+
+    def to_dict(self):
+        return {'task_id': self.task_id, 'state': self.state, 'video_url': self.video_url,
+                'updated_at': self.updated_at}
+
+
+class ViduTaskTracker:
+    """
+    后台批量跟踪 Vidu 任务
+    """
+
+    def __init__(self, fetch=get_video_gen_task, min_interval=2.0, max_interval=30.0, backoff=1.5,
+                 terminal_ttl=3600, max_workers=8, max_age=3600):
+        """
+        :param fetch: 查询函数 fetch(task_id, client) -> 响应 dict 或 None
+        :param min_interval: 新任务的首个轮询间隔(秒)
+        :param max_interval: 退避后的最大轮询间隔(秒)
+        :param backoff: 状态未变化时轮询间隔的放大倍数
+        :param terminal_ttl: 终态结果的缓存时间(秒)
+        :param max_workers: 每轮并发查询数
+        :param max_age: 任务登记后超过该秒数仍未完成时标记为 expired 并停止轮询(拼错或已放弃的 task_id)
+        """
+        self.fetch = fetch
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.terminal_ttl = terminal_ttl
+        self.max_workers = max_workers
+        self.max_age = max_age
+
+        self.client = get_http_client()
+
+        self._tasks = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._stats = {'polls': 0, 'poll_errors': 0, 'completed': 0, 'expired': 0}
+
+    def _ensure_started(self):
+        # 线程在首次使用时启动, 避免 gunicorn preload 后 fork 丢失线程
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='vidu-tracker', daemon=True)
+                self._thread.start()
+
+    def track(self, task_ids):
+        """登记需要跟踪的任务"""
+        with self._lock:
+            for task_id in task_ids:
+                if task_id not in self._tasks:
+                    self._tasks[task_id] = _Task(task_id, self.min_interval)
+        self._ensure_started()
+        self._wakeup.set()
+
+    def status(self, task_ids):
+        """
+        返回任务当前状态 {task_id: dict(task_id, state, video_url, updated_at)}
+        首次出现的任务会同步查询一次, 之后由后台线程更新
+        """
+        with self._lock:
+            now = time.time()
+            unknown = []
+            for task_id in task_ids:
+                if task_id not in self._tasks:
+                    task = _Task(task_id, self.min_interval)
+                    # 这里同步查询, 后台线程一个间隔后再轮询, 避免同一任务被立即重复查询
+                    task.next_poll = now + self.min_interval
+                    self._tasks[task_id] = task
+                    unknown.append(task)
+        if unknown:
+            self._ensure_started()
+            list(self._executor.map(self._poll, unknown))
+        with self._lock:
+            return {task_id: self._tasks[task_id].to_dict() for task_id in task_ids if task_id in self._tasks}
+
+    def subscribe(self):
+        """返回事件队列, 任务状态变化时放入任务 dict"""
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.add(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self._lock:
+            self._subscribers.discard(events)
+
+    def _poll(self, task):
+        try:
+            res = self.fetch(task.task_id, self.client)
+            error = False
+        except Exception as e:
+            print(f"poll vidu task {task.task_id} failed: {e}")
+            res, error = None, True
+        state, video_url = parse_task(res)
+        now = time.time()
+        with self._lock:
+            self._stats['polls'] += 1
+            if error:
+                self._stats['poll_errors'] += 1
+            if task.state == STATE_EXPIRED and state not in TERMINAL_STATES:
+                # 查询期间已过期
+                return
+            changed = (state, video_url) != (task.state, task.video_url)
+            if changed:
+                task.state, task.video_url = state, video_url
+                task.updated_at = time.strftime('%Y-%m-%d %H:%M:%S')
+                task.interval = self.min_interval
+            else:
+                task.interval = min(self.max_interval, task.interval * self.backoff)
+            task.next_poll = now + task.interval
+            if state in TERMINAL_STATES:
+                task.expires_at = now + self.terminal_ttl
+                self._stats['completed'] += 1
+            subscribers = list(self._subscribers) if changed else []
+            event = task.to_dict()
+        for events in subscribers:
+            events.put(event)
+
+    def _expire(self, now):
+        """把超过 max_age 仍未完成的任务标记为 expired, 需持有 self._lock, 返回状态变化事件"""
+        events = []
+        for t in self._tasks.values():
+            if t.state not in TERMINAL_STATES and now - t.created > self.max_age:
+                t.state = STATE_EXPIRED
+                t.updated_at = time.strftime('%Y-%m-%d %H:%M:%S')
+                t.expires_at = now + self.terminal_ttl
+                self._stats['expired'] += 1
+                events.append(t.to_dict())
+        return events
+
+    def _run(self):
+        while True:
+            now = time.time()
+            with self._lock:
+                for task_id in [t.task_id for t in self._tasks.values()
+                                if t.expires_at is not None and t.expires_at <= now]:
+                    del self._tasks[task_id]
+                expired = self._expire(now)
+                subscribers = list(self._subscribers) if expired else []
+                due = [t for t in self._tasks.values()
+                       if t.state not in TERMINAL_STATES and t.next_poll <= now]
+                pending = [t.next_poll for t in self._tasks.values() if t.state not in TERMINAL_STATES]
+            for events in subscribers:
+                for event in expired:
+                    events.put(event)
+            if due:
+                list(self._executor.map(self._poll, due))
+                continue
+            timeout = max(0.05, min(pending) - now) if pending else self.max_interval
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tracked'] = len(self._tasks)
+            stats['pending'] = sum(1 for t in self._tasks.values() if t.state not in TERMINAL_STATES)
+            stats['subscribers'] = len(self._subscribers)
+        return stats
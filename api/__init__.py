@@ -1,9 +1,12 @@
 """
 Flask application package initialization.
 """
+import os
+
 from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
+from concurrency import gevent_patched
 
 def create_app():
     """
@@ -14,11 +17,17 @@ def create_app():
     """
     # 加载.env文件
     load_dotenv()
+    if os.getenv("GEVENT_MODE") == "True" and not gevent_patched():
+        print("GEVENT_MODE=True but gevent monkey-patching is not active; "
+              "start with `gunicorn -c gunicorn.conf.py app:app` or `python -m app`")
     app = Flask(__name__)
     CORS(app)
     
     # Import and register blueprints
-    from api.api import api_bp
+    from api.api import api_bp, job_manager
     app.register_blueprint(api_bp)
+    # 中断和排队中的任务在启动时恢复; preload 模式下应用在 gunicorn master 中创建, 由 post_fork 在 worker 中启动
+    if os.getenv("GUNICORN_PRELOAD", "False") != "True":
+        job_manager.start_recovery()
     
     return app
\ No newline at end of file
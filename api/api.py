@@ -3,13 +3,31 @@ API module for the adify service.
 Contains route definitions for the API endpoints.
 """
 import os
-from flask import Blueprint, jsonify, request
+import atexit
+import json
+import queue
+import re
+import threading
+import time
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from db.db import DBManager
-from upload.uploadfile import MinioUploader
+from db.pagination import CountCache, encode_cursor, decode_cursor, InvalidCursorError
+from db.sequences import allocate_sequence
+from upload.uploadfile import get_uploader
 from datetime import datetime
 import uuid
 import traceback
-from ai_copy import gen_vieo
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http_client import get_http_client
+from image_payload import payload_stats
+from llm_cache import create_cache, configure_llm_cache, get_llm_cache
+from ai_copy.jobs import JobManager
+from ai_copy.media_cache import get_media_cache
+from ai_copy.keyframe_cache import KeyframeCache, DEFAULT_TTL
+from ai_copy.vidu_tracker import ViduTaskTracker, TERMINAL_STATES
+from deployment.metrics import MetricsIngestor, BackpressureError
+from deployment.details_cache import details_cache_from_env
+from concurrency import gevent_patched, offload_stats
 
 # Create Blueprint
 api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -17,8 +35,60 @@ api_bp = Blueprint('api', __name__, url_prefix='/api')
 # Initialize database manager
 db_manager = DBManager(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT")), user=os.getenv("DB_USER"),
                        password=os.getenv("DB_PASSWORD"),
-                       database=os.getenv("DB_DATABASE"))
-minioUploader = MinioUploader(os.getenv("BUCKET_NAME"))
+                       database=os.getenv("DB_DATABASE"),
+                       pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+                       max_idle=float(os.getenv("DB_POOL_MAX_IDLE", 300)),
+                       max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", 3600)),
+                       wait_timeout=float(os.getenv("DB_POOL_WAIT_TIMEOUT", 10)))
+# 列表接口总数缓存
+count_cache = CountCache(ttl=float(os.getenv("LIST_COUNT_TTL", 30)),
+                         max_entries=int(os.getenv("LIST_COUNT_MAX_ENTRIES", 1024)))
+keyframe_cache = KeyframeCache(db_manager, ttl=int(os.getenv("KEYFRAME_CACHE_TTL", DEFAULT_TTL)))
+# 大模型响应缓存, mysql 后端需要数据库连接
+if os.getenv("LLM_CACHE_BACKEND") == "mysql":
+    configure_llm_cache(create_cache("mysql", db_manager))
+# Vidu 任务后台轮询
+vidu_tracker = ViduTaskTracker(min_interval=float(os.getenv("VIDU_POLL_MIN_INTERVAL", 2)),
+                               max_interval=float(os.getenv("VIDU_POLL_MAX_INTERVAL", 30)),
+                               max_age=float(os.getenv("VIDU_TASK_MAX_AGE", 3600)))
+# 对比组详情缓存, 投放数据写入、评分写回后精确失效
+details_cache = details_cache_from_env()
+# 对比组优选, 投放数据写入后增量重算涉及的对比组; 首次使用时创建, 启动时不导入 numpy
+winner_scorer = None
+_winner_scorer_lock = threading.Lock()
+
+
+def get_winner_scorer():
+    global winner_scorer
+    if winner_scorer is None:
+        with _winner_scorer_lock:
+            if winner_scorer is None:
+                from deployment.scoring import scorer_from_env
+                winner_scorer = scorer_from_env(db_manager, on_scored=details_cache.invalidate_groups)
+    return winner_scorer
+
+
+def _on_metrics_flush(material_ids):
+    details_cache.invalidate_materials(material_ids)
+    get_winner_scorer().mark_dirty(material_ids)
+
+
+# 投放数据批量写入, 后台线程在首次上报时启动, 进程退出前写入剩余数据
+metrics_ingestor = MetricsIngestor(db_manager,
+                                   flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", 1)),
+                                   max_batch=int(os.getenv("METRICS_MAX_BATCH", 5000)),
+                                   max_pending=int(os.getenv("METRICS_MAX_PENDING", 100000)),
+                                   journal_dir=os.getenv("METRICS_JOURNAL_DIR") or None,
+                                   fsync=os.getenv("METRICS_JOURNAL_FSYNC", "False") == "True",
+                                   max_attempts=int(os.getenv("METRICS_MAX_ATTEMPTS", 5)),
+                                   on_flush=_on_metrics_flush)
+atexit.register(metrics_ingestor.close)
+METRICS_SUBMIT_TIMEOUT = float(os.getenv("METRICS_SUBMIT_TIMEOUT", 2))
+# 视频合成后台任务, 进程池在首次提交时创建
+job_manager = JobManager(db_manager, max_workers=int(os.getenv("JOB_WORKERS", 2)),
+                         stale_after=int(os.getenv("JOB_STALE_SECONDS", 3600)),
+                         recovery_interval=float(os.getenv("JOB_RECOVERY_INTERVAL", 60)),
+                         sync_workers=int(os.getenv("SYNC_JOB_WORKERS", 2)))
 
 
 @api_bp.route('/health', methods=['GET'])
@@ -27,21 +97,73 @@ def health_check():
     return jsonify({'status': 'ok', 'message': 'Service is running'}), 200
 
 
+@api_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """运行指标接口,返回连接池、缓存、任务队列等内部统计"""
+    llm_cache = get_llm_cache()
+    data = {
+        'db': db_manager.stats(),
+        'jobs': job_manager.stats(),
+        'media_cache': get_media_cache().stats(),
+        'keyframe_cache': keyframe_cache.stats(),
+        'vidu_tracker': vidu_tracker.stats(),
+        'http': get_http_client().stats(),
+        'image_payload': payload_stats(),
+        'llm_cache': llm_cache.stats() if llm_cache else None,
+        'metrics_ingest': metrics_ingestor.stats(),
+        'winner_scorer': winner_scorer.stats() if winner_scorer else None,
+        'details_cache': details_cache.stats(),
+        'cpu_offload': offload_stats(),
+    }
+    return jsonify({'status': 'success', 'message': 'ok', 'data': data}), 200
+
+
 @api_bp.route('/video/keyframes', methods=['POST'])
 def keyframes():
-    """该接口用于接收一个视频的URL，提取视频中的关键帧，并以图片格式返回多个关键帧。关键帧提取基于视频内容的显著变化，可用于视频分析、内容摘要或视频检索等场景。"""
+    """该接口用于接收一个视频的URL，提取视频中的关键帧，并以图片格式返回多个关键帧。关键帧提取基于视频内容的显著变化，可用于视频分析、内容摘要或视频检索等场景。
+    相同视频(URL或内容)和提取参数的结果会被缓存; refresh=true 强制重新提取, ttl 指定缓存有效期(秒, 最长 6 天)
+    """
     try:
         data = request.get_json()
         if not data or not data.get('video_url'):
             return jsonify({'status': 'error', 'message': '视频url为空'}), 400
-
-        key_frames = gen_vieo.get_key_images(data.get('video_url'))
+        ttl = data.get('ttl')
+        if ttl is not None:
+            try:
+                ttl = int(ttl)
+            except (TypeError, ValueError):
+                ttl = 0
+            if ttl <= 0:
+                return jsonify({'status': 'error', 'message': 'ttl must be a positive integer'}), 400
+
+        # 媒体处理依赖(cv2、scenedetect、moviepy 等)在首次调用时导入
+        from ai_copy import gen_vieo
+        key_frames = gen_vieo.get_key_images(data.get('video_url'), cache=keyframe_cache,
+                                             refresh=bool(data.get('refresh')), ttl=ttl,
+                                             mode=data.get('mode'), downscale=data.get('downscale'),
+                                             frame_skip=data.get('frame_skip'), detector=data.get('detector'))
         return jsonify({'status': 'success', 'message': 'ok', 'keyframes': key_frames}), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@api_bp.route('/video/keyframes/cache', methods=['DELETE'])
+def keyframes_cache_invalidate():
+    """删除关键帧缓存, 参数 video_url 或 content_hash"""
+    try:
+        data = request.get_json(silent=True) or request.args
+        video_url = data.get('video_url')
+        content_hash = data.get('content_hash')
+        if not video_url and not content_hash:
+            return jsonify({'status': 'error', 'message': 'video_url or content_hash is required'}), 400
+        deleted = keyframe_cache.invalidate(video_url=video_url, content_hash=content_hash)
+        return jsonify({'status': 'success', 'message': 'ok', 'deleted': deleted}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 @api_bp.route('/video/generate_video_segments', methods=['POST'])
 def generate_video_segments():
     """该接口用于接收一个关键帧图片URL和一个关键帧替换图片的URL.
@@ -59,7 +181,9 @@ def generate_video_segments():
         movement_amplitude = 'auto'
         aspect_ratio = '16:9'
         image_urls = [data.get('image_url'), data.get('target_image_url')]
+        from ai_copy import gen_vieo
         task_id = gen_vieo.gen_key_video(prompt, time_len, resolution, movement_amplitude, aspect_ratio, image_urls)
+        vidu_tracker.track([task_id])
         return jsonify({'status': 'success', 'message': 'ok',
                         'results': ({'task_id': task_id, 'target_image_url': data.get('target_image_url')})}), 200
     except Exception as e:
@@ -76,21 +200,109 @@ def get_generate_video_segments():
 
         if not task_id:
             return jsonify({'status': 'error', 'message': 'task_id is required'}), 400
-        video_url = gen_vieo.get_task_id(task_id)
+        # 状态由后台跟踪器维护, 这里只读缓存
+        video_url = vidu_tracker.status([task_id])[task_id]['video_url']
         return jsonify({'status': 'success', 'message': 'ok', 'video_url': video_url, 'task_id': task_id}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@api_bp.route('/video/segments/status', methods=['POST'])
+def segments_status():
+    """批量查询视频片段生成状态
+    task_ids: task_id 列表
+    """
+    try:
+        data = request.get_json()
+        if not data or not data.get('task_ids'):
+            return jsonify({'status': 'error', 'message': 'task_ids is required'}), 400
+        results = vidu_tracker.status(list(data.get('task_ids')))
+        return jsonify({'status': 'success', 'message': 'ok', 'results': results}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@api_bp.route('/video/segments/stream', methods=['GET'])
+def segments_stream():
+    """视频片段生成状态推送(server-sent events)
+    task_ids: 逗号分隔的 task_id; 先推送当前状态, 之后每次状态变化推送一次, 全部完成或超时后结束
+    gunicorn 下只在 gevent worker 中提供, sync worker 返回 501
+    """
+    task_ids = [t for t in request.args.get('task_ids', default='', type=str).split(',') if t]
+    if not task_ids:
+        return jsonify({'status': 'error', 'message': 'task_ids is required'}), 400
+    if request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn') and not gevent_patched():
+        # gunicorn sync worker 在请求期间不发心跳, 长连接会占住 worker 并在 GUNICORN_TIMEOUT 后被 master 杀掉
+        return jsonify({'status': 'error', 'message': 'event stream requires a gevent worker, '
+                                                      'use /video/segments/status instead'}), 501
+    timeout = float(os.getenv("SSE_TIMEOUT", 600))
+    heartbeat = 15
+
+    events = vidu_tracker.subscribe()
+
+    def generate():
+        try:
+            pending = set(task_ids)
+            for task in vidu_tracker.status(task_ids).values():
+                yield _sse('task', task)
+                if task['state'] in TERMINAL_STATES:
+                    pending.discard(task['task_id'])
+            deadline = time.time() + timeout
+            while pending and time.time() < deadline:
+                try:
+                    task = events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if task['task_id'] not in pending:
+                    continue
+                yield _sse('task', task)
+                if task['state'] in TERMINAL_STATES:
+                    pending.discard(task['task_id'])
+            yield _sse('end', {'pending': sorted(pending)})
+        finally:
+            vidu_tracker.unsubscribe(events)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @api_bp.route('/video/generate_video', methods=['POST'])
 def generate_video():
-    """视频生成和标题推荐接口"""
+    """视频生成和标题推荐接口
+    传入 async=true 时立即返回 job_id, 通过 /video/jobs/<job_id> 查询进度和结果
+    """
     try:
         data = request.get_json()
         if not data or not data.get('video_fragments_urls') or not data.get('product_info'):
             return jsonify({'status': 'error', 'message': 'video_fragments is null'}), 400
 
-        result = gen_vieo.merge_videos(data.get('video_fragments_urls'), data.get('product_info'))
+        if data.get('async'):
+            job_id = job_manager.submit('merge_videos', {'video_fragments_urls': data.get('video_fragments_urls'),
+                                                         'product_info': data.get('product_info'),
+                                                         'keyframe_urls': data.get('keyframe_urls'),
+                                                         'refresh_titles': data.get('refresh_titles')})
+            return jsonify({'status': 'success', 'message': 'ok', 'job_id': job_id}), 202
+
+        if gevent_patched():
+            # 协程 worker 中解码/编码会阻塞整个 worker, 交给同步任务进程池执行, 不在后台任务后排队
+            try:
+                result = job_manager.run('merge_videos', {'video_fragments_urls': data.get('video_fragments_urls'),
+                                                          'product_info': data.get('product_info'),
+                                                          'keyframe_urls': data.get('keyframe_urls'),
+                                                          'refresh_titles': data.get('refresh_titles')},
+                                         timeout=float(os.getenv("SYNC_JOB_TIMEOUT", 1800)))
+            except FutureTimeoutError:
+                return jsonify({'status': 'error', 'message': 'video generation timed out'}), 504
+        else:
+            from ai_copy import gen_vieo
+            result = gen_vieo.merge_videos(data.get('video_fragments_urls'), data.get('product_info'),
+                                           keyframe_urls=data.get('keyframe_urls'),
+                                           refresh_titles=bool(data.get('refresh_titles')))
         preview_url = result['preview_url']
         video_url = result['video_url']
         titles = result['titles']
@@ -100,6 +312,19 @@ def generate_video():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@api_bp.route('/video/jobs/<job_id>', methods=['GET'])
+def video_job(job_id):
+    """查询视频生成任务的状态、阶段进度和结果"""
+    try:
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'status': 'error', 'message': 'job not found'}), 404
+        return jsonify({'status': 'success', 'message': 'ok', 'data': job}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 @api_bp.route('/video/add', methods=['POST'])
 def video_add():
     """添加视频素材(站内或站外)接口"""
@@ -115,17 +340,14 @@ def video_add():
         title = data['title']
         source_type = data['type']  # type 是 0（站内）或 1（站外）
 
-        # 构造插入语句
-        insert_query = """
-                INSERT INTO video_materials (material_id, video_url, preview_url, title, source_type)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-        material_id = generate_material_id(source_type)
-        # 插入数据
-        params = (material_id, video_url, preview_url, title, source_type)
-
-        result = db_manager.execute_insert(insert_query, params)
+        # 生成ID和插入共用一个连接和一次提交
+        with db_manager.transaction() as tx:
+            material_id = generate_material_id(source_type, tx)
+            # 插入数据
+            params = (material_id, video_url, preview_url, title, source_type)
+            result = tx.execute_insert(MATERIAL_INSERT_QUERY, params)
         if result != 0:  # 如果插入成功
+            count_cache.invalidate('video_materials:')
             return jsonify(
                 {'status': 'success', 'message': 'Video uploaded successfully', 'material_id': material_id}), 200
         else:
@@ -136,6 +358,120 @@ def video_add():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+MATERIAL_INSERT_QUERY = """
+        INSERT INTO video_materials (material_id, video_url, preview_url, title, source_type)
+        VALUES (%s, %s, %s, %s, %s)
+    """
+# 批量导入每个分块的行数, 每块分配一段ID并执行一条多行 INSERT
+VIDEO_BATCH_CHUNK_SIZE = int(os.getenv("VIDEO_BATCH_CHUNK_SIZE", 500))
+
+
+def _iter_batch_materials():
+    """逐条产出 (序号, 素材dict 或 错误信息), 支持 JSON 数组和 NDJSON(按行流式读取)"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        index = 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, f'invalid json: {e}'
+            index += 1
+        return
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('materials')
+    if not isinstance(data, list):
+        raise ValueError('request body must be a JSON array or NDJSON')
+    yield from enumerate(data)
+
+
+def _validate_material(row):
+    """校验单条素材, 返回 (source_type, 插入参数) 或错误信息"""
+    if not isinstance(row, dict):
+        return row if isinstance(row, str) else 'material must be an object'
+    if not row.get('video_url') or not row.get('preview_url') or not row.get('title'):
+        return 'video_url or preview_url or title is null'
+    source_type = row.get('type', 0)
+    try:
+        # 与 /video/add 一致接受 0/1 和 "0"/"1"; 布尔值和小数不是合法类型
+        source_type = None if isinstance(source_type, (bool, float)) else int(source_type)
+    except (TypeError, ValueError):
+        source_type = None
+    if source_type not in (0, 1):
+        return 'type must be 0 or 1'
+    return source_type, (row['video_url'], row['preview_url'], row['title'], source_type)
+
+
+def _insert_material_chunk(source_type, rows):
+    """
+    在一个事务内为一块素材分配ID并批量插入; 整块失败时逐条重试, 定位出错的行
+    rows: [(序号, 插入参数)]
+    """
+    try:
+        with db_manager.transaction() as tx:
+            material_ids = generate_material_ids(len(rows), source_type, tx)
+            tx.batch_execute_insert(MATERIAL_INSERT_QUERY,
+                                    [(material_id,) + params for material_id, (_, params) in zip(material_ids, rows)])
+        return [{'index': index, 'status': 'success', 'material_id': material_id}
+                for material_id, (index, _) in zip(material_ids, rows)]
+    except Exception as e:
+        if len(rows) == 1:
+            return [{'index': rows[0][0], 'status': 'error', 'message': str(e)}]
+        results = []
+        for row in rows:
+            results.extend(_insert_material_chunk(source_type, [row]))
+        return results
+
+
+@api_bp.route('/video/batch_add', methods=['POST'])
+def video_batch_add():
+    """批量添加视频素材接口
+    请求体: JSON 数组(或 {"materials": [...]}), 或 Content-Type 为 application/x-ndjson 的逐行 JSON
+    每条素材字段同 /video/add, type 缺省为 0
+    返回每条的结果(index 为在请求中的序号), 部分失败不影响其他行
+    """
+    results = []
+    # 按来源类型分别攒块, 同一块共用一个ID前缀
+    pending = {0: [], 1: []}
+    try:
+        for index, row in _iter_batch_materials():
+            checked = _validate_material(row)
+            if isinstance(checked, str):
+                results.append({'index': index, 'status': 'error', 'message': checked})
+                continue
+            source_type, params = checked
+            pending[source_type].append((index, params))
+            if len(pending[source_type]) >= VIDEO_BATCH_CHUNK_SIZE:
+                results.extend(_insert_material_chunk(source_type, pending[source_type]))
+                pending[source_type] = []
+        for source_type, rows in pending.items():
+            if rows:
+                results.extend(_insert_material_chunk(source_type, rows))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        if results:
+            count_cache.invalidate('video_materials:')
+
+    results.sort(key=lambda item: item['index'])
+    inserted = sum(1 for item in results if item['status'] == 'success')
+    failed = len(results) - inserted
+    if failed == 0:
+        status = 'success'
+    elif inserted:
+        status = 'partial'
+    else:
+        status = 'error'
+    return jsonify({'status': status, 'message': f'{inserted} inserted, {failed} failed',
+                    'inserted': inserted, 'failed': failed, 'results': results}), 400 if status == 'error' else 200
+
+
 @api_bp.route('/video/update', methods=['POST'])
 def video_update():
     """视频素材更新接口"""
@@ -147,7 +483,7 @@ def video_update():
 
         # 提取请求中的数据
         material_id = data['material_id']
-        deployment_links = data['deployment_links']
+        deployment_links = split_campaign_urls(data['deployment_links'])
 
         # 构造更新语句
         update_query = """
@@ -156,9 +492,14 @@ def video_update():
                 WHERE material_id = %s
             """
 
-        params = (deployment_links, material_id)
-        result = db_manager.execute(update_query, params)
+        params = (','.join(deployment_links), material_id)
+        # 展示用的逗号拼接字段和投放链接表在同一事务内更新
+        with db_manager.transaction() as tx:
+            result = tx.execute(update_query, params)
+            if result != 0:
+                replace_campaign_urls(tx, material_id, deployment_links)
         if result != 0:  # 如果更新成功
+            details_cache.invalidate_materials([material_id])
             return jsonify(
                 {'status': 'success', 'message': 'Video update successfully', 'material_id': material_id}), 200
         else:
@@ -169,8 +510,32 @@ def video_update():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
-def generate_material_id(source_type=0):
-    """生成素材 ID"""
+def split_campaign_urls(deployment_links):
+    """投放链接(逗号拼接字符串或列表)拆分为去重后的有序列表"""
+    if isinstance(deployment_links, str):
+        deployment_links = deployment_links.split(',')
+    urls = []
+    for url in deployment_links:
+        url = url.strip()
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def replace_campaign_urls(session, material_id, urls):
+    """用 urls 替换素材在 material_campaign_urls 中的全部投放链接"""
+    session.execute("DELETE FROM material_campaign_urls WHERE material_id = %s", (material_id,))
+    if urls:
+        session.batch_execute_insert(
+            "INSERT INTO material_campaign_urls (material_id, position, campaign_url) VALUES (%s, %s, %s)",
+            [(material_id, position, url) for position, url in enumerate(urls)])
+
+
+def generate_material_ids(count, source_type=0, session=None):
+    """批量生成素材 ID, 顺序号由 material_id_sequences 计数器原子分配, 并发请求不会重复
+    session: 可选的事务会话(db_manager.transaction()), 计数器随事务提交或回滚
+    """
+    session = session or db_manager
     # 获取当前日期
     today = datetime.now().strftime('%Y%m%d')
     if source_type == 0:
@@ -178,65 +543,127 @@ def generate_material_id(source_type=0):
     else:
         prefix = f"CW{today}"
 
-    # 查询当天的最大顺序号
-    query = """
-        SELECT MAX(CAST(SUBSTRING(material_id, -3) AS UNSIGNED)) AS max_sequence
-        FROM video_materials
-        WHERE material_id LIKE %s
+    # 顺序号至少3位，不足补零; 当天超过999个时自动增加位数
+    return [f"{prefix}{sequence:03d}" for sequence in allocate_sequence(session, prefix, count)]
+
+
+def generate_material_id(source_type=0, session=None):
+    """生成素材 ID
+    session: 可选的事务会话(db_manager.transaction()),默认使用连接池
     """
-    params = (f"{prefix}%",)
-    result = db_manager.fetch_one(query, params)
+    return generate_material_ids(1, source_type, session)[0]
 
-    # 如果没有记录，则从 001 开始
-    max_sequence = result['max_sequence'] if result and result['max_sequence'] else 0
-    new_sequence = max_sequence + 1
 
-    # 生成素材 ID
-    material_id = f"{prefix}{new_sequence:03d}"  # 顺序号至少3位，不足补零
-    return material_id
+# 布尔全文检索中的运算符, 拼接检索串前去掉
+_FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+def build_material_search(search):
+    """构造素材检索SQL
+    标题走 FULLTEXT(ngram) 索引按相关度排序, 素材ID走唯一索引做前缀匹配(排在最前);
+    两路用 UNION 合并, 避免 OR 条件导致全表扫描
+    返回 (查询SQL, 参数, 计数SQL, 计数参数), 查询SQL末尾需补充 LIMIT/OFFSET 参数
+    """
+    words = [w for w in _FULLTEXT_OPERATORS.sub(' ', search).split() if w]
+    id_prefix = search.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    if words and all(len(w) >= 2 for w in words):
+        # ngram 分词最小长度为2, 每个词作为短语必须出现
+        against = ' '.join(f'+"{w}"' for w in words)
+        title_score, title_where = "MATCH(title) AGAINST(%s IN BOOLEAN MODE)", "MATCH(title) AGAINST(%s IN BOOLEAN MODE)"
+        title_params = (against,)
+    else:
+        # 过短的关键词无法使用全文索引
+        title_score, title_where = "0", "title LIKE %s"
+        title_params = ()
+        against = f"%{search}%"
+    title_hits = f"SELECT id, {title_score} AS score FROM video_materials WHERE {title_where}"
+    id_hits = "SELECT id, 1000 AS score FROM video_materials WHERE material_id LIKE %s"
+
+    query = f"""
+            SELECT 
+                v.id, 
+                v.material_id, 
+                v.title, 
+                v.campaign_urls as deployment_links,
+                v.created_at
+            FROM 
+                (SELECT id, MAX(score) AS score FROM ({title_hits} UNION ALL {id_hits}) u GROUP BY id) hits
+            JOIN 
+                video_materials v ON v.id = hits.id
+            ORDER BY 
+                hits.score DESC, v.id DESC
+            LIMIT %s OFFSET %s
+        """
+    # 计数只需去重后的 id
+    total_query = f"SELECT COUNT(*) AS totalCount FROM (SELECT id FROM video_materials WHERE {title_where} " \
+                  f"UNION SELECT id FROM video_materials WHERE material_id LIKE %s) t"
+    return query, title_params + (against, id_prefix), total_query, (against, id_prefix)
 
 
 @api_bp.route('/video/list', methods=['GET'])
 def video_list():
-    """视频素材列表查询接口"""
+    """视频素材列表查询接口
+    cursor: 可选, 上一页返回的 next_cursor; 传入时忽略 page
+    search: 可选, 按标题全文检索(相关度排序)或素材ID前缀匹配, total 为匹配的条数
+    """
     # 获取查询参数
     page = request.args.get('page', default=1, type=int)
     size = request.args.get('size', default=10, type=int)
-    search = request.args.get('search', default='', type=str)
+    search = request.args.get('search', default='', type=str).strip()
+    cursor = request.args.get('cursor', default='', type=str)
     # 计算分页查询的偏移量
     offset = (page - 1) * size
+    try:
+        # 检索和列表的游标结构不同, 混用时返回 400
+        last = decode_cursor(cursor, {'o': int} if search else {'c': str, 'i': int}) if cursor else None
+        if last and search and last['o'] < 0:
+            raise InvalidCursorError(f'invalid cursor: {cursor}')
+        if last and not search:
+            try:
+                datetime.strptime(last['c'], '%Y-%m-%d %H:%M:%S')
+            except ValueError as e:
+                raise InvalidCursorError(f'invalid cursor: {cursor}') from e
+    except InvalidCursorError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
 
-    # 构造查询语句
-    base_query = """
-            SELECT 
-                id, 
-                material_id, 
-                title, 
-                campaign_urls as deployment_links,
-                created_at
-            FROM 
-                video_materials
-            WHERE 
-                1=1
-        """
-    # 添加搜索条件（如果提供了搜索关键词）
     if search:
-        base_query += " AND (material_id LIKE %s OR title LIKE %s)"
-        search_condition = (f"%{search}%", f"%{search}%")
+        # 检索结果按相关度排序, 游标记录偏移量
+        query, params, total_query, total_params = build_material_search(search)
+        if last:
+            offset = last['o']
+        params = params + (size, offset)
+        total_key = 'video_materials:search:' + search
     else:
-        search_condition = ()
-
-    # 分页查询
-    query = base_query + " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-    params = search_condition + (size, offset)
-
-    # 查询总记录数
-    total_query = """
+        # 构造查询语句
+        base_query = """
                 SELECT 
-                    count(id) as totalCount
+                    id, 
+                    material_id, 
+                    title, 
+                    campaign_urls as deployment_links,
+                    created_at
                 FROM 
                     video_materials
             """
+        # 分页: 传入 cursor 时按 (created_at, id) 做 keyset 分页, 否则兼容 page/size 的 OFFSET 分页
+        if last:
+            query = base_query + """
+                WHERE created_at < %s OR (created_at = %s AND id < %s)
+                ORDER BY created_at DESC, id DESC LIMIT %s"""
+            params = (last['c'], last['c'], last['i'], size)
+        else:
+            query = base_query + " ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s"
+            params = (size, offset)
+
+        # 查询总记录数
+        total_query = """
+                    SELECT 
+                        count(id) as totalCount
+                    FROM 
+                        video_materials
+                """
+        total_params = None
+        total_key = 'video_materials:total'
 
     try:
         # 执行分页查询
@@ -244,8 +671,8 @@ def video_list():
         if results is None:
             return jsonify({'status': 'error', 'message': 'No data found'}), 400
 
-        # 获取总记录数
-        total = db_manager.fetch_one(total_query)['totalCount']
+        # 获取总记录数(短时间缓存)
+        total = count_cache.get(total_key, lambda: db_manager.fetch_one(total_query, total_params)['totalCount'])
 
         # 构造响应数据
         videos = []
@@ -257,10 +684,20 @@ def video_list():
                 "created_at": row['created_at'].strftime('%Y-%m-%d %H:%M:%S')  # 转换为 YYYY-mm-dd HH:MM:SS 格式
             })
 
+        next_cursor = None
+        if len(results) == size:
+            last_row = results[-1]
+            if search:
+                next_cursor = encode_cursor({'o': offset + size})
+            else:
+                next_cursor = encode_cursor({'c': last_row['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
+                                             'i': last_row['id']})
+
         response_data = {
             "total": total,
             "page": page,
             "size": size,
+            "next_cursor": next_cursor,
             "videos": videos
         }
 
@@ -282,41 +719,28 @@ def deployment_add():
         # 生成唯一的对比组 ID
         comparison_group_id = f"P{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:6].upper()}"
 
-        # 准备批量插入的数据列表
-        insert_data = []
-
-        # 根据素材id列表，查询所有素材信息
+        # 素材的每个投放链接生成一条对比记录, 直接由投放链接表 INSERT ... SELECT, 不经过应用层;
+        # 已采集过的投放数据一并带入
         material_ids = data.get('materials')
-        query = """
-            SELECT material_id, campaign_urls
-            FROM video_materials 
-            WHERE material_id IN %s
-        """
-        results = db_manager.fetch_all(query, (tuple(material_ids),))
-
-        # 构建素材ID到投放链接的映射
-        for row in results:
-            material_id = row['material_id']
-            campaign_urls = row['campaign_urls']
-            result_list = campaign_urls.split(',')
-            for link in result_list:
-                # 设置默认值
-                campaign_label = 'Default Label'
-                is_system_preferred = False
-
-                # 构造一条插入记录
-                insert_data.append((
-                    comparison_group_id, material_id, link, campaign_label, is_system_preferred
-                ))
-
-        # 执行批量插入
-        if insert_data:
-            insert_query = """
-                   INSERT INTO material_comparison_groups (
-                       comparison_group_id, material_id, campaign_url, campaign_label,is_system_preferred
-                   ) VALUES (%s, %s, %s, %s, %s)
-               """
-            db_manager.batch_execute_insert(insert_query, insert_data)
+        insert_query = """
+               INSERT INTO material_comparison_groups (
+                   comparison_group_id, material_id, campaign_url, campaign_label, is_system_preferred,
+                   click_count, completion_count, like_count, comment_count, share_count
+               )
+               SELECT %s, u.material_id, u.campaign_url, 'Default Label', FALSE,
+                      COALESCE(m.click_count, 0), COALESCE(m.completion_count, 0), COALESCE(m.like_count, 0),
+                      COALESCE(m.comment_count, 0), COALESCE(m.share_count, 0)
+               FROM material_campaign_urls u
+               LEFT JOIN campaign_url_metrics m ON m.material_id = u.material_id AND m.url_hash = u.url_hash
+               WHERE u.material_id IN %s
+               ORDER BY u.material_id, u.position
+           """
+        inserted = db_manager.execute(insert_query, (comparison_group_id, tuple(material_ids)))
+        if inserted:
+            count_cache.invalidate('material_comparison_groups:')
+            # 带入的历史数据可能已足够选出优选素材
+            get_winner_scorer().mark_dirty(material_ids)
+            details_cache.invalidate_groups([comparison_group_id])
 
         return jsonify({'status': 'success', 'message': 'Deployment group created successfully',
                         'group_id': comparison_group_id}), 200
@@ -327,10 +751,14 @@ def deployment_add():
 
 @api_bp.route('/deployment/list', methods=['GET'])
 def deployment_list():
-    """查询投放对比组列表(分页) """
+    """查询投放对比组列表(分页)
+    cursor: 可选, 上一页返回的 next_cursor; 传入时忽略 page
+    对比组ID以创建时间开头(P+yyyyMMddHHmmss+随机串), 按ID倒序即按创建时间倒序, 可直接走索引
+    """
     # 获取查询参数
     page = request.args.get('page', default=1, type=int)
     size = request.args.get('size', default=10, type=int)
+    cursor = request.args.get('cursor', default='', type=str)
     # 计算分页查询的偏移量
     offset = (page - 1) * size
 
@@ -341,13 +769,23 @@ def deployment_list():
                 GROUP_CONCAT(material_id) AS material_ids
             FROM 
                 material_comparison_groups
+            {where}
             GROUP BY 
                 comparison_group_id
             ORDER BY 
-                MAX(created_at) DESC
-            LIMIT %s OFFSET %s
+                comparison_group_id DESC
+            {limit}
         """
-    params = (size, offset)
+    if cursor:
+        try:
+            last = decode_cursor(cursor, {'g': str})
+        except InvalidCursorError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        query = query.format(where="WHERE comparison_group_id < %s", limit="LIMIT %s")
+        params = (last['g'], size)
+    else:
+        query = query.format(where="", limit="LIMIT %s OFFSET %s")
+        params = (size, offset)
 
     # 查询总记录数
     total_query = """
@@ -362,8 +800,9 @@ def deployment_list():
         if results is None:
             return jsonify({'status': 'error', 'message': 'No data found'}), 404
 
-        # 获取总记录数
-        total = db_manager.fetch_one(total_query)['total']
+        # 获取总记录数(短时间缓存)
+        total = count_cache.get('material_comparison_groups:total',
+                                lambda: db_manager.fetch_one(total_query)['total'])
 
         # 构造响应数据
         groups = []
@@ -373,10 +812,15 @@ def deployment_list():
                 "material_ids": row['material_ids'].split(',') if row['material_ids'] else []
             })
 
+        next_cursor = None
+        if len(results) == size:
+            next_cursor = encode_cursor({'g': results[-1]['comparison_group_id']})
+
         response_data = {
             "total": total,
             "page": page,
             "size": size,
+            "next_cursor": next_cursor,
             "groups": groups
         }
 
@@ -387,65 +831,73 @@ def deployment_list():
         return jsonify({'status': 'error', 'message': f'Failed to retrieve deployment group list: {str(e)}'}), 500
 
 
+DETAILS_QUERY = """
+        SELECT 
+            m.material_id, 
+            m.preview_url as video_url, 
+            mc.campaign_url AS deployment_url,
+            mc.click_count AS clicks,
+            mc.completion_count AS completes,
+            mc.like_count AS likes,
+            mc.comment_count AS comments,
+            mc.share_count AS shares,
+            mc.is_system_preferred AS is_preferred,
+            mc.engagement_rate,
+            mc.win_probability,
+            mc.p_value
+        FROM 
+            video_materials m
+        JOIN 
+            material_comparison_groups mc ON m.material_id = mc.material_id
+        WHERE 
+            mc.comparison_group_id = %s
+    """
+
+
+def load_deployment_details(group_id):
+    """查询对比组详情, 返回 (响应数据, 素材ID列表), 供详情缓存未命中时调用"""
+    results = db_manager.fetch_all(DETAILS_QUERY, (group_id,))
+    materials = []
+    for row in results:
+        materials.append({
+            "material_id": row['material_id'],
+            "video_url": row['video_url'],
+            "deployment_url": row['deployment_url'],
+            "clicks": row['clicks'],
+            "completes": row['completes'],
+            "likes": row['likes'],
+            "comments": row['comments'],
+            "shares": row['shares'],
+            "is_preferred": row['is_preferred'],
+            # 优选评分, 未评分时为 null
+            "score": row['engagement_rate'],
+            "win_probability": row['win_probability'],
+            "p_value": row['p_value']
+        })
+    return {"group_id": group_id, "materials": materials}, [m['material_id'] for m in materials]
+
+
 @api_bp.route('/deployment/details', methods=['GET'])
 def deployment_details():
-    """根据对比组ID查询素材列表详情接口 """
+    """根据对比组ID查询素材列表详情接口
+    响应带 ETag, 请求带 If-None-Match 且数据未变化时返回 304; 缓存命中时不查询数据库
+    """
     # 获取查询参数
     group_id = request.args.get('group_id', default='', type=str)
-    print('group_id', group_id)
     if not group_id:
         return jsonify({'status': 'error', 'message': 'Group ID is required'}), 400
 
-        # 查询数据库获取素材详情
-    query = """
-            SELECT 
-                m.material_id, 
-                m.preview_url as video_url, 
-                mc.campaign_url AS deployment_url,
-                mc.click_count AS clicks,
-                mc.completion_count AS completes,
-                mc.like_count AS likes,
-                mc.comment_count AS comments,
-                mc.share_count AS shares,
-                mc.is_system_preferred AS is_preferred
-            FROM 
-                video_materials m
-            JOIN 
-                material_comparison_groups mc ON m.material_id = mc.material_id
-            WHERE 
-                mc.comparison_group_id = %s
-        """
-    params = (group_id,)
-
     try:
-        # 执行查询并获取结果
-        results = db_manager.fetch_all(query, params)
-        if results is None:
-            return jsonify({'status': 'error', 'message': 'No data found for the given group ID'}), 400
-
-        # 构造响应数据
-        materials = []
-        for row in results:
-            material = {
-                "material_id": row['material_id'],
-                "video_url": row['video_url'],
-                "deployment_url": row['deployment_url'],
-                "clicks": row['clicks'],
-                "completes": row['completes'],
-                "likes": row['likes'],
-                "comments": row['comments'],
-                "shares": row['shares'],
-                "is_preferred": row['is_preferred']
-            }
-            materials.append(material)
-
-        response_data = {
-            "group_id": group_id,
-            "materials": materials
-        }
-
-        return jsonify(
-            {'status': 'success', 'message': 'Material details retrieved successfully', 'data': response_data}), 200
+        response_data, etag = details_cache.get(group_id, lambda: load_deployment_details(group_id))
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify({'status': 'success', 'message': 'Material details retrieved successfully',
+                                'data': response_data})
+        response.set_etag(etag)
+        # 浏览器每次都带 If-None-Match 回源校验
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
 
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'Failed to retrieve material details: {str(e)}'}), 500
@@ -453,14 +905,28 @@ def deployment_details():
 
 @api_bp.route('/deployment/data', methods=['POST'])
 def deployment_data():
-    """投放数据抓取接口(爬虫接口)"""
+    """投放数据上报接口(爬虫接口)
+    请求体: 单条数据、数据列表或 {"metrics": [...]}; 每条包含 material_id、deployment_url,
+    clicks/completes/likes/comments/shares, mode 为 snapshot(累计值, 默认) 或 delta(增量)
+    数据合并后由后台批量写入, 接口返回 202; 待写入数据过多时返回 429, 调用方按 Retry-After 重试
+    """
     try:
         data = request.get_json()
-        if not data or not data.get('material_id') or not data.get('deployment_url'):
+        if isinstance(data, dict) and 'metrics' in data:
+            data = data['metrics']
+        items = data if isinstance(data, list) else [data]
+        if not data or any(not isinstance(item, dict) or not item.get('material_id') or not item.get('deployment_url')
+                           for item in items):
             return jsonify({'status': 'error', 'message': 'material_id or deployment_url is null'}), 400
-        result = []
-        return jsonify({'status': 'success', 'message': 'Deployment data retrieved successfully', 'data': result}), 200
+        accepted = metrics_ingestor.submit(items, timeout=METRICS_SUBMIT_TIMEOUT)
+        return jsonify({'status': 'success', 'message': 'Deployment data accepted',
+                        'data': {'accepted': accepted}}), 202
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except BackpressureError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429, {'Retry-After': '1'}
     except Exception as e:
+        traceback.print_exc()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
@@ -472,4 +938,22 @@ def upload_file():
     file = request.files['file']
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
-    return minioUploader.upload_file(file)
+    return get_uploader().upload_file(file)
+
+
+@api_bp.route('/upload/stream', methods=['PUT', 'POST'])
+def upload_stream():
+    """原始请求体流式上传接口, 请求体直接写入MinIO, 不经过 multipart 解析和临时文件
+    filename: 查询参数, 文件名
+    """
+    filename = request.args.get('filename', default='', type=str)
+    if not filename:
+        return jsonify({"error": "filename is required"}), 400
+    try:
+        result = get_uploader().upload_stream(request.stream, filename, length=request.content_length or -1,
+                                              content_type=request.mimetype or None)
+        return jsonify({"message": "File uploaded successfully", "url": result["url"],
+                        "preview_url": result["preview_url"]})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
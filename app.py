@@ -1,10 +1,22 @@
 """
 Main application entry point.
 Run this file to start the Flask web service.
+
+GEVENT_MODE=True 时直接运行本文件会先打 gevent 补丁再导入应用; gunicorn 的 worker 类型见 gunicorn.conf.py.
 """
-from api import create_app
+import os
+
+from dotenv import load_dotenv
+
+# gevent 补丁必须先于 api/db/upload 等模块的导入, 否则这些模块创建的锁和连接仍是阻塞实现
+load_dotenv()
+if __name__ == '__main__' and os.getenv("GEVENT_MODE") == "True":
+    from concurrency import patch_gevent
+    patch_gevent()
+
+from api import create_app  # noqa: E402
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=5000)
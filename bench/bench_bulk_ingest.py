@@ -0,0 +1,84 @@
+"""
+素材导入吞吐对比: 逐条调用 /api/video/add 与一次调用 /api/video/batch_add(JSON 数组 / NDJSON).
+
+需要已启动的服务; 写入的素材标题以 bench-<pid>- 开头, --cleanup 时用 .env 中的数据库配置删除.
+
+用法:
+    python bench/bench_bulk_ingest.py --base-url http://127.0.0.1:5000 --rows 2000 --cleanup
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+
+def make_rows(tag, count):
+    return [{'video_url': f'http://example.com/{tag}/{i}.mp4', 'preview_url': f'http://example.com/{tag}/{i}.jpg',
+             'title': f'{tag}-{i}', 'type': 1} for i in range(count)]
+
+
+def single(session, base_url, rows):
+    for row in rows:
+        response = session.post(f'{base_url}/api/video/add', json=row, timeout=30)
+        response.raise_for_status()
+
+
+def batch_json(session, base_url, rows):
+    response = session.post(f'{base_url}/api/video/batch_add', json=rows, timeout=600)
+    response.raise_for_status()
+    assert response.json()['failed'] == 0, response.json()['message']
+
+
+def batch_ndjson(session, base_url, rows):
+    body = ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+    response = session.post(f'{base_url}/api/video/batch_add', data=body, timeout=600,
+                            headers={'Content-Type': 'application/x-ndjson'})
+    response.raise_for_status()
+    assert response.json()['failed'] == 0, response.json()['message']
+
+
+def cleanup(tag):
+    from dotenv import load_dotenv
+    from db.db import DBManager
+    load_dotenv()
+    db = DBManager(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT", 3306)), user=os.getenv("DB_USER"),
+                   password=os.getenv("DB_PASSWORD"), database=os.getenv("DB_DATABASE"), pool_size=1)
+    deleted = db.execute("DELETE FROM video_materials WHERE title LIKE %s", (f'{tag}-%',))
+    db.close()
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--single-rows', type=int, default=200, help='逐条接口只测这么多行, 避免耗时过长')
+    parser.add_argument('--cleanup', action='store_true', help='结束后删除写入的素材')
+    args = parser.parse_args()
+
+    tag = f'bench-{os.getpid()}'
+    session = requests.Session()
+    report = {}
+    try:
+        for name, func, count in (('single', single, args.single_rows),
+                                  ('batch_json', batch_json, args.rows),
+                                  ('batch_ndjson', batch_ndjson, args.rows)):
+            rows = make_rows(f'{tag}-{name}', count)
+            start = time.perf_counter()
+            func(session, args.base_url, rows)
+            elapsed = time.perf_counter() - start
+            report[name] = {'rows': count, 'seconds': round(elapsed, 3), 'rows_per_sec': round(count / elapsed, 1)}
+        report['speedup'] = round(report['batch_json']['rows_per_sec'] / report['single']['rows_per_sec'], 1)
+    finally:
+        if args.cleanup:
+            report['deleted'] = cleanup(tag)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
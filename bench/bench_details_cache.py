@@ -0,0 +1,77 @@
+"""
+对比组详情缓存测试: 模拟看板轮询(按 Zipf 分布访问对比组)和持续写入的投放数据, 统计命中率、每次请求耗时和
+查库次数, 并检查失效后不会返回旧数据.
+
+不需要数据库和 Redis: 查库用固定延迟的函数模拟, 数据版本由测试自己维护.
+
+用法:
+    python bench/bench_details_cache.py --groups 5000 --requests 200000 --flush-every 500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deployment.details_cache import DetailsCache  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=5000)
+    parser.add_argument('--size', type=int, default=4, help='每组素材数')
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--flush-every', type=int, default=500, help='每 N 个请求写入一批投放数据')
+    parser.add_argument('--flush-materials', type=int, default=50, help='每批写入涉及的素材数')
+    parser.add_argument('--query-ms', type=float, default=5.0, help='模拟查库耗时')
+    parser.add_argument('--max-entries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    members = {f'G{g}': [f'M{g}-{i}' for i in range(args.size)] for g in range(args.groups)}
+    all_materials = [m for group in members.values() for m in group]
+    versions = dict.fromkeys(all_materials, 0)
+    weights = [1.0 / (rank + 1) for rank in range(args.groups)]
+    group_ids = list(members)
+    cache = DetailsCache(max_entries=args.max_entries, ttl=3600)
+    queries = [0]
+
+    def load(group_id):
+        queries[0] += 1
+        time.sleep(args.query_ms / 1000)
+        data = {'group_id': group_id, 'materials': [{'material_id': m, 'version': versions[m]}
+                                                    for m in members[group_id]]}
+        return data, members[group_id]
+
+    stale = 0
+    start = time.perf_counter()
+    for n, group_id in enumerate(rng.choices(group_ids, weights, k=args.requests)):
+        if n % args.flush_every == 0:
+            touched = rng.sample(all_materials, args.flush_materials)
+            for material_id in touched:
+                versions[material_id] += 1
+            cache.invalidate_materials(touched)
+        data, _ = cache.get(group_id, lambda: load(group_id))
+        stale += any(item['version'] != versions[item['material_id']] for item in data['materials'])
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'requests': args.requests,
+        'db_queries': queries[0],
+        'hit_ratio': round(1 - queries[0] / args.requests, 4),
+        'avg_ms': round(elapsed * 1000 / args.requests, 3),
+        'uncached_avg_ms': args.query_ms,
+        'stale_responses': stale,
+        'cache': cache.stats(),
+    }
+    print(json.dumps(report, indent=2))
+    if stale:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
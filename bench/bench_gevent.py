@@ -0,0 +1,185 @@
+"""
+gevent worker 压测: 分别以 sync 和 gevent worker 启动 gunicorn(使用仓库的 gunicorn.conf.py),
+对 I/O 密集接口逐级加并发, 比较吞吐和延迟, 同时持续探测健康检查的延迟.
+
+被测应用就是本文件中的 app, 不需要数据库:
+    /health      立即返回
+    /io          通过共享 HTTP 客户端请求本地慢上游(--upstream-ms), 模拟数据库/MinIO/大模型等待
+    /cpu         计算 sha256(--cpu-mb), offload=1 时经 concurrency.run_cpu_bound 放到原生线程池
+
+用法:
+    python bench/bench_gevent.py --workers 2 --levels 1,8,32,128 --seconds 5
+    python bench/bench_gevent.py --classes gevent --path /cpu --levels 4,16
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import Flask, jsonify, request  # noqa: E402
+
+from concurrency import gevent_patched, run_cpu_bound  # noqa: E402
+from http_client import get_http_client  # noqa: E402
+
+app = Flask(__name__)
+
+
+@app.route('/health')
+def health():
+    return jsonify({'status': 'ok', 'gevent': gevent_patched()})
+
+
+@app.route('/io')
+def io_bound():
+    response = get_http_client().get(os.environ['BENCH_UPSTREAM'])
+    return jsonify({'status': response.status_code})
+
+
+def _burn(mb):
+    data = b'x' * (1024 * 1024)
+    digest = hashlib.sha256()
+    for _ in range(mb):
+        digest.update(data)
+    return digest.hexdigest()
+
+
+@app.route('/cpu')
+def cpu_bound():
+    mb = int(os.getenv('BENCH_CPU_MB', 64))
+    if request.args.get('offload', '1') == '1':
+        return jsonify({'digest': run_cpu_bound(_burn, mb)})
+    return jsonify({'digest': _burn(mb)})
+
+
+def start_upstream(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1)
+
+
+def get(url, timeout=60):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def load(url, health_url, concurrency, seconds):
+    stop = threading.Event()
+    latencies, health, errors = [], [], [0]
+    lock = threading.Lock()
+
+    def client():
+        while not stop.is_set():
+            try:
+                elapsed = get(url)
+                with lock:
+                    latencies.append(elapsed)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    def prober():
+        while not stop.is_set():
+            try:
+                health.append(get(health_url, timeout=30))
+            except Exception:
+                health.append(30.0)
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)] + [threading.Thread(target=prober)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {'concurrency': concurrency, 'requests': len(latencies), 'errors': errors[0],
+            'rps': round(len(latencies) / elapsed, 1), 'p50_ms': percentile(latencies, 0.5),
+            'p99_ms': percentile(latencies, 0.99), 'health_p50_ms': percentile(health, 0.5),
+            'health_max_ms': percentile(health, 1.0)}
+
+
+def run_server(worker_class, args, upstream_url, port):
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKER_CONNECTIONS=str(args.worker_connections),
+               BENCH_UPSTREAM=upstream_url, BENCH_CPU_MB=str(args.cpu_mb),
+               HTTP_POOL_MAXSIZE=str(args.worker_connections))
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                'bench.bench_gevent:app'], cwd=ROOT, env=env)
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            get(base + '/health', timeout=1)
+            return process, base
+        except Exception:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'gunicorn ({worker_class}) did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', default='sync,gevent')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-connections', type=int, default=1000)
+    parser.add_argument('--levels', default='1,8,32,128', help='逗号分隔的并发数')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--path', default='/io', help='/io 或 /cpu?offload=1 等')
+    parser.add_argument('--upstream-ms', type=float, default=200)
+    parser.add_argument('--cpu-mb', type=int, default=64)
+    parser.add_argument('--port', type=int, default=8950)
+    args = parser.parse_args()
+
+    upstream, upstream_url = start_upstream(args.upstream_ms / 1000)
+    report = {'path': args.path, 'workers': args.workers, 'upstream_ms': args.upstream_ms, 'results': {}}
+    try:
+        for i, worker_class in enumerate(args.classes.split(',')):
+            process, base = run_server(worker_class, args, upstream_url, args.port + i)
+            try:
+                report['results'][worker_class] = [
+                    load(base + args.path, base + '/health', int(level), args.seconds)
+                    for level in args.levels.split(',')]
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        upstream.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+关键帧提取基准: 对比 exact 与 fast 模式的处理速度和关键帧一致性.
+
+用法:
+    python bench/bench_keyframes.py video.mp4 [--downscale 4] [--frame-skip 1] [--detector content]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scenedetect import open_video  # noqa: E402
+from utils import extract_key_frames  # noqa: E402
+
+
+def run(video_path, mode, **kwargs):
+    output_dir = tempfile.mkdtemp(prefix=f'bench_{mode}_')
+    start = time.perf_counter()
+    starts = extract_key_frames(video_path, output_dir, mode=mode, **kwargs)
+    elapsed = time.perf_counter() - start
+    for name in os.listdir(output_dir):
+        os.remove(os.path.join(output_dir, name))
+    os.rmdir(output_dir)
+    return starts, elapsed
+
+
+def agreement(reference, candidate, tolerance):
+    """参考模式中的场景起点有多少在容差内被候选模式找到"""
+    if not reference:
+        return 1.0
+    matched = sum(1 for r in reference if any(abs(r - c) <= tolerance for c in candidate))
+    return matched / len(reference)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--downscale', type=int, default=4)
+    parser.add_argument('--frame-skip', type=int, default=1)
+    parser.add_argument('--detector', default='content', choices=['content', 'adaptive', 'threshold'])
+    parser.add_argument('--tolerance', type=float, default=0.5, help='场景起点匹配容差(秒)')
+    args = parser.parse_args()
+
+    total_frames = open_video(args.video).duration.get_frames()
+    exact_starts, exact_time = run(args.video, 'exact')
+    fast_starts, fast_time = run(args.video, 'fast', downscale=args.downscale,
+                                 frame_skip=args.frame_skip, detector=args.detector)
+
+    report = {
+        'video': args.video,
+        'frames': total_frames,
+        'exact': {'seconds': round(exact_time, 3), 'fps': round(total_frames / exact_time, 1),
+                  'keyframes': len(exact_starts)},
+        'fast': {'seconds': round(fast_time, 3), 'fps': round(total_frames / fast_time, 1),
+                 'keyframes': len(fast_starts), 'downscale': args.downscale,
+                 'frame_skip': args.frame_skip, 'detector': args.detector},
+        'speedup': round(exact_time / fast_time, 2),
+        'recall': round(agreement(exact_starts, fast_starts, args.tolerance), 3),
+        'precision': round(agreement(fast_starts, exact_starts, args.tolerance), 3),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
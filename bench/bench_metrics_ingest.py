@@ -0,0 +1,122 @@
+"""
+投放数据写入吞吐: 多个线程持续上报, 对比 MetricsIngestor 批量写入与逐条 upsert 的每秒更新数.
+
+使用 .env 中的数据库配置(需已执行迁移 006), 压测数据的素材ID以 BENCH<pid>- 开头, 结束后删除.
+
+用法:
+    python bench/bench_metrics_ingest.py --threads 8 --keys 20000 --seconds 20
+    python bench/bench_metrics_ingest.py --naive --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+from db.db import DBManager  # noqa: E402
+from deployment.metrics import MetricsIngestor, BackpressureError, DELTA_UPSERT  # noqa: E402
+
+
+def make_db(pool_size):
+    load_dotenv()
+    return DBManager(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT", 3306)), user=os.getenv("DB_USER"),
+                     password=os.getenv("DB_PASSWORD"), database=os.getenv("DB_DATABASE"),
+                     pool_size=pool_size, wait_timeout=60)
+
+
+def make_update(prefix, keys):
+    n = random.randrange(keys)
+    return {'material_id': f'{prefix}{n % 1000}', 'deployment_url': f'http://bench.local/{n}', 'mode': 'delta',
+            'clicks': 1, 'likes': random.randint(0, 1)}
+
+
+def produce(stop, submit, prefix, keys, batch, counter):
+    local = rejected = 0
+    while not stop.is_set():
+        items = [make_update(prefix, keys) for _ in range(batch)]
+        try:
+            submit(items)
+            local += len(items)
+        except BackpressureError:
+            rejected += len(items)
+            time.sleep(0.05)
+    with counter['lock']:
+        counter['submitted'] += local
+        counter['rejected'] += rejected
+
+
+def run(submit, args, prefix):
+    stop = threading.Event()
+    counter = {'lock': threading.Lock(), 'submitted': 0, 'rejected': 0}
+    threads = [threading.Thread(target=produce, args=(stop, submit, prefix, args.keys, args.batch, counter))
+               for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counter, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--keys', type=int, default=20000, help='不同 (素材, 投放链接) 的数量')
+    parser.add_argument('--batch', type=int, default=50, help='每次上报的条数')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    parser.add_argument('--max-batch', type=int, default=5000)
+    parser.add_argument('--max-pending', type=int, default=100000)
+    parser.add_argument('--fsync', action='store_true', help='日志每次追加后 fsync')
+    parser.add_argument('--naive', action='store_true', help='逐条 upsert 作为对照')
+    args = parser.parse_args()
+
+    prefix = f'BENCH{os.getpid()}-'
+    db = make_db(pool_size=args.threads + 2)
+    journal_dir = tempfile.mkdtemp(prefix='bench_metrics_journal_')
+    report = {'mode': 'naive' if args.naive else 'ingestor', 'threads': args.threads, 'keys': args.keys}
+    try:
+        if args.naive:
+            def submit(items):
+                for item in items:
+                    db.execute(DELTA_UPSERT, (item['material_id'], item['deployment_url'], item['clicks'], 0,
+                                              item['likes'], 0, 0))
+            counter, elapsed = run(submit, args, prefix)
+            drain = 0.0
+        else:
+            ingestor = MetricsIngestor(db, flush_interval=args.flush_interval, max_batch=args.max_batch,
+                                       max_pending=args.max_pending, journal_dir=journal_dir, fsync=args.fsync)
+            counter, elapsed = run(lambda items: ingestor.submit(items, timeout=1.0), args, prefix)
+            drain_start = time.perf_counter()
+            ingestor.close()
+            drain = time.perf_counter() - drain_start
+            report['ingestor'] = ingestor.stats()
+        written = db.fetch_one("SELECT COALESCE(SUM(click_count), 0) AS clicks FROM campaign_url_metrics "
+                               "WHERE material_id LIKE %s", (prefix + '%',))['clicks']
+        report.update({
+            'submitted': counter['submitted'],
+            'rejected': counter['rejected'],
+            'seconds': round(elapsed, 2),
+            'drain_seconds': round(drain, 2),
+            'updates_per_sec': round(counter['submitted'] / (elapsed + drain), 1),
+            'clicks_in_db': int(written),
+            'consistent': int(written) == counter['submitted'],
+        })
+    finally:
+        db.execute("DELETE FROM campaign_url_metrics WHERE material_id LIKE %s", (prefix + '%',))
+        db.close()
+        shutil.rmtree(journal_dir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+对比组评分测试: 生成已知真实互动率的合成对比组, 统计 score_groups 的耗时, 以及标记为优选的素材中真实最优的比例.
+
+不需要数据库. 每组 2~size 个素材, 其中一个(随机位置)的真实互动率比其余高 lift, 点击量在 [min, max] 内随机.
+
+用法:
+    python bench/bench_scoring.py --groups 50000 --size 4 --samples 1000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deployment.scoring import METRIC_COLUMNS, score_groups  # noqa: E402
+
+
+def make_groups(rng, groups, size, base_rate, lift, min_clicks, max_clicks):
+    """
+    :return: (group_index, counts, is_best)
+    """
+    sizes = rng.integers(2, size + 1, groups)
+    group_index = np.repeat(np.arange(groups), sizes)
+    rows = len(group_index)
+    starts = np.cumsum(sizes) - sizes
+    best_rows = starts + rng.integers(0, sizes)
+    is_best = np.zeros(rows, dtype=bool)
+    is_best[best_rows] = True
+
+    true_rate = np.where(is_best, base_rate * (1.0 + lift), base_rate) * rng.uniform(0.95, 1.05, rows)
+    clicks = rng.integers(min_clicks, max_clicks + 1, rows)
+    # 各指标按同一真实互动率二项采样, 加权平均后仍以 true_rate 为期望
+    counts = np.zeros((rows, len(METRIC_COLUMNS)))
+    counts[:, 0] = clicks
+    for column in range(1, len(METRIC_COLUMNS)):
+        counts[:, column] = rng.binomial(clicks, np.clip(true_rate, 0.0, 1.0))
+    return group_index, counts, is_best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=50000)
+    parser.add_argument('--size', type=int, default=4, help='每组最多素材数')
+    parser.add_argument('--samples', type=int, default=1000)
+    parser.add_argument('--base-rate', type=float, default=0.05)
+    parser.add_argument('--lift', type=float, default=0.3, help='最优素材相对提升')
+    parser.add_argument('--min-clicks', type=int, default=200)
+    parser.add_argument('--max-clicks', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    group_index, counts, is_best = make_groups(rng, args.groups, args.size, args.base_rate, args.lift,
+                                               args.min_clicks, args.max_clicks)
+    start = time.perf_counter()
+    scores = score_groups(group_index, counts, samples=args.samples, rng=np.random.default_rng(args.seed + 1))
+    elapsed = time.perf_counter() - start
+
+    preferred = scores['preferred']
+    flagged = int(preferred.sum())
+    correct = int((preferred & is_best).sum())
+    flagged_groups = np.unique(group_index[preferred])
+    report = {
+        'groups': args.groups,
+        'rows': len(group_index),
+        'samples': args.samples,
+        'seconds': round(elapsed, 3),
+        'groups_per_sec': round(args.groups / elapsed, 1),
+        'flagged': flagged,
+        'flagged_group_ratio': round(len(flagged_groups) / args.groups, 4),
+        'precision': round(correct / flagged, 4) if flagged else None,
+        'one_per_group': len(flagged_groups) == flagged,
+        'best_p_value_median': round(float(np.median(scores['p_value'][is_best])), 6),
+    }
+    print(json.dumps(report, indent=2))
+    if not report['one_per_group'] or (flagged and report['precision'] < 0.9):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
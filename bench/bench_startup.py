@@ -0,0 +1,159 @@
+"""
+启动耗时测试: 在全新的解释器中导入应用并处理第一个健康检查, 统计耗时和导入最慢的模块;
+再测量 preload 模式下 fork 出的子进程处理第一个请求的耗时.
+
+--baseline 指定一个 git 版本(如 HEAD~1)时, 在临时 worktree 中用同样的方式测量, 输出前后对比.
+本地启动一个模拟 MinIO(只响应 bucket 查询), 使在导入时检查存储桶的旧版本也能离线运行.
+
+用法:
+    python bench/bench_startup.py --runs 5
+    python bench/bench_startup.py --baseline HEAD~1 --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START = r'''
+import json, time
+start = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get('/api/health')
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_health_ms': (time.perf_counter() - start) * 1000}))
+'''
+
+FORK_READY = r'''
+import json, os, time
+from app import app
+samples = []
+for _ in range(%d):
+    read_fd, write_fd = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        app.test_client().get('/api/health')
+        os.write(write_fd, str(time.perf_counter() - start).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        samples.append(float(f.read()) * 1000)
+    os.waitpid(pid, 0)
+print(json.dumps({'fork_ready_ms': samples}))
+'''
+
+
+def start_fake_minio():
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body=b''):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            self._reply()
+
+        def do_GET(self):
+            if 'location' in self.path:
+                return self._reply(b'<?xml version="1.0" encoding="UTF-8"?><LocationConstraint '
+                                   b'xmlns="http://s3.amazonaws.com/doc/2006-03-01/"></LocationConstraint>')
+            self._reply()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_env(minio_port):
+    env = dict(os.environ)
+    env.update({'DB_HOST': '127.0.0.1', 'DB_PORT': '3306', 'DB_USER': 'bench', 'DB_PASSWORD': 'bench',
+                'DB_DATABASE': 'adify', 'MINIO_ENDPOINT': f'127.0.0.1:{minio_port}', 'MINIO_SECURE': 'False',
+                'MINIO_ACCESS_KEY': 'bench', 'MINIO_SECRET_KEY': 'benchbench', 'BUCKET_NAME': 'bench',
+                'MINIO_ENDPOINT_PROXY': f'http://127.0.0.1:{minio_port}', 'OPENAI_API_KEY': 'bench',
+                'LLM_CACHE_BACKEND': 'memory', 'PYTHONDONTWRITEBYTECODE': '1'})
+    return env
+
+
+def run_python(tree, env, code, importtime=False):
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    completed = subprocess.run(cmd, cwd=tree, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f'{tree}: {completed.stderr[-2000:]}')
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_imports(stderr, top):
+    """解析 -X importtime 输出, 返回累计耗时最长的顶层包"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 嵌套导入带缩进, 只统计顶层包
+        name = name[1:]
+        if name.startswith(' ') or '.' in name:
+            continue
+        packages[name] = max(packages.get(name, 0), int(cumulative))
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for name, us in ranked]
+
+
+def measure(tree, env, runs, forks, top):
+    samples = [run_python(tree, env, COLD_START)[0] for _ in range(runs)]
+    _, stderr = run_python(tree, env, COLD_START, importtime=True)
+    fork = run_python(tree, env, FORK_READY % forks)[0]['fork_ready_ms']
+    return {
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'first_health_ms': round(statistics.median(s['first_health_ms'] for s in samples), 1),
+        'preload_fork_ready_ms': round(statistics.median(fork), 1),
+        'slowest_imports': slowest_imports(stderr, top),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', help='对比的 git 版本')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--forks', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    server = start_fake_minio()
+    env = bench_env(server.server_address[1])
+    report = {}
+    worktree = None
+    try:
+        report['current'] = measure(ROOT, env, args.runs, args.forks, args.top)
+        if args.baseline:
+            worktree = tempfile.mkdtemp(prefix='adify_baseline_')
+            subprocess.run(['git', 'worktree', 'add', '--detach', worktree, args.baseline], cwd=ROOT, check=True,
+                           capture_output=True)
+            report['baseline'] = dict(measure(worktree, env, args.runs, args.forks, args.top), rev=args.baseline)
+            report['speedup'] = {key: round(report['baseline'][key] / report['current'][key], 2)
+                                 for key in ('import_ms', 'first_health_ms')}
+    finally:
+        server.shutdown()
+        if worktree:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree], cwd=ROOT, capture_output=True)
+            shutil.rmtree(worktree, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
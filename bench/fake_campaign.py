@@ -0,0 +1,143 @@
+"""
+本地投放链接模拟服务, 用于爬虫测试, 不访问真实投放平台.
+
+- GET /c/<id>  返回 JSON 指标, 每 change_every 秒增长一次; 支持 ETag/If-None-Match 和 Last-Modified/If-Modified-Since
+- 每个请求延迟 latency 秒, 记录请求数、304 数和最大同时处理的请求数(用于检查单域名并发限制)
+- 不同端口视为不同域名
+
+用法:
+    python bench/fake_campaign.py --port 8902 --latency 0.05 --change-every 60
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_CAMPAIGN_PATH = re.compile(r'^/c/([^/]+)$')
+
+
+class FakeCampaign:
+    """指标生成和请求计数"""
+
+    def __init__(self, latency=0.05, change_every=60.0, conditional=True, fail_every=0):
+        self.latency = latency
+        self.change_every = change_every
+        self.conditional = conditional
+        self.fail_every = fail_every
+        self.started = time.time()
+        self.requests = {'total': 0, 'not_modified': 0, 'errors': 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.requests['total'] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return self.requests['total']
+
+    def leave(self, status):
+        with self._lock:
+            self.in_flight -= 1
+            if status == 304:
+                self.requests['not_modified'] += 1
+            elif status >= 500:
+                self.requests['errors'] += 1
+
+    def version(self):
+        """当前数据版本号及其生效时间"""
+        version = int((time.time() - self.started) // self.change_every)
+        return version, self.started + version * self.change_every
+
+    def metrics(self, campaign_id, version):
+        seed = zlib.crc32(campaign_id.encode('utf-8'))
+        base = seed % 1000 + version * (seed % 50 + 1)
+        return {'clicks': base * 10, 'completes': base * 3, 'likes': base, 'comments': base // 5,
+                'shares': base // 10}
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, body=None, headers=None):
+            payload = json.dumps(body).encode('utf-8') if body is not None else b''
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if body is not None:
+                self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            fake.leave(status)
+
+        def do_GET(self):
+            number = fake.enter()
+            time.sleep(fake.latency)
+            match = _CAMPAIGN_PATH.match(self.path.split('?')[0])
+            if not match:
+                return self._send(404, {'error': 'not found'})
+            if fake.fail_every and number % fake.fail_every == 0:
+                return self._send(503, {'error': 'unavailable'})
+            campaign_id = match.group(1)
+            version, changed_at = fake.version()
+            headers = {}
+            if fake.conditional:
+                etag = f'"{campaign_id}-{version}"'
+                headers = {'ETag': etag, 'Last-Modified': formatdate(changed_at, usegmt=True)}
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, headers=headers)
+                since = self.headers.get('If-Modified-Since')
+                if since and not self.headers.get('If-None-Match'):
+                    try:
+                        if parsedate_to_datetime(since).timestamp() >= int(changed_at):
+                            return self._send(304, headers=headers)
+                    except (TypeError, ValueError):
+                        pass
+            self._send(200, fake.metrics(campaign_id, version), headers)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_campaign(port=0, **kwargs):
+    """
+    在后台线程启动模拟服务
+    :return: (server, fake, base_url)
+    """
+    fake = FakeCampaign(**kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8902)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--change-every', type=float, default=60.0)
+    parser.add_argument('--no-conditional', action='store_true', help='不返回 ETag/Last-Modified')
+    parser.add_argument('--fail-every', type=int, default=0, help='每 N 个请求返回一次 503, 0 表示不失败')
+    args = parser.parse_args()
+    server, fake, base_url = start_fake_campaign(args.port, latency=args.latency, change_every=args.change_every,
+                                                 conditional=not args.no_conditional, fail_every=args.fail_every)
+    print(f'fake campaign server listening on {base_url}')
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(dict(fake.requests, max_in_flight=fake.max_in_flight)))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
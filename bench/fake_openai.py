@@ -0,0 +1,131 @@
+"""
+本地 OpenAI 兼容模拟服务, 用于标题生成等大模型调用的离线测试.
+
+- POST /v1/chat/completions   固定返回广告标题 JSON, stream=true 时按 SSE 分块返回
+  latency 秒后响应, 模拟模型耗时; 统计请求数和请求体大小(图片载荷)
+
+用法:
+    python bench/fake_openai.py --port 8902 --latency 1.5
+    OPENAI_BASE_URL=http://127.0.0.1:8902/v1 OPENAI_API_KEY=bench python -m app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TITLES = ['限时特惠, 一键get同款', '三秒看懂为什么大家都在买', '这个价格真的不多见了']
+
+
+class FakeOpenAI:
+    """请求计数和固定回复"""
+
+    def __init__(self, latency=0.0, titles=None):
+        self.latency = latency
+        self.titles = titles or DEFAULT_TITLES
+        self.requests = {'chat': 0, 'stream': 0}
+        self.bytes_in = 0
+        self.images = 0
+        self._lock = threading.Lock()
+
+    def content(self):
+        return '```json\n' + json.dumps({'广告标题': self.titles}, ensure_ascii=False) + '\n```'
+
+    def record(self, body, size):
+        images = 0
+        for message in body.get('messages') or []:
+            if isinstance(message.get('content'), list):
+                images += sum(1 for part in message['content'] if part.get('type') == 'image_url')
+        with self._lock:
+            self.requests['stream' if body.get('stream') else 'chat'] += 1
+            self.bytes_in += size
+            self.images += images
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'bytes_in': self.bytes_in, 'images': self.images}
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, body):
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length)
+            if self.path.split('?')[0].rstrip('/') != '/v1/chat/completions':
+                return self._send(404, {'error': {'message': 'not found'}})
+            body = json.loads(raw or b'{}')
+            fake.record(body, length)
+            if fake.latency:
+                time.sleep(fake.latency)
+            model = body.get('model') or 'bench'
+            content = fake.content()
+            if body.get('stream'):
+                return self._stream(model, content)
+            self._send(200, {
+                'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': length // 4, 'completion_tokens': len(content),
+                          'total_tokens': length // 4 + len(content)},
+            })
+
+        def _stream(self, model, content):
+            # 不带长度的流式响应, 以关闭连接结束
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+            for i, piece in enumerate(pieces):
+                chunk = {'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                         'model': model, 'choices': [{'index': 0, 'delta': {'content': piece},
+                                                      'finish_reason': 'stop' if i == len(pieces) - 1 else None}]}
+                self.wfile.write(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode('utf-8'))
+            self.wfile.write(b'data: [DONE]\n\n')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_openai(port=0, **kwargs):
+    """
+    在后台线程启动模拟服务
+    :return: (server, fake, base_url), base_url 已带 /v1, 可直接作为 OPENAI_BASE_URL
+    """
+    fake = FakeOpenAI(**kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8902)
+    parser.add_argument('--latency', type=float, default=0.0, help='每次调用的模拟耗时(秒)')
+    args = parser.parse_args()
+    server, fake, base_url = start_fake_openai(args.port, latency=args.latency)
+    print(f'fake openai listening on {base_url}')
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(fake.stats()))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
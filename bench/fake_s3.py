@@ -0,0 +1,268 @@
+"""
+本地 S3/MinIO 模拟服务, 实现 minio 客户端用到的最小接口, 对象保存在临时目录:
+
+- GET  /<bucket>?location              存储桶区域
+- HEAD/PUT /<bucket>                   存储桶查询/创建
+- PUT  /<bucket>/<key>                 单次上传
+- POST /<bucket>/<key>?uploads         创建分片上传; PUT ?partNumber&uploadId 上传分片;
+  POST ?uploadId 合并; DELETE ?uploadId 取消
+- GET/HEAD /<bucket>/<key>             下载(忽略预签名参数, 不校验签名)
+
+用法:
+    python bench/fake_s3.py --port 9900 --bucket adify
+    MINIO_ENDPOINT=127.0.0.1:9900 MINIO_ENDPOINT_PROXY=http://127.0.0.1:9900 BUCKET_NAME=adify python -m app
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+_NS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+CHUNK_SIZE = 1024 * 1024
+
+
+class FakeS3:
+    """对象索引和请求计数"""
+
+    def __init__(self, root=None, buckets=()):
+        self.root = root or tempfile.mkdtemp(prefix='fake_s3_')
+        self.buckets = set(buckets)
+        self.objects = {}
+        self.uploads = {}
+        self.requests = {'put': 0, 'get': 0, 'head': 0, 'multipart_parts': 0, 'multipart_complete': 0}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def count(self, name, bytes_in=0, bytes_out=0):
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def new_path(self):
+        with self._lock:
+            return os.path.join(self.root, f'{next(self._ids)}.obj')
+
+    def put_object(self, bucket, key, path, content_type):
+        """登记已写入 path 的对象, 同名对象覆盖"""
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                md5.update(chunk)
+        etag = md5.hexdigest()
+        with self._lock:
+            self.buckets.add(bucket)
+            old = self.objects.get((bucket, key))
+            self.objects[(bucket, key)] = {'path': path, 'etag': etag, 'size': os.path.getsize(path),
+                                           'content_type': content_type or 'application/octet-stream'}
+        if old is not None and old['path'] != path and os.path.exists(old['path']):
+            os.remove(old['path'])
+        return etag
+
+    def put_file(self, bucket, key, source_path, content_type=None):
+        """把本地文件复制为对象, 供测试数据准备使用"""
+        path = self.new_path()
+        shutil.copyfile(source_path, path)
+        return self.put_object(bucket, key, path, content_type)
+
+    def get_object(self, bucket, key):
+        with self._lock:
+            return self.objects.get((bucket, key))
+
+    def create_upload(self, bucket, key, content_type):
+        with self._lock:
+            upload_id = f'upload-{next(self._ids)}'
+            self.uploads[upload_id] = {'bucket': bucket, 'key': key, 'content_type': content_type, 'parts': {}}
+        return upload_id
+
+    def put_part(self, upload_id, number, path):
+        with open(path, 'rb') as f:
+            etag = hashlib.md5(f.read()).hexdigest()
+        with self._lock:
+            self.uploads[upload_id]['parts'][number] = (path, etag)
+        return etag
+
+    def complete_upload(self, upload_id):
+        with self._lock:
+            upload = self.uploads.pop(upload_id)
+        path = self.new_path()
+        with open(path, 'wb') as out:
+            for number in sorted(upload['parts']):
+                part_path, _ = upload['parts'][number]
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, out, CHUNK_SIZE)
+                os.remove(part_path)
+        return upload, self.put_object(upload['bucket'], upload['key'], path, upload['content_type'])
+
+    def abort_upload(self, upload_id):
+        with self._lock:
+            upload = self.uploads.pop(upload_id, None)
+        for part_path, _ in (upload or {}).get('parts', {}).values():
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'objects': len(self.objects),
+                    'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out}
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _xml(tag, **fields):
+    body = ''.join(f'<{name}>{value}</{name}>' for name, value in fields.items())
+    return f'<?xml version="1.0" encoding="UTF-8"?><{tag} xmlns="{_NS}">{body}</{tag}>'.encode('utf-8')
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _target(self):
+            url = urlsplit(self.path)
+            bucket, _, key = unquote(url.path).lstrip('/').partition('/')
+            return bucket, key, parse_qs(url.query, keep_blank_values=True)
+
+        def _send(self, status, body=b'', headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def _read_body(self, path=None):
+            """请求体写入 path(给定时)或返回 bytes"""
+            remaining = int(self.headers.get('Content-Length') or 0)
+            out = open(path, 'wb') if path else None
+            data = []
+            try:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    if out:
+                        out.write(chunk)
+                    else:
+                        data.append(chunk)
+            finally:
+                if out:
+                    out.close()
+            return b''.join(data)
+
+        def do_HEAD(self):
+            bucket, key, _ = self._target()
+            if not key:
+                return self._send(200 if bucket in fake.buckets else 404)
+            self._send_object(bucket, key)
+
+        def do_GET(self):
+            bucket, key, query = self._target()
+            if not key:
+                if 'location' in query:
+                    return self._send(200, _xml('LocationConstraint'), {'Content-Type': 'application/xml'})
+                return self._send(200 if bucket in fake.buckets else 404, _xml('ListBucketResult', Name=bucket))
+            self._send_object(bucket, key)
+
+        def _send_object(self, bucket, key):
+            obj = fake.get_object(bucket, key)
+            if obj is None:
+                return self._send(404, _xml('Error', Code='NoSuchKey', Key=key), {'Content-Type': 'application/xml'})
+            self.send_response(200)
+            self.send_header('Content-Type', obj['content_type'])
+            self.send_header('Content-Length', str(obj['size']))
+            self.send_header('ETag', f'"{obj["etag"]}"')
+            self.end_headers()
+            if self.command == 'HEAD':
+                fake.count('head')
+                return
+            with open(obj['path'], 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+            fake.count('get', bytes_out=obj['size'])
+
+        def do_PUT(self):
+            bucket, key, query = self._target()
+            if not key:
+                self._read_body()
+                fake.buckets.add(bucket)
+                return self._send(200)
+            path = fake.new_path()
+            self._read_body(path)
+            size = os.path.getsize(path)
+            if 'uploadId' in query:
+                etag = fake.put_part(query['uploadId'][0], int(query['partNumber'][0]), path)
+                fake.count('multipart_parts', bytes_in=size)
+            else:
+                etag = fake.put_object(bucket, key, path, self.headers.get('Content-Type'))
+                fake.count('put', bytes_in=size)
+            self._send(200, headers={'ETag': f'"{etag}"'})
+
+        def do_POST(self):
+            bucket, key, query = self._target()
+            self._read_body()
+            if 'uploads' in query:
+                upload_id = fake.create_upload(bucket, key, self.headers.get('Content-Type'))
+                return self._send(200, _xml('InitiateMultipartUploadResult', Bucket=bucket, Key=key,
+                                            UploadId=upload_id), {'Content-Type': 'application/xml'})
+            if 'uploadId' in query:
+                _, etag = fake.complete_upload(query['uploadId'][0])
+                fake.count('multipart_complete')
+                return self._send(200, _xml('CompleteMultipartUploadResult', Location=f'/{bucket}/{key}',
+                                            Bucket=bucket, Key=key, ETag=f'"{etag}"'),
+                                  {'Content-Type': 'application/xml'})
+            self._send(400, _xml('Error', Code='NotImplemented'))
+
+        def do_DELETE(self):
+            _, _, query = self._target()
+            if 'uploadId' in query:
+                fake.abort_upload(query['uploadId'][0])
+            self._send(204)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_s3(port=0, **kwargs):
+    """
+    在后台线程启动模拟服务
+    :return: (server, fake, base_url)
+    """
+    fake = FakeS3(**kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=9900)
+    parser.add_argument('--bucket', default='adify')
+    args = parser.parse_args()
+    server, fake, base_url = start_fake_s3(args.port, buckets=[args.bucket])
+    print(f'fake s3 listening on {base_url}, objects in {fake.root}')
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(fake.stats()))
+    except KeyboardInterrupt:
+        server.shutdown()
+        fake.close()
+
+
+if __name__ == '__main__':
+    main()
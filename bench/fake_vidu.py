@@ -0,0 +1,126 @@
+"""
+本地 Vidu 模拟服务, 用于跟踪器和接口测试, 不访问 api.vidu.cn.
+
+- POST /ent/v2/reference2video   创建任务, 返回 task_id
+- GET  /ent/v2/tasks/<id>/creations  任务在 ready_after 秒内为 processing, 之后为 success 并返回视频URL
+
+用法:
+    python bench/fake_vidu.py --port 8901 --ready-after 5 --video-url http://127.0.0.1:9000/adify/demo.mp4
+    VIDU_API_BASE=http://127.0.0.1:8901 python -m app
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TASK_PATH = re.compile(r'^/ent/v2/tasks/([^/]+)/creations$')
+
+
+class FakeVidu:
+    """任务状态和请求计数"""
+
+    def __init__(self, ready_after=5.0, video_url='http://127.0.0.1/fake.mp4', fail_every=0):
+        self.ready_after = ready_after
+        self.video_url = video_url
+        self.fail_every = fail_every
+        self.tasks = {}
+        self.requests = {'create': 0, 'query': 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, body):
+        with self._lock:
+            self.requests['create'] += 1
+            task_id = str(next(self._ids))
+            failed = bool(self.fail_every) and int(task_id) % self.fail_every == 0
+            self.tasks[task_id] = {'created': time.time(), 'failed': failed}
+        return {'task_id': task_id, 'state': 'created', 'model': body.get('model')}
+
+    def query(self, task_id):
+        with self._lock:
+            self.requests['query'] += 1
+            task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        if time.time() - task['created'] < self.ready_after:
+            return {'id': task_id, 'state': 'processing', 'creations': []}
+        if task['failed']:
+            return {'id': task_id, 'state': 'failed', 'err_code': 'FakeFailure', 'creations': []}
+        return {'id': task_id, 'state': 'success',
+                'creations': [{'id': task_id, 'url': f'{self.video_url}?task={task_id}',
+                               'cover_url': ''}]}
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'tasks': len(self.tasks)}
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if self.path != '/ent/v2/reference2video':
+                return self._send(404, {'error': 'not found'})
+            self._send(200, fake.create(body))
+
+        def do_GET(self):
+            match = _TASK_PATH.match(self.path.split('?')[0])
+            if not match:
+                return self._send(404, {'error': 'not found'})
+            res = fake.query(match.group(1))
+            if res is None:
+                return self._send(404, {'error': 'task not found'})
+            self._send(200, res)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_vidu(port=0, **kwargs):
+    """
+    在后台线程启动模拟服务
+    :return: (server, fake, base_url)
+    """
+    fake = FakeVidu(**kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--ready-after', type=float, default=5.0)
+    parser.add_argument('--video-url', default='http://127.0.0.1/fake.mp4')
+    parser.add_argument('--fail-every', type=int, default=0, help='每 N 个任务失败一个, 0 表示不失败')
+    args = parser.parse_args()
+    server, fake, base_url = start_fake_vidu(args.port, ready_after=args.ready_after,
+                                             video_url=args.video_url, fail_every=args.fail_every)
+    print(f'fake vidu listening on {base_url}')
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(fake.requests))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
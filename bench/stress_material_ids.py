@@ -0,0 +1,96 @@
+"""
+素材ID分配并发压测: 多线程/多进程同时从同一前缀分配顺序号, 检查没有重复且没有遗漏.
+
+使用 .env 中的数据库配置, 压测前缀为 T<pid>, 结束后删除计数器行, 不影响真实素材ID.
+--insert 时在事务内分配并写入临时表(带唯一键), 模拟 /api/video/add 的写入路径.
+
+用法:
+    python bench/stress_material_ids.py --threads 32 --per-thread 200
+    python bench/stress_material_ids.py --processes 4 --threads 16 --per-thread 100 --block 5 --insert
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+from db.db import DBManager  # noqa: E402
+from db.sequences import allocate_sequence  # noqa: E402
+
+STRESS_TABLE = 'material_id_stress'
+
+
+def make_db(pool_size):
+    load_dotenv()
+    return DBManager(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT", 3306)), user=os.getenv("DB_USER"),
+                     password=os.getenv("DB_PASSWORD"), database=os.getenv("DB_DATABASE"),
+                     pool_size=pool_size, wait_timeout=60)
+
+
+def worker(prefix, count, block, insert, db):
+    ids = []
+    for _ in range(count // block):
+        if insert:
+            with db.transaction() as tx:
+                batch = [f"{prefix}{seq:03d}" for seq in allocate_sequence(tx, prefix, block)]
+                tx.batch_execute_insert(f"INSERT INTO {STRESS_TABLE} (material_id) VALUES (%s)",
+                                        [(material_id,) for material_id in batch])
+        else:
+            batch = [f"{prefix}{seq:03d}" for seq in allocate_sequence(db, prefix, block)]
+        ids.extend(batch)
+    return ids
+
+
+def run_process(prefix, threads, per_thread, block, insert):
+    db = make_db(pool_size=threads)
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(worker, prefix, per_thread, block, insert, db) for _ in range(threads)]
+            return [material_id for future in futures for material_id in future.result()]
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--per-thread', type=int, default=200, help='每个线程分配的ID数')
+    parser.add_argument('--block', type=int, default=1, help='每次分配的ID数')
+    parser.add_argument('--insert', action='store_true', help='在事务内写入带唯一键的临时表')
+    args = parser.parse_args()
+
+    prefix = f"T{os.getpid()}"
+    db = make_db(pool_size=1)
+    if args.insert:
+        db.execute(f"CREATE TABLE IF NOT EXISTS {STRESS_TABLE} ("
+                   "material_id VARCHAR(50) NOT NULL, PRIMARY KEY (material_id)) ENGINE=InnoDB")
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.processes) as executor:
+            futures = [executor.submit(run_process, prefix, args.threads, args.per_thread, args.block, args.insert)
+                       for _ in range(args.processes)]
+            ids = [material_id for future in futures for material_id in future.result()]
+        elapsed = time.perf_counter() - start
+    finally:
+        db.execute("DELETE FROM material_id_sequences WHERE prefix = %s", (prefix,))
+        if args.insert:
+            db.execute(f"DROP TABLE IF EXISTS {STRESS_TABLE}")
+        db.close()
+
+    expected = args.processes * args.threads * (args.per_thread // args.block) * args.block
+    sequences = sorted(int(material_id[len(prefix):]) for material_id in ids)
+    duplicates = len(ids) - len(set(ids))
+    missing = len(set(range(1, expected + 1)) - set(sequences))
+    print(f"allocated {len(ids)} ids in {elapsed:.2f}s ({len(ids) / elapsed:.0f} ids/s), "
+          f"max sequence {sequences[-1] if sequences else 0}")
+    print(f"duplicates: {duplicates}, missing: {missing}")
+    if duplicates or missing or len(ids) != expected:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+用 ffmpeg 的 lavfi 测试源生成合成视频和图片, 供基准测试使用, 不依赖真实素材.
+
+视频由若干个 scene_len 秒的场景拼成, 相邻场景使用不同的测试图案, 场景检测能稳定切分;
+编码为 H.264/yuv420p, 同参数生成的多个片段可直接流拷贝拼接.
+
+用法:
+    python bench/synthetic_media.py out.mp4 --duration 20 --resolution 1280x720 --fps 24 --scene-len 2
+"""
+import argparse
+import math
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_copy.fast_concat import ffmpeg_binary  # noqa: E402
+
+# 依次循环使用的场景图案
+SCENE_SOURCES = [
+    'testsrc2=size={size}:rate={fps}',
+    'smptehdbars=size={size}:rate={fps}',
+    'mandelbrot=size={size}:rate={fps}',
+    'color=c=0x1f6feb:size={size}:rate={fps}',
+    'rgbtestsrc=size={size}:rate={fps}',
+    'color=c=0xf2cc60:size={size}:rate={fps}',
+]
+
+
+def parse_resolution(resolution):
+    """'1280x720' -> (1280, 720)"""
+    width, height = resolution.lower().split('x')
+    return int(width), int(height)
+
+
+def _run(cmd):
+    completed = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.decode('utf-8', 'ignore')[-2000:])
+
+
+def make_video(path, duration=10.0, resolution='1280x720', fps=24, scene_len=2.0, offset=0, audio=False):
+    """
+    生成合成视频
+    :param duration: 时长(秒)
+    :param scene_len: 每个场景的时长(秒)
+    :param offset: 起始图案序号, 不同片段传不同值使内容不同
+    :param audio: 是否带 440Hz 音轨
+    :return: path
+    """
+    width, height = parse_resolution(resolution)
+    size = f'{width}x{height}'
+    scenes = max(1, math.ceil(duration / scene_len - 1e-6))
+    cmd = [ffmpeg_binary(), '-y', '-v', 'error']
+    for i in range(scenes):
+        # 最后一个场景补足剩余时长
+        length = duration - (scenes - 1) * scene_len if i == scenes - 1 else scene_len
+        source = SCENE_SOURCES[(i + offset) % len(SCENE_SOURCES)].format(size=size, fps=fps)
+        cmd += ['-f', 'lavfi', '-t', f'{max(length, 1.0 / fps):.3f}', '-i', source]
+    if audio:
+        cmd += ['-f', 'lavfi', '-t', f'{duration:.3f}', '-i', 'sine=frequency=440:sample_rate=44100']
+    # mandelbrot 等源输出 rgb, 统一像素格式和采样宽高比后再拼接
+    chains = ''.join(f'[{i}:v]format=yuv420p,setsar=1[v{i}];' for i in range(scenes))
+    inputs = ''.join(f'[v{i}]' for i in range(scenes))
+    cmd += ['-filter_complex', f'{chains}{inputs}concat=n={scenes}:v=1:a=0[out]', '-map', '[out]']
+    if audio:
+        cmd += ['-map', f'{scenes}:a', '-c:a', 'aac', '-shortest']
+    cmd += ['-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'high', '-pix_fmt', 'yuv420p',
+            '-r', str(fps), '-g', str(fps * 2), '-movflags', '+faststart', path]
+    _run(cmd)
+    return path
+
+
+def make_image(path, resolution='1280x720', pattern=0):
+    """生成一张测试图(jpg/png 由扩展名决定)"""
+    width, height = parse_resolution(resolution)
+    source = SCENE_SOURCES[pattern % len(SCENE_SOURCES)].format(size=f'{width}x{height}', fps=1)
+    _run([ffmpeg_binary(), '-y', '-v', 'error', '-f', 'lavfi', '-i', source, '-frames:v', '1', path])
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--resolution', default='1280x720')
+    parser.add_argument('--fps', type=int, default=24)
+    parser.add_argument('--scene-len', type=float, default=2.0)
+    parser.add_argument('--offset', type=int, default=0)
+    parser.add_argument('--audio', action='store_true')
+    args = parser.parse_args()
+    make_video(args.output, args.duration, args.resolution, args.fps, args.scene_len, args.offset, args.audio)
+    print(f'{args.output}: {os.path.getsize(args.output)} bytes')
+
+
+if __name__ == '__main__':
+    main()
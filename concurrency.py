@@ -0,0 +1,93 @@
+"""
+gevent 协程 worker 支持.
+
+- patch_gevent: 在导入其他模块前调用, 把 socket/ssl/threading/subprocess 等换成协作式实现;
+  pymysql、MinIO(urllib3)、requests/OpenAI 的网络 I/O 和 ffmpeg 子进程等待随之不再阻塞整个 worker
+- run_cpu_bound / map_cpu_bound: 场景检测、图片编码、评分等 CPU 密集计算放到原生线程池执行,
+  只挂起当前协程, 不阻塞 hub; 未打补丁(sync worker、脚本)时直接在当前线程执行
+
+放到线程池的函数只能做纯计算和文件读写, 不要调用数据库、HTTP 客户端等依赖 gevent 的对象.
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_pool = None
+_pool_lock = threading.Lock()
+_stats = {'calls': 0, 'in_flight': 0, 'seconds_total': 0.0, 'seconds_max': 0.0}
+_stats_lock = threading.Lock()
+
+
+def patch_gevent():
+    """打 gevent 补丁, 必须在导入 api、db 等模块之前调用"""
+    from gevent import monkey
+    if not monkey.is_module_patched('socket'):
+        monkey.patch_all()
+
+
+def gevent_patched():
+    """当前进程是否已由 gevent 打过补丁(gunicorn gevent worker 或 patch_gevent)"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from gevent.threadpool import ThreadPool
+                _pool = ThreadPool(maxsize=int(os.getenv("CPU_OFFLOAD_THREADS", os.cpu_count() or 4)))
+    return _pool
+
+
+def _record(seconds, calls=1):
+    with _stats_lock:
+        _stats['calls'] += calls
+        _stats['seconds_total'] += seconds
+        _stats['seconds_max'] = max(_stats['seconds_max'], seconds)
+
+
+def run_cpu_bound(fn, *args, **kwargs):
+    """执行 CPU 密集函数并返回结果; gevent 模式下在原生线程中执行, 当前协程等待期间其他请求照常处理"""
+    if not gevent_patched():
+        return fn(*args, **kwargs)
+    start = time.perf_counter()
+    with _stats_lock:
+        _stats['in_flight'] += 1
+    try:
+        return _get_pool().apply(fn, args, kwargs)
+    finally:
+        with _stats_lock:
+            _stats['in_flight'] -= 1
+        _record(time.perf_counter() - start)
+
+
+def map_cpu_bound(fn, items, workers=4):
+    """并行对 items 执行 fn, 结果保持顺序; 非 gevent 模式下使用 workers 个线程"""
+    items = list(items)
+    if not items:
+        return []
+    if not gevent_patched():
+        with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+            return list(executor.map(fn, items))
+    start = time.perf_counter()
+    with _stats_lock:
+        _stats['in_flight'] += 1
+    try:
+        return list(_get_pool().map(fn, items))
+    finally:
+        with _stats_lock:
+            _stats['in_flight'] -= 1
+        _record(time.perf_counter() - start, len(items))
+
+
+def offload_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['gevent'] = gevent_patched()
+    stats['seconds_total'] = round(stats['seconds_total'], 3)
+    stats['seconds_max'] = round(stats['seconds_max'], 3)
+    return stats
@@ -1,22 +1,89 @@
 """
 Database utility module for MySQL operations.
 """
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
 import pymysql
+from pymysql.constants import SERVER_STATUS
 from pymysql.cursors import DictCursor
 
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the wait timeout."""
+
+
+class DBSession:
+    """
+    Run statements on one borrowed connection.
+
+    Returned by DBManager.transaction(); exposes the same query helpers as
+    DBManager so several statements can share a connection and one commit.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def fetch_all(self, query, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def fetch_one(self, query, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchone()
+
+    def execute(self, query, params=None):
+        with self.connection.cursor() as cursor:
+            return cursor.execute(query, params)
+
+    def execute_insert(self, query, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.lastrowid
+
+    def batch_execute_insert(self, query, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(query, params)
+            return cursor.rowcount
+
+
+class _PooledConnection:
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
 class DBManager:
     """
     Database manager class for handling MySQL connections and operations.
+
+    Connections are kept in a bounded pool shared by all threads (or greenlets
+    once gevent has patched ``threading``). Idle connections are pinged before
+    reuse, evicted after ``max_idle`` seconds and recycled after ``max_lifetime``.
     """
-    def __init__(self, host='localhost', port=3306, user='root', password='', database='adify'):
+    def __init__(self, host='localhost', port=3306, user='root', password='', database='adify',
+                 pool_size=10, max_idle=300, max_lifetime=3600, ping_interval=30,
+                 wait_timeout=10, connect_timeout=5):
         """
         Initialize the database connection parameters.
-        
+
         Args:
             host (str): MySQL host address
             user (str): MySQL username
             password (str): MySQL password
             database (str): Database name
+            pool_size (int): Maximum number of open connections
+            max_idle (float): Seconds an idle connection is kept before eviction
+            max_lifetime (float): Seconds after which a connection is recycled
+            ping_interval (float): Idle seconds after which a connection is pinged before reuse
+            wait_timeout (float): Seconds to wait for a free connection before failing
+            connect_timeout (float): Seconds allowed for establishing a new connection
         """
         self.database = database
         self.password = password
@@ -24,10 +91,40 @@ class DBManager:
         self.host = host
         self.port = port
 
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.wait_timeout = wait_timeout
+        self.connect_timeout = connect_timeout
+
+        self._idle = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._stats = {
+            'connects': 0,
+            'connect_errors': 0,
+            'connect_time_total': 0.0,
+            'connect_time_max': 0.0,
+            'acquires': 0,
+            'wait_time_total': 0.0,
+            'wait_timeouts': 0,
+            'evicted_idle': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'discarded': 0,
+            'rollbacks_on_release': 0,
+        }
+
     def get_connection(self):
         """
         Create and return a new database connection.
-        
+
+        Pooled callers should use connection() instead; this always opens a
+        fresh, unpooled connection.
+
         Returns:
             Connection: MySQL database connection
         """
@@ -37,94 +134,287 @@ class DBManager:
             user=self.user,
             password=self.password,
             database=self.database,
-            cursorclass=DictCursor
+            cursorclass=DictCursor,
+            autocommit=True,
+            connect_timeout=self.connect_timeout
         )
-    
+
+    def _connect(self):
+        start = time.monotonic()
+        try:
+            raw = self.get_connection()
+        except Exception:
+            with self._cond:
+                self._stats['connect_errors'] += 1
+            raise
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._stats['connects'] += 1
+            self._stats['connect_time_total'] += elapsed
+            self._stats['connect_time_max'] = max(self._stats['connect_time_max'], elapsed)
+        return _PooledConnection(raw)
+
+    @staticmethod
+    def _close_quietly(pooled):
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+
+    def _acquire(self):
+        """Borrow a live connection from the pool, opening one if below pool_size."""
+        start = time.monotonic()
+        deadline = start + self.wait_timeout
+        while True:
+            stale = []
+            pooled = None
+            must_open = False
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate = self._idle.pop()
+                        if now - candidate.created_at > self.max_lifetime:
+                            self._stats['recycled'] += 1
+                        elif now - candidate.last_used > self.max_idle:
+                            self._stats['evicted_idle'] += 1
+                        else:
+                            pooled = candidate
+                            break
+                        self._open -= 1
+                        stale.append(candidate)
+                    if pooled is not None:
+                        break
+                    if self._open < self.pool_size:
+                        self._open += 1
+                        must_open = True
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats['wait_timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f'No database connection available after {self.wait_timeout}s '
+                            f'(pool_size={self.pool_size})')
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                self._in_use += 1
+                self._stats['acquires'] += 1
+                self._stats['wait_time_total'] += time.monotonic() - start
+
+            for candidate in stale:
+                self._close_quietly(candidate)
+
+            if must_open:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+
+            if time.monotonic() - pooled.last_used > self.ping_interval:
+                try:
+                    pooled.raw.ping(reconnect=False)
+                except Exception:
+                    with self._cond:
+                        self._stats['ping_failures'] += 1
+                    self._discard(pooled)
+                    continue
+            return pooled
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._open -= 1
+            self._cond.notify()
+
+    def _discard(self, pooled):
+        self._close_quietly(pooled)
+        with self._cond:
+            self._stats['discarded'] += 1
+        self._release_slot()
+
+    def _reset(self, pooled):
+        """Roll back a transaction left open by the borrower and restore autocommit."""
+        raw = pooled.raw
+        if raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            raw.rollback()
+            with self._cond:
+                self._stats['rollbacks_on_release'] += 1
+        if not raw.get_autocommit():
+            raw.autocommit(True)
+
+    def _release(self, pooled):
+        now = time.monotonic()
+        if now - pooled.created_at > self.max_lifetime:
+            with self._cond:
+                self._stats['recycled'] += 1
+            self._close_quietly(pooled)
+            self._release_slot()
+            return
+        try:
+            self._reset(pooled)
+        except Exception:
+            # A connection whose state cannot be reset must not be handed out again
+            self._discard(pooled)
+            return
+        pooled.last_used = now
+        expired = []
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(pooled)
+            # 空闲队列按归还时间排序,最久未用的在左侧
+            while self._idle and now - self._idle[0].last_used > self.max_idle:
+                expired.append(self._idle.popleft())
+                self._open -= 1
+                self._stats['evicted_idle'] += 1
+            self._cond.notify()
+        for candidate in expired:
+            self._close_quietly(candidate)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection for the duration of the block.
+
+        Connections run in autocommit mode. A transaction left open by the
+        block is rolled back before the connection returns to the pool; a
+        connection that raised a connection-level error, or whose rollback
+        fails, is discarded instead of being returned.
+
+        Yields:
+            Connection: MySQL database connection
+        """
+        pooled = self._acquire()
+        try:
+            yield pooled.raw
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            self._discard(pooled)
+            raise
+        except BaseException:
+            self._release(pooled)
+            raise
+        else:
+            self._release(pooled)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run several statements on one connection and commit them together.
+
+        The transaction is rolled back if the block raises.
+
+        Example:
+            with db_manager.transaction() as tx:
+                tx.execute(...)
+                tx.execute_insert(...)
+
+        Yields:
+            DBSession: Session bound to the transaction's connection
+        """
+        with self.connection() as connection:
+            connection.begin()
+            try:
+                yield DBSession(connection)
+            except BaseException:
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
+                raise
+            else:
+                connection.commit()
+
+    def stats(self):
+        """
+        Return a snapshot of pool usage counters.
+
+        Returns:
+            dict: Pool size, in-use/idle/waiting counts and connect latency
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'pool_size': self.pool_size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+            })
+        connects = stats['connects']
+        stats['connect_time_avg'] = stats['connect_time_total'] / connects if connects else 0.0
+        acquires = stats['acquires']
+        stats['wait_time_avg'] = stats['wait_time_total'] / acquires if acquires else 0.0
+        return stats
+
+    def close(self):
+        """Close all idle connections held by the pool."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for pooled in idle:
+            self._close_quietly(pooled)
+
     def fetch_all(self, query, params=None):
         """
         Execute a query and fetch all results.
-        
+
         Args:
             query (str): SQL query to execute
             params (tuple, optional): Parameters for the query
-            
+
         Returns:
             list: List of dictionaries with query results
         """
-        connection = self.get_connection()
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(query, params)
-                return cursor.fetchall()
-        finally:
-            connection.close()
-    
+        with self.connection() as connection:
+            return DBSession(connection).fetch_all(query, params)
+
     def fetch_one(self, query, params=None):
         """
         Execute a query and fetch one result.
-        
+
         Args:
             query (str): SQL query to execute
             params (tuple, optional): Parameters for the query
-            
+
         Returns:
             dict: Dictionary with query result
         """
-        connection = self.get_connection()
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(query, params)
-                return cursor.fetchone()
-        finally:
-            connection.close()
-    
+        with self.connection() as connection:
+            return DBSession(connection).fetch_one(query, params)
+
     def execute(self, query, params=None):
         """
         Execute a query without returning results.
-        
+
         Args:
             query (str): SQL query to execute
             params (tuple, optional): Parameters for the query
-            
+
         Returns:
             int: Number of affected rows
         """
-        connection = self.get_connection()
-        try:
-            with connection.cursor() as cursor:
-                result = cursor.execute(query, params)
-                connection.commit()
-                return result
-        finally:
-            connection.close()
-    
+        with self.connection() as connection:
+            return DBSession(connection).execute(query, params)
+
     def execute_insert(self, query, params=None):
         """
         Execute an insert query and return the last inserted ID.
-        
+
         Args:
             query (str): SQL query to execute
             params (tuple, optional): Parameters for the query
-            
+
         Returns:
             int: Last inserted ID
         """
-        connection = self.get_connection()
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(query, params)
-                connection.commit()
-                return cursor.lastrowid
-        finally:
-            connection.close()
+        with self.connection() as connection:
+            return DBSession(connection).execute_insert(query, params)
 
     def batch_execute_insert(self, query, params=None):
-        connection = self.get_connection()
-        try:
-            with connection.cursor() as cursor:
-                # 批量执行
-                cursor.executemany(query, params)
-                connection.commit()
-                return cursor.rowcount
-        finally:
-            connection.close()
\ No newline at end of file
+        # 批量执行,在同一事务内提交
+        with self.transaction() as tx:
+            return tx.batch_execute_insert(query, params)
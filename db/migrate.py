@@ -0,0 +1,167 @@
+"""
+Versioned schema migration runner.
+
+Migrations live in db/migrations and are named ``NNN_description.sql`` or
+``NNN_description.py``. SQL files are split into statements on trailing
+semicolons; Python files must define ``upgrade(db)`` which receives the
+DBManager and may run long, batched backfills. Applied versions are recorded
+in ``schema_migrations`` and a named lock keeps two runners from overlapping.
+
+Usage:
+    python -m db.migrate                  apply all pending migrations
+    python -m db.migrate --target 004     apply pending migrations up to 004
+    python -m db.migrate --baseline 003   record 001-003 as applied without running them
+    python -m db.migrate --status
+"""
+import argparse
+import importlib.util
+import os
+import re
+import time
+
+from db.db import DBManager
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+_MIGRATION_NAME = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+LOCK_NAME = 'adify_schema_migrate'
+
+
+class MigrationError(Exception):
+    """Raised when a migration fails or the migration lock cannot be taken."""
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """
+    List migration files ordered by version.
+
+    Returns:
+        list: (version, name, path) tuples
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_NAME.match(filename)
+        if match:
+            migrations.append((match.group(1), match.group(2), os.path.join(directory, filename)))
+    migrations.sort(key=lambda item: int(item[0]))
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f'duplicate migration versions in {directory}')
+    return migrations
+
+
+def split_sql(text):
+    """Split a migration script into statements, dropping ``--`` comment lines."""
+    lines = [line for line in text.splitlines() if not line.lstrip().startswith('--')]
+    return [statement.strip() for statement in re.split(r';\s*(?:\n|$)', '\n'.join(lines)) if statement.strip()]
+
+
+def ensure_table(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) NOT NULL COMMENT '迁移版本号',
+            name VARCHAR(255) NOT NULL COMMENT '迁移名称',
+            duration_ms INT COMMENT '执行耗时(毫秒)',
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '执行时间',
+            PRIMARY KEY (version)
+        ) ENGINE=InnoDB COMMENT='已执行的数据库迁移'
+    """)
+
+
+def applied_versions(db):
+    return {row['version'] for row in db.fetch_all("SELECT version FROM schema_migrations")}
+
+
+def _record(db, version, name, duration_ms=None):
+    db.execute("INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+               (version, name, duration_ms))
+
+
+def apply_migration(db, path):
+    """Run one migration file."""
+    if path.endswith('.sql'):
+        with open(path, encoding='utf-8') as f:
+            for statement in split_sql(f.read()):
+                db.execute(statement)
+        return
+    spec = importlib.util.spec_from_file_location(f'migration_{os.path.basename(path)[:-3]}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.upgrade(db)
+
+
+def migrate(db, target=None, baseline=None, log=print):
+    """
+    Apply pending migrations in order.
+
+    Args:
+        db (DBManager): Database to migrate
+        target (str): Stop after this version, default all
+        baseline (str): Record versions up to this one as applied without running them,
+            for databases migrated by hand before the runner existed
+        log (callable): Progress output
+
+    Returns:
+        list: Versions applied (or baselined) by this call
+    """
+    ensure_table(db)
+    # GET_LOCK is per connection, so hold one connection for the whole run
+    with db.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (LOCK_NAME,))
+            if not cursor.fetchone()['locked']:
+                raise MigrationError('another migration run is in progress')
+        try:
+            done = applied_versions(db)
+            ran = []
+            for version, name, path in discover():
+                if version in done:
+                    continue
+                if target is not None and int(version) > int(target):
+                    break
+                if baseline is not None and int(version) <= int(baseline):
+                    _record(db, version, name)
+                    log(f'{version} {name}: baselined')
+                    ran.append(version)
+                    continue
+                log(f'{version} {name}: applying')
+                start = time.monotonic()
+                try:
+                    apply_migration(db, path)
+                except Exception as e:
+                    raise MigrationError(f'migration {version}_{name} failed: {e}') from e
+                duration_ms = int((time.monotonic() - start) * 1000)
+                _record(db, version, name, duration_ms)
+                log(f'{version} {name}: done in {duration_ms} ms')
+                ran.append(version)
+            return ran
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', help='apply migrations up to this version')
+    parser.add_argument('--baseline', help='mark migrations up to this version as applied without running them')
+    parser.add_argument('--status', action='store_true', help='list migrations and whether they are applied')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    db = DBManager(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT", 3306)), user=os.getenv("DB_USER"),
+                   password=os.getenv("DB_PASSWORD"), database=os.getenv("DB_DATABASE"), pool_size=2)
+    try:
+        if args.status:
+            ensure_table(db)
+            done = applied_versions(db)
+            for version, name, _ in discover():
+                print(f"{version} {name}: {'applied' if version in done else 'pending'}")
+            return
+        ran = migrate(db, target=args.target, baseline=args.baseline)
+        print(f'{len(ran)} migration(s) applied' if ran else 'database is up to date')
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
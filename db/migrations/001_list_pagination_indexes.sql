@@ -0,0 +1,9 @@
+-- 列表接口 keyset 分页所需索引
+-- video_materials: ORDER BY created_at DESC, id DESC 及 (created_at, id) 游标条件
+-- material_comparison_groups: 按 comparison_group_id 分组、排序和游标条件, 覆盖 material_id 避免回表
+
+ALTER TABLE video_materials
+    ADD INDEX idx_created_at_id (created_at, id), ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE material_comparison_groups
+    ADD INDEX idx_group_material (comparison_group_id, material_id), ALGORITHM=INPLACE, LOCK=NONE;
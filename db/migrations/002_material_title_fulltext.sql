@@ -0,0 +1,6 @@
+-- 素材检索: 标题全文索引(ngram 分词, 支持中文), 替代 LIKE '%q%' 全表扫描
+-- 素材ID前缀匹配直接使用 material_id 唯一索引
+-- 注意: 首个 FULLTEXT 索引需要重建表, 不支持 LOCK=NONE, 建议在低峰期执行
+
+ALTER TABLE video_materials
+    ADD FULLTEXT INDEX ft_title (title) WITH PARSER ngram;
@@ -0,0 +1,22 @@
+-- 素材ID顺序号分配表: 每个前缀(C/CW+日期)一行计数器, 替代生成ID时的 MAX 扫描
+-- 回填各前缀当前已用的最大顺序号; 可重复执行, 部署新代码后建议再执行一次,
+-- 以覆盖迁移与部署之间旧代码写入的素材
+
+CREATE TABLE IF NOT EXISTS material_id_sequences (
+    prefix VARCHAR(20) NOT NULL COMMENT '素材ID前缀(C/CW+日期)',
+    last_val INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已分配的最大顺序号',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (prefix)
+) ENGINE=InnoDB COMMENT='素材ID顺序号分配表';
+
+-- 前缀固定为 C/CW + 8位日期, 其后全部是顺序号(超过 999 后位数会增加, 不能按末3位切分);
+-- 不使用 REGEXP_SUBSTR, 兼容 MySQL 5.7
+INSERT INTO material_id_sequences (prefix, last_val)
+SELECT prefix, MAX(CAST(SUBSTRING(material_id, CHAR_LENGTH(prefix) + 1) AS UNSIGNED)) AS max_val
+FROM (
+    SELECT material_id, LEFT(material_id, IF(material_id LIKE 'CW%', 10, 9)) AS prefix
+    FROM video_materials
+    WHERE material_id REGEXP '^CW?[0-9]{9,}$'
+) ids
+GROUP BY prefix
+ON DUPLICATE KEY UPDATE last_val = GREATEST(last_val, VALUES(last_val));
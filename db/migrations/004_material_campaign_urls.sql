@@ -0,0 +1,19 @@
+-- 投放链接规范化: 每个素材的投放链接一行, 替代 video_materials.campaign_urls 逗号拼接字段
+-- campaign_urls 字段保留为展示用副本, 由 /video/update 同步写入
+-- material_comparison_groups 补充按素材查找对比组的复合索引
+-- 先于新代码部署执行(仅建表和在线加索引), 历史数据由 005 回填
+
+CREATE TABLE IF NOT EXISTS material_campaign_urls (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    material_id VARCHAR(50) NOT NULL COMMENT '素材ID，关联视频素材表',
+    position INT NOT NULL DEFAULT 0 COMMENT '链接在素材中的顺序',
+    campaign_url VARCHAR(1024) NOT NULL COMMENT '投放链接URL',
+    url_hash CHAR(40) AS (SHA1(campaign_url)) STORED COMMENT '链接sha1，用于唯一约束',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    PRIMARY KEY (id),
+    UNIQUE KEY unique_material_url (material_id, url_hash),
+    KEY idx_material_position (material_id, position)
+) ENGINE=InnoDB COMMENT='素材投放链接表';
+
+ALTER TABLE material_comparison_groups
+    ADD INDEX idx_material_group (material_id, comparison_group_id), ALGORITHM=INPLACE, LOCK=NONE;
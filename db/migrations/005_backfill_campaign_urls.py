@@ -0,0 +1,40 @@
+"""
+回填 material_campaign_urls: 按主键分批读取 video_materials.campaign_urls, 拆分后写入.
+
+每批一个短事务, 读取的素材行加共享锁, 与 /video/update 的更新串行, 不会写回被覆盖的旧链接;
+INSERT IGNORE 跳过已存在的链接, 可在服务运行时执行, 也可重复执行.
+批大小和批间停顿由 MIGRATION_BATCH_SIZE / MIGRATION_BATCH_PAUSE 配置.
+"""
+import os
+import time
+
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", 1000))
+BATCH_PAUSE = float(os.getenv("MIGRATION_BATCH_PAUSE", 0.05))
+
+
+def _split(campaign_urls):
+    urls = []
+    for url in (campaign_urls or '').split(','):
+        url = url.strip()
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def upgrade(db):
+    last_id = 0
+    while True:
+        with db.transaction() as tx:
+            rows = tx.fetch_all(
+                "SELECT id, material_id, campaign_urls FROM video_materials "
+                "WHERE id > %s ORDER BY id LIMIT %s LOCK IN SHARE MODE", (last_id, BATCH_SIZE))
+            data = [(row['material_id'], position, url)
+                    for row in rows for position, url in enumerate(_split(row['campaign_urls']))]
+            if data:
+                tx.batch_execute_insert(
+                    "INSERT IGNORE INTO material_campaign_urls (material_id, position, campaign_url) "
+                    "VALUES (%s, %s, %s)", data)
+        if len(rows) < BATCH_SIZE:
+            return
+        last_id = rows[-1]['id']
+        time.sleep(BATCH_PAUSE)
@@ -0,0 +1,25 @@
+-- 投放数据写入管道: 按 (素材ID, 投放链接) 汇总的效果数据, 以及崩溃回放去重用的批次表
+-- 数据由 deployment.metrics.MetricsIngestor 批量写入后同步到 material_comparison_groups
+
+CREATE TABLE IF NOT EXISTS campaign_url_metrics (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    material_id VARCHAR(50) NOT NULL COMMENT '素材ID，关联视频素材表',
+    campaign_url VARCHAR(1024) NOT NULL COMMENT '投放链接URL',
+    url_hash CHAR(40) AS (SHA1(campaign_url)) STORED COMMENT '链接sha1，用于唯一约束',
+    click_count INT NOT NULL DEFAULT 0 COMMENT '点击量',
+    completion_count INT NOT NULL DEFAULT 0 COMMENT '完播量',
+    like_count INT NOT NULL DEFAULT 0 COMMENT '点赞量',
+    comment_count INT NOT NULL DEFAULT 0 COMMENT '评论量',
+    share_count INT NOT NULL DEFAULT 0 COMMENT '转发量',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (id),
+    UNIQUE KEY unique_material_url (material_id, url_hash)
+) ENGINE=InnoDB COMMENT='投放链接效果数据表，按素材和投放链接汇总';
+
+CREATE TABLE IF NOT EXISTS metrics_ingest_batches (
+    batch_id VARCHAR(64) NOT NULL COMMENT '写入批次ID(日志段ID)',
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '写入时间',
+    PRIMARY KEY (batch_id),
+    KEY idx_applied_at (applied_at)
+) ENGINE=InnoDB COMMENT='已写入的投放数据批次，用于崩溃回放去重';
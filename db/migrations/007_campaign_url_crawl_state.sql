@@ -0,0 +1,23 @@
+-- 投放链接爬虫: 每个链接的条件请求头和增量调度状态
+-- material_comparison_groups 按创建时间筛选活跃对比组
+
+CREATE TABLE IF NOT EXISTS campaign_url_crawl_state (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    material_id VARCHAR(50) NOT NULL COMMENT '素材ID，关联视频素材表',
+    campaign_url VARCHAR(1024) NOT NULL COMMENT '投放链接URL',
+    url_hash CHAR(40) AS (SHA1(campaign_url)) STORED COMMENT '链接sha1，用于唯一约束',
+    etag VARCHAR(255) COMMENT '上次响应的ETag',
+    last_modified VARCHAR(64) COMMENT '上次响应的Last-Modified',
+    metrics_hash CHAR(40) COMMENT '上次抓取数据的sha1',
+    interval_seconds INT NOT NULL DEFAULT 0 COMMENT '当前抓取间隔(秒)',
+    next_crawl_at TIMESTAMP NULL COMMENT '下次抓取时间',
+    last_crawled_at TIMESTAMP NULL COMMENT '上次抓取时间',
+    last_status VARCHAR(20) COMMENT '上次抓取结果 changed/unchanged/not_modified/error',
+    failures INT NOT NULL DEFAULT 0 COMMENT '连续失败次数',
+    PRIMARY KEY (id),
+    UNIQUE KEY unique_material_url (material_id, url_hash),
+    KEY idx_next_crawl (next_crawl_at)
+) ENGINE=InnoDB COMMENT='投放链接抓取状态表，用于条件请求和增量调度';
+
+ALTER TABLE material_comparison_groups
+    ADD INDEX idx_created_at (created_at), ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,8 @@
+-- 对比组优选评分: 加权互动率、胜出概率、显著性及评分时间
+
+ALTER TABLE material_comparison_groups
+    ADD COLUMN engagement_rate DOUBLE NULL COMMENT '加权互动率',
+    ADD COLUMN win_probability DOUBLE NULL COMMENT 'Thompson采样胜出概率',
+    ADD COLUMN p_value DOUBLE NULL COMMENT '与同组其余素材比较的单侧p值',
+    ADD COLUMN scored_at TIMESTAMP NULL COMMENT '上次评分时间',
+    ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,19 @@
+-- 后台视频合成任务: 状态、阶段耗时和结果, 进程重启后据此恢复
+
+CREATE TABLE IF NOT EXISTS video_jobs (
+    job_id VARCHAR(64) NOT NULL COMMENT '任务ID',
+    job_type VARCHAR(50) NOT NULL COMMENT '任务类型',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' COMMENT '状态 queued/running/succeeded/failed',
+    stage VARCHAR(50) COMMENT '当前阶段',
+    stages TEXT COMMENT '各阶段状态和耗时(JSON)',
+    payload MEDIUMTEXT NOT NULL COMMENT '任务参数(JSON)',
+    result MEDIUMTEXT COMMENT '任务结果(JSON)',
+    error TEXT COMMENT '失败原因',
+    attempts INT NOT NULL DEFAULT 0 COMMENT '执行次数',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    started_at TIMESTAMP NULL COMMENT '开始时间',
+    finished_at TIMESTAMP NULL COMMENT '结束时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (job_id),
+    KEY idx_status_created (status, created_at)
+) ENGINE=InnoDB COMMENT='后台任务表，存储视频合成等异步任务的状态';
@@ -0,0 +1,15 @@
+-- 关键帧结果缓存: 按视频内容哈希或来源URL + 提取参数复用已上传的关键帧
+
+CREATE TABLE IF NOT EXISTS keyframe_cache (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    content_hash CHAR(64) NOT NULL COMMENT '视频内容sha256',
+    params_key VARCHAR(255) NOT NULL COMMENT '关键帧提取参数',
+    source_url_key CHAR(40) NOT NULL COMMENT '来源URL(去除签名参数)的sha1',
+    keyframe_urls MEDIUMTEXT NOT NULL COMMENT '关键帧图片URL列表(JSON)',
+    expires_at TIMESTAMP NOT NULL COMMENT '过期时间',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (id),
+    UNIQUE KEY unique_content_params (content_hash, params_key),
+    KEY idx_source_url (source_url_key, params_key)
+) ENGINE=InnoDB COMMENT='关键帧结果缓存表';
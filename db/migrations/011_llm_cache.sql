@@ -0,0 +1,12 @@
+-- 大模型响应缓存(LLM_CACHE_BACKEND=mysql)
+
+CREATE TABLE IF NOT EXISTS llm_cache (
+    cache_key CHAR(64) NOT NULL COMMENT '缓存键(模型+prompt+图片哈希)',
+    model VARCHAR(100) COMMENT '模型名',
+    response MEDIUMTEXT NOT NULL COMMENT '模型响应(JSON)',
+    expires_at TIMESTAMP NOT NULL COMMENT '过期时间',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (cache_key),
+    KEY idx_expires (expires_at)
+) ENGINE=InnoDB COMMENT='大模型响应缓存表';
@@ -0,0 +1,12 @@
+-- 投放数据写入管道: 反复写入失败的行转存到死信表, 不再阻塞后续批次
+-- 数据由 deployment.metrics.MetricsIngestor 写入, 排查修正后可重新上报
+
+CREATE TABLE IF NOT EXISTS metrics_dead_letters (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    batch_id VARCHAR(64) COMMENT '所属写入批次ID(日志段ID)',
+    payload MEDIUMTEXT NOT NULL COMMENT '被拒绝的行(JSON: material_id, deployment_url, mode, 指标值)',
+    error TEXT COMMENT '数据库返回的错误',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    PRIMARY KEY (id),
+    KEY idx_created_at (created_at)
+) ENGINE=InnoDB COMMENT='写入失败的投放数据';
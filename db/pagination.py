@@ -0,0 +1,104 @@
+"""
+Pagination helpers: opaque keyset cursors and a short-TTL cache for total counts.
+"""
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(values):
+    """
+    Encode the sort key of the last row into an opaque URL-safe token.
+
+    Args:
+        values (dict): JSON-serializable sort key values
+
+    Returns:
+        str: Cursor token
+    """
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, fields=None):
+    """
+    Decode a token produced by encode_cursor.
+
+    Args:
+        token (str): Cursor token
+        fields (dict, optional): Expected keys mapped to their types. The
+            cursor must contain exactly these keys, so a cursor issued by
+            another listing mode is rejected instead of failing in the query.
+
+    Returns:
+        dict: Sort key values
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f'invalid cursor: {token}') from e
+    if not isinstance(values, dict):
+        raise InvalidCursorError(f'invalid cursor: {token}')
+    if fields is not None:
+        if set(values) != set(fields):
+            raise InvalidCursorError(f'invalid cursor: {token}')
+        for key, expected in fields.items():
+            # bool is a subclass of int and is never a valid sort key
+            if isinstance(values[key], bool) or not isinstance(values[key], expected):
+                raise InvalidCursorError(f'invalid cursor: {token}')
+    return values
+
+
+class CountCache:
+    """
+    Cache expensive COUNT(*) results for a short time.
+
+    Writers call invalidate() after changing the counted table so the local
+    process sees its own writes immediately; other processes converge within ttl.
+    Keys may come from user input (search terms), so the cache holds at most
+    max_entries values, dropping expired ones first and then the least
+    recently used.
+    """
+    def __init__(self, ttl=30, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values = OrderedDict()
+
+    def get(self, key, compute):
+        """
+        Return the cached value for key, calling compute() on a miss or expiry.
+
+        Args:
+            key (str): Cache key, conventionally prefixed with the table name
+            compute (callable): Function returning the fresh value
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._values.get(key)
+            if item is not None and item[1] > now:
+                self._values.move_to_end(key)
+                return item[0]
+        value = compute()
+        with self._lock:
+            self._values[key] = (value, now + self.ttl)
+            self._values.move_to_end(key)
+            if len(self._values) > self.max_entries:
+                for expired in [k for k, (_, expires_at) in self._values.items() if expires_at <= now]:
+                    del self._values[expired]
+                while len(self._values) > self.max_entries:
+                    self._values.popitem(last=False)
+        return value
+
+    def invalidate(self, prefix=''):
+        """Drop all cached values whose key starts with prefix."""
+        with self._lock:
+            for key in [k for k in self._values if k.startswith(prefix)]:
+                del self._values[key]
@@ -30,3 +30,116 @@ CREATE TABLE material_comparison_groups (
     PRIMARY KEY (id)
 ) ENGINE=InnoDB COMMENT='素材对比组表，用于存储素材的投放效果数据';
 
+
+CREATE TABLE video_jobs (
+    job_id VARCHAR(64) NOT NULL COMMENT '任务ID',
+    job_type VARCHAR(50) NOT NULL COMMENT '任务类型',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' COMMENT '状态 queued/running/succeeded/failed',
+    stage VARCHAR(50) COMMENT '当前阶段',
+    stages TEXT COMMENT '各阶段状态和耗时(JSON)',
+    payload MEDIUMTEXT NOT NULL COMMENT '任务参数(JSON)',
+    result MEDIUMTEXT COMMENT '任务结果(JSON)',
+    error TEXT COMMENT '失败原因',
+    attempts INT NOT NULL DEFAULT 0 COMMENT '执行次数',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    started_at TIMESTAMP NULL COMMENT '开始时间',
+    finished_at TIMESTAMP NULL COMMENT '结束时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (job_id),
+    KEY idx_status_created (status, created_at)
+) ENGINE=InnoDB COMMENT='后台任务表，存储视频合成等异步任务的状态';
+
+CREATE TABLE keyframe_cache (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    content_hash CHAR(64) NOT NULL COMMENT '视频内容sha256',
+    params_key VARCHAR(255) NOT NULL COMMENT '关键帧提取参数',
+    source_url_key CHAR(40) NOT NULL COMMENT '来源URL(去除签名参数)的sha1',
+    keyframe_urls MEDIUMTEXT NOT NULL COMMENT '关键帧图片URL列表(JSON)',
+    expires_at TIMESTAMP NOT NULL COMMENT '过期时间',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (id),
+    UNIQUE KEY unique_content_params (content_hash, params_key),
+    KEY idx_source_url (source_url_key, params_key)
+) ENGINE=InnoDB COMMENT='关键帧结果缓存表';
+
+CREATE TABLE llm_cache (
+    cache_key CHAR(64) NOT NULL COMMENT '缓存键(模型+prompt+图片哈希)',
+    model VARCHAR(100) COMMENT '模型名',
+    response MEDIUMTEXT NOT NULL COMMENT '模型响应(JSON)',
+    expires_at TIMESTAMP NOT NULL COMMENT '过期时间',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (cache_key),
+    KEY idx_expires (expires_at)
+) ENGINE=InnoDB COMMENT='大模型响应缓存表';
+
+CREATE TABLE material_id_sequences (
+    prefix VARCHAR(20) NOT NULL COMMENT '素材ID前缀(C/CW+日期)',
+    last_val INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已分配的最大顺序号',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (prefix)
+) ENGINE=InnoDB COMMENT='素材ID顺序号分配表';
+
+CREATE TABLE material_campaign_urls (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    material_id VARCHAR(50) NOT NULL COMMENT '素材ID，关联视频素材表',
+    position INT NOT NULL DEFAULT 0 COMMENT '链接在素材中的顺序',
+    campaign_url VARCHAR(1024) NOT NULL COMMENT '投放链接URL',
+    url_hash CHAR(40) AS (SHA1(campaign_url)) STORED COMMENT '链接sha1，用于唯一约束',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    PRIMARY KEY (id),
+    UNIQUE KEY unique_material_url (material_id, url_hash),
+    KEY idx_material_position (material_id, position)
+) ENGINE=InnoDB COMMENT='素材投放链接表';
+
+CREATE TABLE campaign_url_metrics (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    material_id VARCHAR(50) NOT NULL COMMENT '素材ID，关联视频素材表',
+    campaign_url VARCHAR(1024) NOT NULL COMMENT '投放链接URL',
+    url_hash CHAR(40) AS (SHA1(campaign_url)) STORED COMMENT '链接sha1，用于唯一约束',
+    click_count INT NOT NULL DEFAULT 0 COMMENT '点击量',
+    completion_count INT NOT NULL DEFAULT 0 COMMENT '完播量',
+    like_count INT NOT NULL DEFAULT 0 COMMENT '点赞量',
+    comment_count INT NOT NULL DEFAULT 0 COMMENT '评论量',
+    share_count INT NOT NULL DEFAULT 0 COMMENT '转发量',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (id),
+    UNIQUE KEY unique_material_url (material_id, url_hash)
+) ENGINE=InnoDB COMMENT='投放链接效果数据表，按素材和投放链接汇总';
+
+CREATE TABLE metrics_ingest_batches (
+    batch_id VARCHAR(64) NOT NULL COMMENT '写入批次ID(日志段ID)',
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '写入时间',
+    PRIMARY KEY (batch_id),
+    KEY idx_applied_at (applied_at)
+) ENGINE=InnoDB COMMENT='已写入的投放数据批次，用于崩溃回放去重';
+
+CREATE TABLE metrics_dead_letters (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    batch_id VARCHAR(64) COMMENT '所属写入批次ID(日志段ID)',
+    payload MEDIUMTEXT NOT NULL COMMENT '被拒绝的行(JSON: material_id, deployment_url, mode, 指标值)',
+    error TEXT COMMENT '数据库返回的错误',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    PRIMARY KEY (id),
+    KEY idx_created_at (created_at)
+) ENGINE=InnoDB COMMENT='写入失败的投放数据';
+
+CREATE TABLE campaign_url_crawl_state (
+    id INT AUTO_INCREMENT COMMENT '自增ID',
+    material_id VARCHAR(50) NOT NULL COMMENT '素材ID，关联视频素材表',
+    campaign_url VARCHAR(1024) NOT NULL COMMENT '投放链接URL',
+    url_hash CHAR(40) AS (SHA1(campaign_url)) STORED COMMENT '链接sha1，用于唯一约束',
+    etag VARCHAR(255) COMMENT '上次响应的ETag',
+    last_modified VARCHAR(64) COMMENT '上次响应的Last-Modified',
+    metrics_hash CHAR(40) COMMENT '上次抓取数据的sha1',
+    interval_seconds INT NOT NULL DEFAULT 0 COMMENT '当前抓取间隔(秒)',
+    next_crawl_at TIMESTAMP NULL COMMENT '下次抓取时间',
+    last_crawled_at TIMESTAMP NULL COMMENT '上次抓取时间',
+    last_status VARCHAR(20) COMMENT '上次抓取结果 changed/unchanged/not_modified/error',
+    failures INT NOT NULL DEFAULT 0 COMMENT '连续失败次数',
+    PRIMARY KEY (id),
+    UNIQUE KEY unique_material_url (material_id, url_hash),
+    KEY idx_next_crawl (next_crawl_at)
+) ENGINE=InnoDB COMMENT='投放链接抓取状态表，用于条件请求和增量调度';
@@ -0,0 +1,30 @@
+"""
+Atomic per-prefix counters backed by the material_id_sequences table.
+"""
+
+
+def allocate_sequence(session, prefix, count=1):
+    """
+    Reserve ``count`` consecutive sequence numbers for ``prefix``.
+
+    One INSERT ... ON DUPLICATE KEY UPDATE bumps the counter row and hands the
+    new value back through LAST_INSERT_ID(), so concurrent callers never get
+    overlapping ranges and no rows of the target table are scanned. Inside a
+    transaction the counter row stays locked until commit and the reservation
+    rolls back with it; in autocommit mode a failed insert only leaves a gap.
+
+    Args:
+        session: DBManager or DBSession to run the statement on
+        prefix (str): Counter name, e.g. the material ID date prefix
+        count (int): Number of values to reserve
+
+    Returns:
+        range: The reserved sequence numbers, starting at 1 for a new prefix
+    """
+    if count < 1:
+        raise ValueError('count must be positive')
+    last = session.execute_insert(
+        "INSERT INTO material_id_sequences (prefix, last_val) VALUES (%s, LAST_INSERT_ID(%s)) "
+        "ON DUPLICATE KEY UPDATE last_val = LAST_INSERT_ID(last_val + %s)",
+        (prefix, count, count))
+    return range(last - count + 1, last + 1)
@@ -0,0 +1,334 @@
+"""
+投放链接数据爬虫: 定时从 material_comparison_groups 读取到期的投放链接, 用 asyncio 并发抓取.
+
+- 全局最多 concurrency 个并发请求, 每个域名(host:port)最多 per_domain 个
+- 记录 ETag / Last-Modified, 再次抓取时发送条件请求, 304 视为未变化
+- 增量调度: 每个链接有自己的下次抓取时间; 数据变化时间隔重置为 min_interval, 未变化或失败时按 backoff 放大,
+  近 hot_hours 小时内创建的对比组(热组)间隔上限为 hot_max_interval, 其余为 max_interval
+- 抓到的数据作为累计值(snapshot)交给 MetricsIngestor 批量写入, 抓取状态每轮一次批量写回 campaign_url_crawl_state
+- 调度状态在数据库中, 同一时间只应运行一个爬虫实例
+
+用法:
+    python -m deployment.crawler            持续运行
+    python -m deployment.crawler --once     只抓取一轮到期的链接
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from http_client import AsyncHttpClient, LatencyRecorder
+
+STATUS_CHANGED = 'changed'
+STATUS_UNCHANGED = 'unchanged'
+STATUS_NOT_MODIFIED = 'not_modified'
+STATUS_ERROR = 'error'
+
+# 指标字段及页面/接口中可能出现的别名
+METRIC_ALIASES = {
+    'clicks': ('clicks', 'click_count', 'click'),
+    'completes': ('completes', 'completion_count', 'completions'),
+    'likes': ('likes', 'like_count', 'digg_count'),
+    'comments': ('comments', 'comment_count'),
+    'shares': ('shares', 'share_count', 'forward_count'),
+}
+
+DUE_QUERY = """
+    SELECT
+        g.material_id,
+        g.campaign_url,
+        MAX(g.created_at) >= NOW() - INTERVAL %s HOUR AS hot,
+        MAX(s.etag) AS etag,
+        MAX(s.last_modified) AS last_modified,
+        MAX(s.metrics_hash) AS metrics_hash,
+        MAX(s.interval_seconds) AS interval_seconds,
+        MAX(s.failures) AS failures
+    FROM
+        material_comparison_groups g
+    LEFT JOIN
+        campaign_url_crawl_state s ON s.material_id = g.material_id AND s.url_hash = SHA1(g.campaign_url)
+    WHERE
+        g.created_at >= NOW() - INTERVAL %s DAY
+        AND g.campaign_url IS NOT NULL AND g.campaign_url <> ''
+        AND (s.next_crawl_at IS NULL OR s.next_crawl_at <= NOW())
+    GROUP BY
+        g.material_id, g.campaign_url
+    ORDER BY
+        MIN(s.next_crawl_at IS NOT NULL), MIN(s.next_crawl_at)
+    LIMIT %s
+"""
+
+SAVE_STATE = """
+    INSERT INTO campaign_url_crawl_state (
+        material_id, campaign_url, etag, last_modified, metrics_hash, interval_seconds,
+        next_crawl_at, last_crawled_at, last_status, failures
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        etag = VALUES(etag), last_modified = VALUES(last_modified), metrics_hash = VALUES(metrics_hash),
+        interval_seconds = VALUES(interval_seconds), next_crawl_at = VALUES(next_crawl_at),
+        last_crawled_at = VALUES(last_crawled_at), last_status = VALUES(last_status), failures = VALUES(failures)
+"""
+
+
+def parse_json_metrics(body, headers=None):
+    """
+    默认解析器: JSON 响应(可包在 data 字段内), 字段名见 METRIC_ALIASES
+    平台页面需要其他解析方式时, 向 CampaignCrawler 传入 parser(body, headers) -> dict 或 None
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and isinstance(data.get('data'), dict):
+        data = data['data']
+    if not isinstance(data, dict):
+        return None
+    metrics = {}
+    for field, aliases in METRIC_ALIASES.items():
+        for alias in aliases:
+            if alias in data:
+                try:
+                    metrics[field] = int(data[alias])
+                except (TypeError, ValueError):
+                    return None
+                break
+    return metrics or None
+
+
+def domain_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class CrawlTarget:
+    __slots__ = ('material_id', 'url', 'hot', 'etag', 'last_modified', 'metrics_hash', 'interval', 'failures')
+
+    def __init__(self, material_id, url, hot=False, etag=None, last_modified=None, metrics_hash=None,
+                 interval=0, failures=0):
+        self.material_id = material_id
+        self.url = url
+        self.hot = bool(hot)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.metrics_hash = metrics_hash
+        self.interval = interval or 0
+        self.failures = failures or 0
+
+
+class CrawlResult:
+    __slots__ = ('target', 'status', 'metrics', 'etag', 'last_modified', 'metrics_hash', 'error', 'elapsed')
+
+    def __init__(self, target, status, metrics=None, etag=None, last_modified=None, metrics_hash=None,
+                 error=None, elapsed=0.0):
+        self.target = target
+        self.status = status
+        self.metrics = metrics
+        self.etag = etag
+        self.last_modified = last_modified
+        self.metrics_hash = metrics_hash
+        self.error = error
+        self.elapsed = elapsed
+
+
+class CampaignCrawler:
+    """
+    到期链接的并发抓取和调度
+    """
+
+    def __init__(self, db_manager, ingestor, parser=parse_json_metrics, concurrency=64, per_domain=4,
+                 batch_size=2000, active_days=30, min_interval=300, max_interval=6 * 3600, hot_hours=48,
+                 hot_max_interval=900, backoff=2.0, read_timeout=20, submit_timeout=30):
+        """
+        :param ingestor: MetricsIngestor, 抓到的数据经由它批量写入
+        :param parser: 响应解析函数 parser(body bytes, headers) -> {clicks, completes, likes, comments, shares} 或 None
+        :param concurrency: 全局最大并发请求数
+        :param per_domain: 每个域名的最大并发请求数
+        :param batch_size: 每轮最多抓取的链接数
+        :param active_days: 只抓取该天数内创建的对比组中的链接
+        :param min_interval: 数据变化后的抓取间隔(秒)
+        :param max_interval: 非热组的最大抓取间隔(秒)
+        :param hot_hours: 创建不超过该小时数的对比组视为热组
+        :param hot_max_interval: 热组的最大抓取间隔(秒)
+        :param backoff: 数据未变化或抓取失败时间隔的放大倍数
+        """
+        self.db_manager = db_manager
+        self.ingestor = ingestor
+        self.parser = parser
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.batch_size = batch_size
+        self.active_days = active_days
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.hot_hours = hot_hours
+        self.hot_max_interval = hot_max_interval
+        self.backoff = backoff
+        self.read_timeout = read_timeout
+        self.submit_timeout = submit_timeout
+        self.recorder = LatencyRecorder()
+        self._stats = {'rounds': 0, 'fetched': 0, STATUS_CHANGED: 0, STATUS_UNCHANGED: 0, STATUS_NOT_MODIFIED: 0,
+                       STATUS_ERROR: 0, 'last_round_seconds': 0.0}
+
+    async def _fetch(self, client, target, domain_limit, global_limit):
+        headers = {}
+        if target.etag:
+            headers['If-None-Match'] = target.etag
+        if target.last_modified:
+            headers['If-Modified-Since'] = target.last_modified
+        # 先取域名名额再取全局名额, 避免等待同一域名的请求占满全局名额
+        async with domain_limit, global_limit:
+            start = time.perf_counter()
+            try:
+                status, response_headers, body = await client.fetch('GET', target.url, headers=headers)
+            except Exception as e:
+                return CrawlResult(target, STATUS_ERROR, error=str(e) or type(e).__name__,
+                                   elapsed=time.perf_counter() - start)
+            elapsed = time.perf_counter() - start
+        if status == 304:
+            return CrawlResult(target, STATUS_NOT_MODIFIED, etag=target.etag, last_modified=target.last_modified,
+                               metrics_hash=target.metrics_hash, elapsed=elapsed)
+        if status != 200:
+            return CrawlResult(target, STATUS_ERROR, error=f'http {status}', elapsed=elapsed)
+        metrics = self.parser(body, response_headers)
+        if metrics is None:
+            return CrawlResult(target, STATUS_ERROR, error='unparseable response', elapsed=elapsed)
+        metrics_hash = hashlib.sha1(json.dumps(metrics, sort_keys=True).encode('utf-8')).hexdigest()
+        return CrawlResult(target, STATUS_CHANGED if metrics_hash != target.metrics_hash else STATUS_UNCHANGED,
+                           metrics=metrics, etag=response_headers.get('ETag'),
+                           last_modified=response_headers.get('Last-Modified'), metrics_hash=metrics_hash,
+                           elapsed=elapsed)
+
+    async def crawl(self, targets):
+        """并发抓取一批链接, 返回与 targets 顺序一致的 CrawlResult 列表(不访问数据库)"""
+        global_limit = asyncio.Semaphore(self.concurrency)
+        domain_limits = defaultdict(lambda: asyncio.Semaphore(self.per_domain))
+        async with AsyncHttpClient(read_timeout=self.read_timeout, retries=1, limit=self.concurrency,
+                                   limit_per_host=self.per_domain, recorder=self.recorder) as client:
+            return await asyncio.gather(*(self._fetch(client, target, domain_limits[domain_of(target.url)],
+                                                      global_limit) for target in targets))
+
+    def next_interval(self, result):
+        """根据抓取结果计算下次抓取间隔(秒)"""
+        target = result.target
+        cap = self.hot_max_interval if target.hot else self.max_interval
+        if result.status == STATUS_CHANGED:
+            return min(cap, self.min_interval)
+        return min(cap, max(self.min_interval, int((target.interval or self.min_interval) * self.backoff)))
+
+    def due_targets(self):
+        rows = self.db_manager.fetch_all(DUE_QUERY, (self.hot_hours, self.active_days, self.batch_size))
+        return [CrawlTarget(row['material_id'], row['campaign_url'], row['hot'], row['etag'], row['last_modified'],
+                            row['metrics_hash'], row['interval_seconds'], row['failures']) for row in rows]
+
+    def save(self, results):
+        """变化的数据交给 ingestor, 抓取状态批量写回"""
+        updates = [dict(result.metrics, material_id=result.target.material_id,
+                        deployment_url=result.target.url, mode='snapshot')
+                   for result in results if result.status == STATUS_CHANGED]
+        if updates:
+            self.ingestor.submit(updates, timeout=self.submit_timeout)
+        # 按数据库时间计算下次抓取时间, 避免应用与数据库时区不一致
+        now = self.db_manager.fetch_one("SELECT NOW() AS now")['now']
+        state = []
+        for result in results:
+            target = result.target
+            interval = self.next_interval(result)
+            failed = result.status == STATUS_ERROR
+            state.append((target.material_id, target.url,
+                          target.etag if failed else result.etag,
+                          target.last_modified if failed else result.last_modified,
+                          target.metrics_hash if failed else result.metrics_hash,
+                          interval, now + timedelta(seconds=interval), now,
+                          result.status, target.failures + 1 if failed else 0))
+        if state:
+            self.db_manager.batch_execute_insert(SAVE_STATE, state)
+
+    async def run_once(self):
+        """抓取一轮到期的链接, 返回本轮链接数"""
+        start = time.perf_counter()
+        targets = await asyncio.to_thread(self.due_targets)
+        if not targets:
+            return 0
+        results = await self.crawl(targets)
+        await asyncio.to_thread(self.save, results)
+        self._stats['rounds'] += 1
+        self._stats['fetched'] += len(results)
+        for result in results:
+            self._stats[result.status] += 1
+        self._stats['last_round_seconds'] = round(time.perf_counter() - start, 3)
+        return len(results)
+
+    async def run_forever(self, idle_sleep=30):
+        while True:
+            try:
+                count = await self.run_once()
+            except Exception as e:
+                print(f"crawl round failed: {e}")
+                count = 0
+            # 本轮没有取满说明暂无更多到期链接
+            if count < self.batch_size:
+                await asyncio.sleep(idle_sleep)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['hosts'] = self.recorder.stats()
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='只抓取一轮到期的链接')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from db.db import DBManager
+    from deployment.metrics import MetricsIngestor
+    from deployment.scoring import scorer_from_env
+    from deployment.details_cache import details_cache_from_env
+    load_dotenv()
+    db_manager = DBManager(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT", 3306)),
+                           user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+                           database=os.getenv("DB_DATABASE"), pool_size=4)
+    # 配置了共享层时, 爬虫写入的数据同样能使 API 进程的详情缓存失效
+    details_cache = details_cache_from_env()
+    scorer = scorer_from_env(db_manager, on_scored=details_cache.invalidate_groups)
+
+    def on_flush(material_ids):
+        details_cache.invalidate_materials(material_ids)
+        scorer.mark_dirty(material_ids)
+
+    ingestor = MetricsIngestor(db_manager,
+                               flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", 1)),
+                               max_batch=int(os.getenv("METRICS_MAX_BATCH", 5000)),
+                               max_pending=int(os.getenv("METRICS_MAX_PENDING", 100000)),
+                               journal_dir=os.getenv("METRICS_JOURNAL_DIR") or None,
+                               fsync=os.getenv("METRICS_JOURNAL_FSYNC", "False") == "True",
+                               on_flush=on_flush)
+    crawler = CampaignCrawler(db_manager, ingestor,
+                              concurrency=int(os.getenv("CRAWLER_CONCURRENCY", 64)),
+                              per_domain=int(os.getenv("CRAWLER_PER_DOMAIN", 4)),
+                              batch_size=int(os.getenv("CRAWLER_BATCH_SIZE", 2000)),
+                              active_days=int(os.getenv("CRAWLER_ACTIVE_DAYS", 30)),
+                              min_interval=int(os.getenv("CRAWLER_MIN_INTERVAL", 300)),
+                              max_interval=int(os.getenv("CRAWLER_MAX_INTERVAL", 21600)),
+                              hot_hours=int(os.getenv("CRAWLER_HOT_HOURS", 48)),
+                              hot_max_interval=int(os.getenv("CRAWLER_HOT_MAX_INTERVAL", 900)))
+    try:
+        if args.once:
+            asyncio.run(crawler.run_once())
+        else:
+            asyncio.run(crawler.run_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingestor.close()
+        print(json.dumps({'crawler': crawler.stats(), 'metrics_ingest': ingestor.stats()}, default=str))
+        db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
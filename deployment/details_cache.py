@@ -0,0 +1,292 @@
+"""
+对比组详情(/api/deployment/details)读穿缓存, 以对比组ID为键.
+
+两级:
+    进程内 LRU     命中时不访问数据库
+    共享层(可选)   Redis, 配置 DETAILS_CACHE_REDIS_URL 后启用(需安装 redis), gunicorn 各 worker 及爬虫进程共享
+
+失效:
+- 投放数据写入、评分写回、对比组生成、素材更新后按对比组或素材ID精确失效
+- 素材 -> 对比组的反查只覆盖已缓存的对比组, 不查数据库
+- 有共享层时每个对比组在 Redis 中有一个版本令牌, 失效即换新令牌; 读取时一次 MGET 取令牌和共享数据,
+  本地条目令牌不一致即视为过期, 因此其他进程(如爬虫)写入后所有 worker 立即失效
+- 无共享层时失效只作用于本进程, 其他进程的条目在 ttl 内过期
+
+每个条目带内容哈希作为 ETag, 路由据此返回 304.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class _Entry:
+    __slots__ = ('data', 'etag', 'version', 'expires_at', 'material_ids')
+
+    def __init__(self, data, etag, version, expires_at, material_ids):
+        self.data = data
+        self.etag = etag
+        self.version = version
+        self.expires_at = expires_at
+        self.material_ids = material_ids
+
+
+class _Flight:
+    """同一对比组的并发未命中只查一次数据库"""
+    __slots__ = ('done', 'result', 'error', 'invalidated')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.invalidated = False
+
+
+def make_etag(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class DetailsCache:
+    """
+    对比组详情读穿缓存
+    """
+
+    def __init__(self, max_entries=10000, ttl=300, shared=None, prefix='adify:details:'):
+        """
+        :param max_entries: 进程内 LRU 最大条目数
+        :param ttl: 条目有效期(秒), 无共享层时也是跨进程失效的最长延迟
+        :param shared: redis.Redis 实例, None 表示只用进程内缓存
+        :param prefix: 共享层键前缀
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._by_material = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0, 'shared_errors': 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    # ---- 进程内 LRU, 调用方持有 self._lock ----
+
+    def _drop(self, group_id):
+        entry = self._entries.pop(group_id, None)
+        if entry is None:
+            return
+        for material_id in entry.material_ids:
+            groups = self._by_material.get(material_id)
+            if groups is not None:
+                groups.discard(group_id)
+                if not groups:
+                    del self._by_material[material_id]
+
+    def _put(self, group_id, entry):
+        self._drop(group_id)
+        self._entries[group_id] = entry
+        for material_id in entry.material_ids:
+            self._by_material.setdefault(material_id, set()).add(group_id)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _lookup(self, group_id, version):
+        entry = self._entries.get(group_id)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic() or entry.version != version:
+            self._drop(group_id)
+            return None
+        self._entries.move_to_end(group_id)
+        return entry
+
+    # ---- 共享层 ----
+
+    def _version_key(self, group_id):
+        return f'{self.prefix}v:{group_id}'
+
+    def _data_key(self, group_id):
+        return f'{self.prefix}d:{group_id}'
+
+    def _material_key(self, material_id):
+        return f'{self.prefix}m:{material_id}'
+
+    def _shared_read(self, group_id):
+        """:return: (版本令牌, 共享层中与令牌一致的条目或 None, 当前素材失效序号)"""
+        version, raw, seq = self.shared.mget(self._version_key(group_id), self._data_key(group_id), self._seq_key())
+        version = version.decode('utf-8') if version else ''
+        seq = int(seq or 0)
+        if raw:
+            item = json.loads(raw)
+            if item['v'] == version:
+                return version, item, seq
+        return version, None, seq
+
+    def _seq_key(self):
+        return f'{self.prefix}seq'
+
+    def _touched_key(self, material_id):
+        return f'{self.prefix}t:{material_id}'
+
+    def _touched_since(self, material_ids, seq):
+        """查询期间是否有其他进程失效过这些素材(此时对比组尚未进入反查索引, 失效会漏掉)"""
+        if not material_ids:
+            return False
+        values = self.shared.mget([self._touched_key(material_id) for material_id in material_ids])
+        return any(value is not None and int(value) > seq for value in values)
+
+    def _shared_write(self, group_id, entry):
+        item = {'v': entry.version, 'etag': entry.etag, 'data': entry.data, 'm': sorted(entry.material_ids)}
+        pipe = self.shared.pipeline(transaction=False)
+        pipe.set(self._data_key(group_id), json.dumps(item, ensure_ascii=False, default=str), ex=self.ttl)
+        for material_id in entry.material_ids:
+            key = self._material_key(material_id)
+            pipe.sadd(key, group_id)
+            pipe.expire(key, self.ttl * 2)
+        pipe.execute()
+
+    # ---- 对外接口 ----
+
+    def get(self, group_id, load):
+        """
+        读取对比组详情, 未命中时调用 load() 查数据库
+        :param load: 返回 (data, material_ids), data 为可 JSON 序列化的响应数据
+        :return: (data, etag)
+        """
+        version, item, seq = None, None, 0
+        if self.shared is not None:
+            try:
+                version, item, seq = self._shared_read(group_id)
+            except Exception as e:
+                # 共享层不可用时无法校验版本, 直接查库
+                print(f"details cache shared tier unavailable: {e}")
+                self._count('shared_errors')
+                data, _ = load()
+                return data, make_etag(data)
+
+        with self._lock:
+            entry = self._lookup(group_id, version)
+            if entry is not None:
+                self._stats['local_hits'] += 1
+                return entry.data, entry.etag
+        if item is not None:
+            entry = _Entry(item['data'], item['etag'], version, time.monotonic() + self.ttl, frozenset(item['m']))
+            with self._lock:
+                self._stats['shared_hits'] += 1
+                self._put(group_id, entry)
+            return entry.data, entry.etag
+
+        with self._lock:
+            flight = self._flights.get(group_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[group_id] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result.data, flight.result.etag
+
+        try:
+            self._count('misses')
+            data, material_ids = load()
+            entry = _Entry(data, make_etag(data), version, time.monotonic() + self.ttl, frozenset(material_ids))
+            flight.result = entry
+            if self.shared is not None and not flight.invalidated:
+                try:
+                    if self._touched_since(entry.material_ids, seq):
+                        flight.invalidated = True
+                    else:
+                        self._shared_write(group_id, entry)
+                except Exception as e:
+                    print(f"details cache shared write failed: {e}")
+                    self._count('shared_errors')
+                    flight.invalidated = True
+            with self._lock:
+                if not flight.invalidated:
+                    self._put(group_id, entry)
+            return entry.data, entry.etag
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(group_id) is flight:
+                    del self._flights[group_id]
+            flight.done.set()
+
+    def invalidate_groups(self, group_ids):
+        """对比组数据(投放数据、评分、素材)变化后调用"""
+        group_ids = set(group_ids)
+        if not group_ids:
+            return
+        with self._lock:
+            for group_id in group_ids:
+                self._drop(group_id)
+                # 进行中的查询可能读到旧数据, 结果不写入缓存, 之后的请求重新查询
+                flight = self._flights.pop(group_id, None)
+                if flight is not None:
+                    flight.invalidated = True
+            self._stats['invalidations'] += len(group_ids)
+        if self.shared is not None:
+            try:
+                pipe = self.shared.pipeline(transaction=False)
+                for group_id in group_ids:
+                    # 令牌有效期长于条目, 令牌过期前以旧令牌写入的条目都已过期
+                    pipe.set(self._version_key(group_id), uuid.uuid4().hex, ex=self.ttl * 2)
+                    pipe.delete(self._data_key(group_id))
+                pipe.execute()
+            except Exception as e:
+                print(f"details cache shared invalidation failed: {e}")
+                self._count('shared_errors')
+
+    def invalidate_materials(self, material_ids):
+        """素材或其投放数据变化后调用, 失效包含这些素材的已缓存对比组"""
+        material_ids = set(material_ids)
+        if not material_ids:
+            return
+        with self._lock:
+            groups = set()
+            for material_id in material_ids:
+                groups.update(self._by_material.get(material_id, ()))
+            # 进行中的查询还不知道包含哪些素材, 一律不写入缓存
+            for flight in self._flights.values():
+                flight.invalidated = True
+            self._flights.clear()
+        if self.shared is not None:
+            try:
+                # 素材失效序号: 读取前取得的序号小于它的查询结果不写入缓存
+                seq = self.shared.incr(self._seq_key())
+                pipe = self.shared.pipeline(transaction=False)
+                for material_id in material_ids:
+                    pipe.set(self._touched_key(material_id), seq, ex=self.ttl * 2)
+                pipe.sunion([self._material_key(material_id) for material_id in material_ids])
+                groups.update(group_id.decode('utf-8') for group_id in pipe.execute()[-1])
+            except Exception as e:
+                print(f"details cache shared lookup failed: {e}")
+                self._count('shared_errors')
+        self.invalidate_groups(groups)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['shared'] = self.shared is not None
+        return stats
+
+
+def details_cache_from_env():
+    """按 DETAILS_CACHE_* 环境变量创建"""
+    shared = None
+    url = os.getenv("DETAILS_CACHE_REDIS_URL")
+    if url:
+        import redis
+        shared = redis.Redis.from_url(url, socket_timeout=float(os.getenv("DETAILS_CACHE_REDIS_TIMEOUT", 0.2)))
+    return DetailsCache(max_entries=int(os.getenv("DETAILS_CACHE_MAX_ENTRIES", 10000)),
+                        ttl=int(os.getenv("DETAILS_CACHE_TTL", 300)), shared=shared)
@@ -0,0 +1,393 @@
+"""
+投放数据写入管道: 高频上报的点击/完播/点赞/评论/转发数据先在内存中合并, 由后台线程批量写入数据库.
+
+- 同一 (素材ID, 投放链接) 的多次上报在内存中合并: 累计值(snapshot)覆盖, 增量(delta)相加
+- 按时间(flush_interval)或数量(max_batch)触发写入, 每批一个事务:
+  多行 INSERT ... ON DUPLICATE KEY UPDATE 写 campaign_url_metrics, 再同步到 material_comparison_groups
+- 待写入的键超过 max_pending 时 submit 阻塞等待, 超时抛出 BackpressureError
+- 每条上报先追加到本进程的日志段文件再确认; 进程崩溃后由下次启动的进程回放未写入的日志段,
+  日志段ID随数据在同一事务内记录到 metrics_ingest_batches, 回放不会重复累加增量;
+  回放在本进程首次 submit 启动后台线程时进行
+- 一批连续失败 max_attempts 次后逐行写入, 仍失败的行转存到 metrics_dead_letters, 不阻塞后续批次
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+
+METRIC_FIELDS = ('clicks', 'completes', 'likes', 'comments', 'shares')
+METRIC_COLUMNS = ('click_count', 'completion_count', 'like_count', 'comment_count', 'share_count')
+MODES = ('snapshot', 'delta')
+
+_INSERT = ("INSERT INTO campaign_url_metrics (material_id, campaign_url, " + ', '.join(METRIC_COLUMNS) + ") "
+           "VALUES (%s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE ")
+SNAPSHOT_UPSERT = _INSERT + ', '.join(f'{c} = VALUES({c})' for c in METRIC_COLUMNS)
+DELTA_UPSERT = _INSERT + ', '.join(f'{c} = {c} + VALUES({c})' for c in METRIC_COLUMNS)
+# 同步到对比组表, 按投放链接哈希走 campaign_url_metrics 唯一索引
+PROPAGATE = ("UPDATE material_comparison_groups mc JOIN campaign_url_metrics m "
+             "ON m.material_id = mc.material_id AND m.url_hash = SHA1(mc.campaign_url) SET "
+             + ', '.join(f'mc.{c} = m.{c}' for c in METRIC_COLUMNS) + " WHERE mc.material_id IN %s")
+
+
+# 已写入批次ID的保留时间(秒)
+BATCH_RETENTION = 7 * 24 * 3600
+
+# 与 campaign_url_metrics 列定义一致: material_id VARCHAR(50), campaign_url VARCHAR(1024), 指标 INT
+MAX_MATERIAL_ID_LENGTH = 50
+MAX_URL_LENGTH = 1024
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+class BackpressureError(Exception):
+    """待写入数据过多, 调用方应稍后重试"""
+
+
+def parse_update(item):
+    """
+    校验单条上报
+    :param item: dict(material_id, deployment_url, mode, clicks, completes, likes, comments, shares)
+    :return: (material_id, deployment_url, is_snapshot, [5个指标值])
+    """
+    if not isinstance(item, dict) or not item.get('material_id') or not item.get('deployment_url'):
+        raise ValueError('material_id or deployment_url is null')
+    mode = item.get('mode', 'snapshot')
+    if mode not in MODES:
+        raise ValueError(f'mode must be one of {MODES}')
+    try:
+        values = [int(item.get(field) or 0) for field in METRIC_FIELDS]
+    except (TypeError, ValueError):
+        raise ValueError(f'metrics must be integers: {item}')
+    if mode == 'snapshot' and any(value < 0 for value in values):
+        raise ValueError(f'snapshot metrics must not be negative: {item}')
+    if any(value < INT_MIN or value > INT_MAX for value in values):
+        raise ValueError(f'metrics out of range: {item}')
+    material_id, url = str(item['material_id']), str(item['deployment_url']).strip()
+    if len(material_id) > MAX_MATERIAL_ID_LENGTH:
+        raise ValueError(f'material_id longer than {MAX_MATERIAL_ID_LENGTH}: {material_id}')
+    if not url or len(url) > MAX_URL_LENGTH:
+        raise ValueError(f'deployment_url must be 1-{MAX_URL_LENGTH} characters')
+    return material_id, url, mode == 'snapshot', values
+
+
+def merge(rows, update):
+    """把一条上报合并进 {(material_id, url): [is_snapshot, values]}"""
+    material_id, url, is_snapshot, values = update
+    key = (material_id, url)
+    current = rows.get(key)
+    if is_snapshot or current is None:
+        rows[key] = [is_snapshot, list(values)]
+    else:
+        # 累计值之后的增量仍按累计值写入
+        current[1] = [a + b for a, b in zip(current[1], values)]
+
+
+class _Journal:
+    """
+    本进程的日志段文件, 文件名按创建时间排序; 持有文件锁期间其他进程不会回放
+    """
+
+    def __init__(self, directory, fsync=False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync
+        self._segment = None
+
+    def _open(self):
+        batch_id = f'{time.time_ns():020d}-{uuid.uuid4().hex[:12]}'
+        path = os.path.join(self.directory, batch_id + '.jsonl')
+        f = open(path, 'a', encoding='utf-8')
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._segment = (batch_id, path, f)
+
+    def append(self, updates):
+        if self._segment is None:
+            self._open()
+        f = self._segment[2]
+        f.write(''.join(json.dumps(update, ensure_ascii=False) + '\n' for update in updates))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def rotate(self):
+        """结束当前日志段(仍持有锁直到 discard), 返回 (batch_id, path, file) 或 None"""
+        segment, self._segment = self._segment, None
+        return segment
+
+    def orphans(self):
+        """已退出进程遗留的日志段, 按创建顺序返回 (batch_id, path, file, updates)"""
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.jsonl'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                f = open(path, 'r+', encoding='utf-8')
+            except OSError:
+                continue
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # 仍被存活的进程持有
+                f.close()
+                continue
+            updates = []
+            for line in f:
+                try:
+                    updates.append(tuple(json.loads(line)))
+                except ValueError:
+                    # 崩溃时写了一半的最后一行
+                    break
+            yield name[:-len('.jsonl')], path, f, updates
+
+    @staticmethod
+    def discard(segment):
+        _, path, f = segment
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        f.close()
+
+
+class _Batch:
+    __slots__ = ('batch_id', 'rows', 'segment', 'attempts', 'split_done')
+
+    def __init__(self, rows, segment=None, batch_id=None):
+        self.rows = rows
+        self.segment = segment
+        self.batch_id = segment[0] if segment else batch_id
+        self.attempts = 0
+        # 逐行写入时已处理(写入或转存)的键
+        self.split_done = set()
+
+
+class MetricsIngestor:
+    """
+    投放数据写回缓冲
+    """
+
+    def __init__(self, db_manager, flush_interval=1.0, max_batch=5000, max_pending=100000,
+                 journal_dir=None, fsync=False, retry_interval=5.0, max_attempts=5, on_flush=None):
+        """
+        :param flush_interval: 最长写入间隔(秒)
+        :param max_batch: 待写入的键达到该数量时立即写入, 也是单条 INSERT 的最大行数
+        :param max_pending: 内存中待写入(含写入失败待重试)的键上限, 超过时 submit 等待
+        :param journal_dir: 日志段目录, None 时不写日志(进程崩溃会丢失未写入的数据)
+        :param fsync: 每次追加日志后 fsync, 机器掉电也不丢数据, 吞吐会下降
+        :param retry_interval: 写入失败后的重试间隔(秒)
+        :param max_attempts: 一批连续失败该次数后逐行写入, 仍失败的行转存到 metrics_dead_letters
+        :param on_flush: 每批写入提交后以本批涉及的素材ID集合调用, 如触发优选重算
+        """
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self.on_flush = on_flush
+        self.journal = _Journal(journal_dir, fsync) if journal_dir else None
+
+        self._pending = {}
+        self._unflushed = []
+        self._cond = threading.Condition(threading.Lock())
+        self._apply_lock = threading.Lock()
+        self._thread = None
+        self._closing = False
+        self._next_prune = 0.0
+        self._stats = {'accepted': 0, 'rejected': 0, 'flushes': 0, 'rows_written': 0, 'flush_errors': 0,
+                       'replayed_batches': 0, 'duplicate_batches': 0, 'split_batches': 0, 'dead_letters': 0,
+                       'last_flush_ms': 0.0, 'max_flush_ms': 0.0}
+
+    def _ensure_started(self):
+        # 线程在首次使用时启动, 避免 gunicorn preload 后 fork 丢失线程
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='metrics-ingest', daemon=True)
+                self._thread.start()
+
+    def _backlog(self):
+        return len(self._pending) + sum(len(batch.rows) for batch in self._unflushed)
+
+    def submit(self, items, timeout=0.0):
+        """
+        接收一批上报, 写入日志并合并到内存后返回
+        :param timeout: 缓冲已满时最长等待秒数
+        :return: 接收的条数
+        """
+        updates = [parse_update(item) for item in items]
+        if not updates:
+            return 0
+        self._ensure_started()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            new_keys = len({(u[0], u[1]) for u in updates} - self._pending.keys())
+            while self._backlog() and self._backlog() + new_keys > self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['rejected'] += len(updates)
+                    raise BackpressureError(f'metrics backlog full ({self._backlog()} pending)')
+                self._cond.wait(remaining)
+                new_keys = len({(u[0], u[1]) for u in updates} - self._pending.keys())
+            if self.journal:
+                self.journal.append(updates)
+            for update in updates:
+                merge(self._pending, update)
+            self._stats['accepted'] += len(updates)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+        return len(updates)
+
+    def _rotate(self):
+        """把当前缓冲转为待写入批次, 需持有 self._cond"""
+        if self._pending:
+            segment = self.journal.rotate() if self.journal else None
+            self._unflushed.append(_Batch(self._pending, segment))
+            self._pending = {}
+
+    def _apply(self, batch):
+        """一个事务写入一批; 有日志段ID时先登记, 已登记过的批次直接跳过"""
+        start = time.perf_counter()
+        snapshots, deltas = [], []
+        for (material_id, url), (is_snapshot, values) in batch.rows.items():
+            (snapshots if is_snapshot else deltas).append((material_id, url, *values))
+        with self.db_manager.transaction() as tx:
+            if batch.batch_id and not tx.execute(
+                    "INSERT IGNORE INTO metrics_ingest_batches (batch_id) VALUES (%s)", (batch.batch_id,)):
+                duplicate = True
+            else:
+                duplicate = False
+                for query, rows in ((SNAPSHOT_UPSERT, snapshots), (DELTA_UPSERT, deltas)):
+                    for i in range(0, len(rows), self.max_batch):
+                        tx.batch_execute_insert(query, rows[i:i + self.max_batch])
+                tx.execute(PROPAGATE, (tuple({material_id for material_id, _ in batch.rows}),))
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._cond:
+            if duplicate:
+                self._stats['duplicate_batches'] += 1
+            else:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += len(batch.rows)
+            self._stats['last_flush_ms'] = round(elapsed, 2)
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], round(elapsed, 2))
+        if self.on_flush and not duplicate:
+            try:
+                self.on_flush({material_id for material_id, _ in batch.rows})
+            except Exception as e:
+                print(f"metrics on_flush callback failed: {e}")
+
+    def _split(self, batch):
+        """
+        逐行写入反复失败的批次, 每行是独立事务(批次ID加行序号去重); 仍失败的行转存到死信表.
+        转存失败(如数据库不可用)时抛出, 批次保留, 已处理的行下次跳过
+        """
+        for index, key in enumerate(sorted(batch.rows)):
+            if key in batch.split_done:
+                continue
+            row = _Batch({key: batch.rows[key]}, batch_id=f'{batch.batch_id}:{index}' if batch.batch_id else None)
+            try:
+                self._apply(row)
+            except Exception as e:
+                is_snapshot, values = batch.rows[key]
+                payload = {'material_id': key[0], 'deployment_url': key[1],
+                           'mode': 'snapshot' if is_snapshot else 'delta',
+                           **dict(zip(METRIC_FIELDS, values))}
+                self.db_manager.execute(
+                    "INSERT INTO metrics_dead_letters (batch_id, payload, error) VALUES (%s, %s, %s)",
+                    (batch.batch_id, json.dumps(payload, ensure_ascii=False), str(e)[:2000]))
+                print(f"metrics row moved to dead letters: {payload}: {e}")
+                with self._cond:
+                    self._stats['dead_letters'] += 1
+            batch.split_done.add(key)
+        with self._cond:
+            self._stats['split_batches'] += 1
+
+    def _prune(self):
+        """定期清理过期的批次ID"""
+        if self.journal is None or time.monotonic() < self._next_prune:
+            return
+        self._next_prune = time.monotonic() + 3600
+        self.db_manager.execute("DELETE FROM metrics_ingest_batches WHERE applied_at < NOW() - INTERVAL %s SECOND "
+                                "LIMIT 10000", (BATCH_RETENTION,))
+
+    def _drain(self):
+        """按顺序写入待写入批次, 失败时保留剩余批次并返回 False; 连续失败的批次改为逐行写入"""
+        with self._apply_lock:
+            if self._unflushed:
+                try:
+                    self._prune()
+                except Exception as e:
+                    print(f"metrics batch prune failed: {e}")
+            while True:
+                with self._cond:
+                    if not self._unflushed:
+                        return True
+                    batch = self._unflushed[0]
+                try:
+                    if batch.attempts < self.max_attempts:
+                        self._apply(batch)
+                    else:
+                        self._split(batch)
+                except Exception as e:
+                    print(f"metrics flush failed: {e}")
+                    with self._cond:
+                        self._stats['flush_errors'] += 1
+                    batch.attempts += 1
+                    return False
+                if batch.segment:
+                    self.journal.discard(batch.segment)
+                with self._cond:
+                    self._unflushed.pop(0)
+                    self._cond.notify_all()
+
+    def _replay(self):
+        """回放已退出进程遗留的日志段"""
+        for batch_id, path, f, updates in self.journal.orphans():
+            rows = {}
+            for update in updates:
+                merge(rows, update)
+            batch = _Batch(rows, (batch_id, path, f))
+            with self._cond:
+                self._unflushed.append(batch)
+                self._stats['replayed_batches'] += 1
+
+    def _run(self):
+        if self.journal:
+            try:
+                self._replay()
+            except Exception as e:
+                print(f"metrics journal replay failed: {e}")
+        while True:
+            with self._cond:
+                if not self._unflushed:
+                    self._cond.wait_for(lambda: len(self._pending) >= self.max_batch or self._closing,
+                                        timeout=self.flush_interval)
+                self._rotate()
+                closing = self._closing
+            if not self._drain():
+                time.sleep(self.retry_interval)
+            elif closing:
+                return
+
+    def flush(self):
+        """立即写入缓冲中的全部数据, 成功返回 True"""
+        with self._cond:
+            self._rotate()
+        return self._drain()
+
+    def close(self):
+        """停止后台线程并写入剩余数据"""
+        with self._cond:
+            if self._thread is None:
+                return True
+            self._closing = True
+            self._cond.notify_all()
+        return self.flush()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+            stats['backlog'] = self._backlog()
+        stats['coalesced'] = max(0, stats['accepted'] - stats['rows_written'] - stats['backlog'])
+        return stats
@@ -0,0 +1,306 @@
+"""
+对比组优选: 把对比组的投放数据载入 NumPy 数组, 一次向量化计算所有组的加权互动率、胜出概率和显著性,
+更新 material_comparison_groups.is_system_preferred.
+
+- 互动率: 完播/点赞/评论/转发各自除以点击量(截断到 [0, 1])后按权重加权平均, 视为每次点击的成功率
+- 胜出概率(Thompson 采样): 成功率服从 Beta(prior_a + 成功数, prior_b + 失败数), 每个素材采样 samples 次,
+  统计取得组内最大值的比例; α、β 都较大时用正态近似代替 Beta 采样
+- 显著性: 单侧双比例 z 检验, 与同组其余素材的合计比较
+- 优选: 组内胜出概率最高且不低于 threshold, 且组内每个素材点击量都不少于 min_clicks 时标记, 否则整组不标记
+- 增量: MetricsIngestor 写入后把涉及的素材交给 mark_dirty, 后台线程每 interval 秒只重算这些素材所在的组
+
+用法:
+    python -m deployment.scoring                 重算所有活跃对比组
+    python -m deployment.scoring --groups P1,P2  只重算指定对比组
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from concurrency import run_cpu_bound
+
+METRIC_COLUMNS = ('click_count', 'completion_count', 'like_count', 'comment_count', 'share_count')
+# 完播、点赞、评论、转发的权重
+DEFAULT_WEIGHTS = (1.0, 0.5, 1.0, 2.0)
+# α、β 都不小于该值时 Beta 分布用正态近似采样
+NORMAL_APPROX_MIN = 30
+
+# 按主键批量更新评分: 每批参数拼成派生表后 JOIN, 一条语句更新整批, 不会插入新行
+SAVE_SCORES = """
+    UPDATE material_comparison_groups m JOIN ({rows}) s ON m.id = s.id
+    SET m.engagement_rate = s.engagement_rate, m.win_probability = s.win_probability,
+        m.p_value = s.p_value, m.is_system_preferred = s.is_system_preferred, m.scored_at = NOW()
+"""
+SCORE_ROW_FIRST = "SELECT %s AS id, %s AS engagement_rate, %s AS win_probability, %s AS p_value, " \
+                  "%s AS is_system_preferred"
+SCORE_ROW = "SELECT %s, %s, %s, %s, %s"
+
+
+def save_scores_query(n):
+    """n 行评分的批量 UPDATE ... JOIN 语句"""
+    return SAVE_SCORES.format(rows=' UNION ALL '.join([SCORE_ROW_FIRST] + [SCORE_ROW] * (n - 1)))
+
+
+def normal_sf(z):
+    """标准正态分布上侧概率 1 - Φ(z), Abramowitz-Stegun 7.1.26 近似, 误差小于 1.5e-7"""
+    x = np.abs(z) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return np.where(z >= 0, 0.5 * (1.0 - erf), 0.5 * (1.0 + erf))
+
+
+def _chunks(starts, rows, chunk_rows):
+    """按组边界切分, 每块不超过 chunk_rows 行(单组超过时独占一块), 返回 (行起, 行止, 组起, 组止)"""
+    bounds = np.append(starts, rows)
+    g0 = 0
+    while g0 < len(starts):
+        g1 = int(np.searchsorted(bounds, bounds[g0] + chunk_rows, side='right')) - 1
+        g1 = min(max(g1, g0 + 1), len(starts))
+        yield int(bounds[g0]), int(bounds[g1]), g0, g1
+        g0 = g1
+
+
+def _sample(rng, alpha, beta, samples):
+    """每行从 Beta(alpha, beta) 采样 samples 次, 返回 float32 矩阵"""
+    total = alpha + beta
+    mean = (alpha / total).astype(np.float32)
+    std = np.sqrt(alpha * beta / (total * total * (total + 1.0))).astype(np.float32)
+    draws = rng.standard_normal((len(alpha), samples), dtype=np.float32)
+    draws *= std[:, None]
+    draws += mean[:, None]
+    exact = np.flatnonzero(np.minimum(alpha, beta) < NORMAL_APPROX_MIN)
+    if len(exact):
+        draws[exact] = rng.beta(alpha[exact, None], beta[exact, None], size=(len(exact), samples))
+    return draws
+
+
+def score_groups(group_index, counts, weights=DEFAULT_WEIGHTS, prior=(1.0, 1.0), samples=1000, min_clicks=100,
+                 threshold=0.95, chunk_rows=10000, rng=None):
+    """
+    向量化计算所有组的评分
+    :param group_index: 每行所属组的编号, 同组的行必须相邻
+    :param counts: (行数, 5) 数组, 列依次为点击、完播、点赞、评论、转发
+    :param chunk_rows: 采样时每块的最大行数, 控制内存(每块约 chunk_rows * samples * 4 字节)
+    :return: dict(rate, win_probability, p_value, preferred), 每项为与行对应的数组
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    counts = np.asarray(counts, dtype=np.float64).reshape(-1, len(METRIC_COLUMNS))
+    group_index = np.asarray(group_index)
+    rows = len(counts)
+    if rows == 0:
+        empty = np.empty(0)
+        return {'rate': empty, 'win_probability': empty, 'p_value': empty, 'preferred': np.empty(0, dtype=bool)}
+
+    starts = np.flatnonzero(np.r_[True, group_index[1:] != group_index[:-1]])
+    sizes = np.diff(np.append(starts, rows))
+    gid = np.repeat(np.arange(len(starts)), sizes)
+
+    clicks = counts[:, 0]
+    trials = np.maximum(clicks, 1.0)
+    w = np.asarray(weights, dtype=np.float64)
+    rate = np.clip(counts[:, 1:] / trials[:, None], 0.0, 1.0) @ w / w.sum()
+    successes = rate * clicks
+
+    # 与同组其余素材合计的单侧 z 检验
+    group_successes = np.add.reduceat(successes, starts)[gid]
+    group_clicks = np.add.reduceat(clicks, starts)[gid]
+    rest_clicks = group_clicks - clicks
+    rest_rate = (group_successes - successes) / np.maximum(rest_clicks, 1.0)
+    pooled = group_successes / np.maximum(group_clicks, 1.0)
+    se = np.sqrt(pooled * (1.0 - pooled) * (1.0 / trials + 1.0 / np.maximum(rest_clicks, 1.0)))
+    testable = (se > 0) & (clicks > 0) & (rest_clicks > 0)
+    z = np.divide(rate - rest_rate, se, out=np.zeros(rows), where=testable)
+    p_value = np.where(testable, normal_sf(z), 1.0)
+
+    # Thompson 采样, 按组分块
+    alpha = prior[0] + successes
+    beta = prior[1] + clicks - successes
+    win = np.empty(rows)
+    for lo, hi, g0, g1 in _chunks(starts, rows, chunk_rows):
+        draws = _sample(rng, alpha[lo:hi], beta[lo:hi], samples)
+        group_max = np.maximum.reduceat(draws, starts[g0:g1] - lo, axis=0)
+        win[lo:hi] = (draws >= group_max[gid[lo:hi] - g0]).mean(axis=1)
+
+    best = win >= np.maximum.reduceat(win, starts)[gid]
+    eligible = (sizes[gid] > 1) & (np.minimum.reduceat(clicks, starts)[gid] >= min_clicks)
+    preferred = best & eligible & (win >= threshold)
+    return {'rate': rate, 'win_probability': win, 'p_value': p_value, 'preferred': preferred}
+
+
+class WinnerScorer:
+    """
+    读取对比组数据、评分并写回
+    """
+
+    def __init__(self, db_manager, interval=30, active_days=30, weights=DEFAULT_WEIGHTS, samples=1000,
+                 min_clicks=100, threshold=0.95, write_batch=5000, query_batch=1000, on_scored=None):
+        """
+        :param interval: 增量重算的间隔(秒)
+        :param active_days: 全量重算时只处理该天数内创建的对比组
+        :param write_batch: 每条写回语句的最大行数
+        :param query_batch: IN 查询每批的ID数
+        :param on_scored: 写回后以本次重算的对比组ID集合调用, 如失效详情缓存
+        """
+        self.db_manager = db_manager
+        self.interval = interval
+        self.active_days = active_days
+        self.weights = weights
+        self.samples = samples
+        self.min_clicks = min_clicks
+        self.threshold = threshold
+        self.write_batch = write_batch
+        self.query_batch = query_batch
+        self.on_scored = on_scored
+
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stats = {'runs': 0, 'groups_scored': 0, 'rows_scored': 0, 'preferred': 0, 'errors': 0,
+                       'last_run_seconds': 0.0}
+
+    def _ensure_started(self):
+        # 线程在首次使用时启动, 避免 gunicorn preload 后 fork 丢失线程
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='winner-scorer', daemon=True)
+                self._thread.start()
+
+    def mark_dirty(self, material_ids):
+        """登记数据有变化的素材, 由后台线程重算它们所在的对比组"""
+        with self._lock:
+            self._dirty.update(material_ids)
+        self._ensure_started()
+
+    def _in_batches(self, values):
+        values = sorted(values)
+        for i in range(0, len(values), self.query_batch):
+            yield tuple(values[i:i + self.query_batch])
+
+    def groups_of(self, material_ids):
+        groups = set()
+        for batch in self._in_batches(material_ids):
+            rows = self.db_manager.fetch_all(
+                "SELECT DISTINCT comparison_group_id FROM material_comparison_groups "
+                "WHERE material_id IN %s AND created_at >= NOW() - INTERVAL %s DAY", (batch, self.active_days))
+            groups.update(row['comparison_group_id'] for row in rows)
+        return groups
+
+    def _load(self, group_ids):
+        columns = 'id, comparison_group_id, material_id, ' + ', '.join(METRIC_COLUMNS)
+        if group_ids is None:
+            return self.db_manager.fetch_all(
+                f"SELECT {columns} FROM material_comparison_groups "
+                "WHERE created_at >= NOW() - INTERVAL %s DAY ORDER BY comparison_group_id, id", (self.active_days,))
+        rows = []
+        # 批次按组ID排序, 拼接后同组的行仍相邻
+        for batch in self._in_batches(group_ids):
+            rows.extend(self.db_manager.fetch_all(
+                f"SELECT {columns} FROM material_comparison_groups "
+                "WHERE comparison_group_id IN %s ORDER BY comparison_group_id, id", (batch,)))
+        return rows
+
+    def run(self, group_ids=None):
+        """
+        重算对比组并写回评分和优选标记
+        :param group_ids: 对比组ID集合, None 表示所有活跃对比组
+        """
+        start = time.perf_counter()
+        rows = self._load(group_ids)
+        if not rows:
+            return {'groups': 0, 'rows': 0, 'preferred': 0, 'seconds': 0.0}
+        codes, last, code = [], None, -1
+        for row in rows:
+            if row['comparison_group_id'] != last:
+                last, code = row['comparison_group_id'], code + 1
+            codes.append(code)
+        counts = np.array([[row[column] or 0 for column in METRIC_COLUMNS] for row in rows], dtype=np.float64)
+        # gevent 模式下在原生线程中计算, 不阻塞处理请求的协程
+        scores = run_cpu_bound(score_groups, np.array(codes), counts, weights=self.weights, samples=self.samples,
+                               min_clicks=self.min_clicks, threshold=self.threshold)
+
+        data = [(row['id'], float(rate), float(win), float(p), bool(preferred))
+                for row, rate, win, p, preferred in zip(rows, scores['rate'], scores['win_probability'],
+                                                       scores['p_value'], scores['preferred'])]
+        for i in range(0, len(data), self.write_batch):
+            batch = data[i:i + self.write_batch]
+            self.db_manager.execute(save_scores_query(len(batch)), tuple(value for item in batch for value in item))
+        if self.on_scored:
+            try:
+                self.on_scored({row['comparison_group_id'] for row in rows})
+            except Exception as e:
+                print(f"winner scorer on_scored callback failed: {e}")
+
+        summary = {'groups': code + 1, 'rows': len(rows), 'preferred': int(scores['preferred'].sum()),
+                   'seconds': round(time.perf_counter() - start, 3)}
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['groups_scored'] += summary['groups']
+            self._stats['rows_scored'] += summary['rows']
+            self._stats['preferred'] += summary['preferred']
+            self._stats['last_run_seconds'] = summary['seconds']
+        return summary
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            if not dirty:
+                continue
+            try:
+                groups = self.groups_of(dirty)
+                if groups:
+                    self.run(groups)
+            except Exception as e:
+                print(f"winner scoring failed: {e}")
+                with self._lock:
+                    self._dirty.update(dirty)
+                    self._stats['errors'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['dirty'] = len(self._dirty)
+        return stats
+
+
+def scorer_from_env(db_manager, on_scored=None):
+    """按 SCORING_* 环境变量创建"""
+    return WinnerScorer(db_manager, on_scored=on_scored,
+                        interval=float(os.getenv("SCORING_INTERVAL", 30)),
+                        active_days=int(os.getenv("SCORING_ACTIVE_DAYS", 30)),
+                        weights=tuple(float(w) for w in os.getenv("SCORING_WEIGHTS", "1,0.5,1,2").split(',')),
+                        samples=int(os.getenv("SCORING_SAMPLES", 1000)),
+                        min_clicks=int(os.getenv("SCORING_MIN_CLICKS", 100)),
+                        threshold=float(os.getenv("SCORING_THRESHOLD", 0.95)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', help='逗号分隔的对比组ID, 默认所有活跃对比组')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from db.db import DBManager
+    from deployment.details_cache import details_cache_from_env
+    load_dotenv()
+    db_manager = DBManager(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT", 3306)),
+                           user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+                           database=os.getenv("DB_DATABASE"), pool_size=2)
+    try:
+        groups = set(args.groups.split(',')) if args.groups else None
+        scorer = scorer_from_env(db_manager, on_scored=details_cache_from_env().invalidate_groups)
+        print(json.dumps(scorer.run(groups)))
+    finally:
+        db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+gunicorn 配置: gunicorn -c gunicorn.conf.py app:app
+
+GUNICORN_WORKER_CLASS=gevent 时使用协程 worker, 每个 worker 可同时处理 GUNICORN_WORKER_CONNECTIONS 个请求,
+数据库、MinIO、OpenAI/Vidu 请求和 ffmpeg 子进程等待期间让出执行权; CPU 密集计算由 concurrency.run_cpu_bound
+放到原生线程池. 此时 DB_POOL_SIZE、HTTP_POOL_MAXSIZE、MINIO_MAX_CONNECTIONS 需按并发量调大.
+
+GUNICORN_PRELOAD=True 时应用在 master 中导入一次, worker 由 fork 得到, 启动和重启不再重复导入;
+GUNICORN_PRELOAD_MEDIA=True 时 master 在 fork 前还会导入 cv2/moviepy/openai 等媒体和大模型依赖,
+worker 首次处理视频请求时不再等待导入. 应用导入时不建立数据库、MinIO 连接, 后台线程在首次使用时启动,
+因此 fork 后不会共享连接或丢失线程; 视频任务恢复线程由 post_fork 在各 worker 中启动.
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", 4))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 60))
+preload_app = os.getenv("GUNICORN_PRELOAD", "False") == "True"
+
+if worker_class == 'gevent':
+    os.environ["GEVENT_MODE"] = "True"
+    if preload_app:
+        # preload 时应用在 master 中导入, 必须在此之前打补丁; 否则由 gevent worker 在 fork 后、导入应用前打补丁
+        from concurrency import patch_gevent
+        patch_gevent()
+
+
+def when_ready(server):
+    """master 启动完成、fork worker 之前调用"""
+    if preload_app and os.getenv("GUNICORN_PRELOAD_MEDIA", "False") == "True":
+        from utils import warm_imports
+        warm_imports()
+
+
+def post_fork(server, worker):
+    """worker fork 完成后调用; 非 preload 模式下由 create_app 启动恢复线程"""
+    if preload_app:
+        from api.api import job_manager
+        job_manager.start_recovery()
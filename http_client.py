@@ -0,0 +1,185 @@
+"""
+出站 HTTP 客户端: 所有对外请求(Vidu、图床、视频/图片下载)共用.
+
+- 按主机复用 keep-alive 连接池
+- 默认连接/读取超时, 避免上游挂起时占住 worker
+- 幂等请求(GET/HEAD 等)在连接错误和 5xx/429 时按指数退避重试
+- 按主机记录请求耗时直方图和错误数
+- AsyncHttpClient 为 asyncio 并发场景提供同样的能力(依赖 aiohttp)
+"""
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 耗时直方图的桶上限(秒)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class LatencyRecorder:
+    """按主机统计请求次数、错误数和耗时直方图"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def record(self, url, seconds, error=False):
+        host = urlsplit(url).netloc
+        with self._lock:
+            stat = self._hosts.get(host)
+            if stat is None:
+                stat = self._hosts[host] = {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0,
+                                            'buckets': [0] * len(LATENCY_BUCKETS)}
+            stat['count'] += 1
+            stat['total'] += seconds
+            stat['max'] = max(stat['max'], seconds)
+            if error:
+                stat['errors'] += 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stat['buckets'][i] += 1
+                    break
+
+    def stats(self):
+        with self._lock:
+            hosts = {host: dict(stat, buckets=list(stat['buckets'])) for host, stat in self._hosts.items()}
+        for stat in hosts.values():
+            stat['avg'] = round(stat['total'] / stat['count'], 4) if stat['count'] else 0.0
+            stat['histogram'] = {('+Inf' if bound == float('inf') else str(bound)): count
+                                 for bound, count in zip(LATENCY_BUCKETS, stat.pop('buckets'))}
+        return hosts
+
+
+class HttpClient:
+    """
+    同步客户端, 接口与 requests 一致(get/post/request), 额外提供默认超时和重试
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=60, retries=3, backoff_factor=0.3,
+                 pool_connections=32, pool_maxsize=32, recorder=None):
+        """
+        :param connect_timeout: 默认连接超时(秒)
+        :param read_timeout: 默认读取超时(秒)
+        :param retries: 幂等请求的最大重试次数
+        :param backoff_factor: 重试退避系数, 第 n 次重试前等待 backoff_factor * 2^(n-1) 秒
+        :param pool_connections: 缓存的主机连接池数量
+        :param pool_maxsize: 每个主机的最大连接数
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.recorder = recorder or LatencyRecorder()
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, raise_on_status=False,
+                      respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              max_retries=retry, pool_block=False)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(url, time.perf_counter() - start, error=True)
+            raise
+        self.recorder.record(url, time.perf_counter() - start, error=response.status_code >= 500)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        return self.recorder.stats()
+
+
+class AsyncHttpClient:
+    """
+    asyncio 客户端, 用于并发抓取等扇出场景; 需要在事件循环内创建和关闭
+
+    async with AsyncHttpClient() as client:
+        status, headers, body = await client.fetch('GET', url)
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=60, retries=3, backoff_factor=0.3,
+                 limit=100, limit_per_host=10, recorder=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.recorder = recorder or LatencyRecorder()
+        self._session = None
+
+    async def __aenter__(self):
+        import aiohttp
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host),
+            timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, method, url, retry=None, **kwargs):
+        """
+        发送请求并读取完整响应体
+        :param retry: 是否重试, 默认仅幂等方法重试
+        :return: (status, headers, body bytes)
+        """
+        import aiohttp
+        if retry is None:
+            retry = method.upper() in Retry.DEFAULT_ALLOWED_METHODS
+        attempts = self.retries + 1 if retry else 1
+        for attempt in range(attempts):
+            start = time.perf_counter()
+            try:
+                async with self._session.request(method, url, **kwargs) as response:
+                    body = await response.read()
+                    status, headers = response.status, response.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.recorder.record(url, time.perf_counter() - start, error=True)
+                if attempt == attempts - 1:
+                    raise
+            else:
+                self.recorder.record(url, time.perf_counter() - start, error=status >= 500)
+                if status not in RETRY_STATUSES or attempt == attempts - 1:
+                    return status, headers, body
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    def stats(self):
+        return self.recorder.stats()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """进程内共享的同步客户端, 超时和重试由 HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT / HTTP_RETRIES 配置"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient(connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", 5)),
+                                     read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", 60)),
+                                     retries=int(os.getenv("HTTP_RETRIES", 3)),
+                                     pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", 32)))
+    return _client
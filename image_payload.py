@@ -0,0 +1,121 @@
+"""
+多模态请求的图片预处理: 缩放、重新编码并挑选差异最大的若干帧, 减小请求体积和 token 消耗.
+PIL 在首次处理图片时导入.
+"""
+import base64
+import math
+import os
+import threading
+from io import BytesIO
+
+from concurrency import map_cpu_bound
+
+_FORMATS = {'jpeg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp')}
+
+_lock = threading.Lock()
+_totals = {'calls': 0, 'frames_in': 0, 'frames_out': 0, 'bytes_in': 0, 'bytes_out': 0,
+           'tokens_in': 0, 'tokens_out': 0}
+
+
+def estimate_image_tokens(width, height):
+    """按 OpenAI high detail 规则估算单张图片的 token: 缩放到 2048 内且短边 768, 每 512 切片 170, 另加 85"""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 170 * math.ceil(width / 512) * math.ceil(height / 512) + 85
+
+
+def _signature(image):
+    """16x16 灰度缩略图, 用于衡量帧间差异"""
+    return list(image.convert('L').resize((16, 16)).getdata())
+
+
+def _distance(a, b):
+    return sum(abs(x - y) for x, y in zip(a, b))
+
+
+def select_distinct(signatures, max_frames):
+    """
+    贪心选择彼此差异最大的帧(最远点采样), 返回按原顺序排列的下标
+    """
+    if len(signatures) <= max_frames:
+        return list(range(len(signatures)))
+    chosen = [0]
+    nearest = [_distance(signatures[0], s) for s in signatures]
+    while len(chosen) < max_frames:
+        index = max(range(len(signatures)), key=lambda i: nearest[i])
+        if nearest[index] == 0:
+            break
+        chosen.append(index)
+        nearest = [min(d, _distance(signatures[index], s)) for d, s in zip(nearest, signatures)]
+    return sorted(chosen)
+
+
+def _load(path):
+    """解码图片并计算差异签名, 返回 (图片, 文件大小, 签名)"""
+    from PIL import Image
+    with Image.open(path) as image:
+        image.load()
+        return image.copy(), os.path.getsize(path), _signature(image)
+
+
+def _encode(image, max_edge, image_format, quality):
+    from PIL import Image
+    image = image.convert('RGB')
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, format=_FORMATS[image_format][0], quality=quality)
+    return buffer.getvalue(), image.size
+
+
+def optimize_images(image_paths, max_edge=768, image_format='jpeg', quality=80, max_frames=8, workers=4):
+    """
+    缩放、重新编码并限制帧数
+    :return: (data_url 列表, 本次统计 dict)
+    """
+    if image_format not in _FORMATS:
+        raise ValueError(f'unsupported image format: {image_format}')
+    if not image_paths:
+        return [], {}
+    # 解码、签名和编码是 CPU 密集操作, gevent 模式下在原生线程池执行
+    loaded = map_cpu_bound(_load, image_paths, workers=workers)
+    indexes = select_distinct([signature for _, _, signature in loaded], max_frames)
+    encoded = map_cpu_bound(lambda i: _encode(loaded[i][0], max_edge, image_format, quality), indexes,
+                            workers=workers)
+
+    mime = _FORMATS[image_format][1]
+    data_urls = [f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}" for data, _ in encoded]
+    report = {
+        'frames_in': len(image_paths),
+        'frames_out': len(indexes),
+        'bytes_in': sum(size for _, size, _ in loaded),
+        'bytes_out': sum(len(data) for data, _ in encoded),
+        'tokens_in': sum(estimate_image_tokens(*image.size) for image, _, _ in loaded),
+        'tokens_out': sum(estimate_image_tokens(*size) for _, size in encoded),
+    }
+    report['bytes_saved'] = report['bytes_in'] - report['bytes_out']
+    report['tokens_saved'] = report['tokens_in'] - report['tokens_out']
+    with _lock:
+        _totals['calls'] += 1
+        for key in ('frames_in', 'frames_out', 'bytes_in', 'bytes_out', 'tokens_in', 'tokens_out'):
+            _totals[key] += report[key]
+    return data_urls, report
+
+
+def optimize_from_env(image_paths):
+    """按环境变量 IMAGE_MAX_EDGE / IMAGE_FORMAT / IMAGE_QUALITY / IMAGE_MAX_FRAMES 处理图片"""
+    return optimize_images(image_paths,
+                           max_edge=int(os.getenv("IMAGE_MAX_EDGE", 768)),
+                           image_format=os.getenv("IMAGE_FORMAT", "jpeg").lower(),
+                           quality=int(os.getenv("IMAGE_QUALITY", 80)),
+                           max_frames=int(os.getenv("IMAGE_MAX_FRAMES", 8)))
+
+
+def payload_stats():
+    """累计节省的字节数和估算 token"""
+    with _lock:
+        stats = dict(_totals)
+    stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+    stats['tokens_saved'] = stats['tokens_in'] - stats['tokens_out']
+    return stats
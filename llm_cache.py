@@ -0,0 +1,227 @@
+"""
+大模型响应缓存: 以模型名、渲染后的 prompt 和图片内容哈希为键, 相同请求直接返回上次的结果.
+
+后端可选:
+    memory  进程内 LRU
+    disk    本地目录, 每个键一个 JSON 文件, 多进程共享
+    mysql   llm_cache 表, 多机共享
+"""
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from ai_copy.media_cache import normalize_url
+
+
+def _file_digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def image_digest(image, image_mode):
+    """
+    图片内容哈希: 本地文件按内容, base64 按解码后的内容,
+    URL 按去掉签名参数后的地址(同 keyframe_cache.url_key), 同一对象重新签名后仍命中
+    """
+    if image_mode == 'local_path':
+        return _file_digest(image)
+    if image_mode == 'base64':
+        return hashlib.sha256(base64.b64decode(image)).hexdigest()
+    return hashlib.sha256(normalize_url(str(image)).encode('utf-8')).hexdigest()
+
+
+def make_key(model, prompt, images=(), image_mode='url', **options):
+    """生成缓存键, options 为影响结果的其他参数(如图片预处理配置)"""
+    payload = {
+        'model': model,
+        'prompt': prompt,
+        'images': [image_digest(image, image_mode) for image in images],
+        'options': options,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """进程内 LRU"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, model=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DiskBackend:
+    """本地目录, 写入先写临时文件再原子替换"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                item = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if item['expires_at'] < time.time():
+            self.delete(key)
+            return None
+        return item['value']
+
+    def set(self, key, value, ttl, model=None):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'value': value, 'model': model, 'expires_at': time.time() + ttl}, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+class MySQLBackend:
+    """llm_cache 表"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def get(self, key):
+        row = self.db_manager.fetch_one(
+            "SELECT response FROM llm_cache WHERE cache_key = %s AND expires_at > NOW()", (key,))
+        return json.loads(row['response']) if row else None
+
+    def set(self, key, value, ttl, model=None):
+        self.db_manager.execute(
+            "INSERT INTO llm_cache (cache_key, model, response, expires_at) "
+            "VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND) "
+            "ON DUPLICATE KEY UPDATE model = VALUES(model), response = VALUES(response), "
+            "expires_at = VALUES(expires_at)",
+            (key, model, json.dumps(value, ensure_ascii=False), int(ttl)))
+
+    def delete(self, key):
+        self.db_manager.execute("DELETE FROM llm_cache WHERE cache_key = %s", (key,))
+
+
+class LLMCache:
+    """
+    缓存门面: 统计命中率, 支持跳过(bypass)和强制刷新(refresh)
+    """
+
+    def __init__(self, backend, ttl=7 * 24 * 3600):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'bypass': 0, 'refresh': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key, refresh=False):
+        """返回缓存值, 未命中或 refresh 时返回 None; 后端异常不影响调用方"""
+        if refresh:
+            self._count('refresh')
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"llm cache get failed: {e}")
+            self._count('errors')
+            return None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value, model=None, ttl=None):
+        try:
+            self.backend.set(key, value, ttl if ttl is not None else self.ttl, model=model)
+        except Exception as e:
+            print(f"llm cache set failed: {e}")
+            self._count('errors')
+
+    def bypass(self):
+        self._count('bypass')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def create_cache(backend_name, db_manager=None):
+    """按名称创建缓存, backend_name 为 memory/disk/mysql/none"""
+    ttl = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+    if backend_name == 'none':
+        return None
+    if backend_name == 'disk':
+        root = os.getenv("LLM_CACHE_DIR") or os.path.join(tempfile.gettempdir(), 'adify_llm_cache')
+        return LLMCache(DiskBackend(root), ttl)
+    if backend_name == 'mysql':
+        if db_manager is None:
+            raise ValueError('mysql llm cache backend requires db_manager')
+        return LLMCache(MySQLBackend(db_manager), ttl)
+    return LLMCache(MemoryBackend(int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))), ttl)
+
+
+def configure_llm_cache(cache):
+    """替换进程内使用的缓存, 传入 None 关闭缓存"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def get_llm_cache():
+    """
+    当前缓存, 未配置时按 LLM_CACHE_BACKEND 创建;
+    mysql 需由进程通过 configure_llm_cache 配置(API 进程见 api.api, 任务进程见 ai_copy.jobs._init_worker),
+    未配置时退回进程内缓存
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend_name = os.getenv("LLM_CACHE_BACKEND", "memory")
+                _cache = create_cache('memory' if backend_name == 'mysql' else backend_name)
+    return _cache
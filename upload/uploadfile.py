@@ -1,22 +1,44 @@
 import os
 import time
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from flask import jsonify
-from minio import Minio
 from werkzeug.utils import secure_filename
 from mimetypes import guess_type
 from datetime import timedelta
 
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 multipart 最小分片
+
+
 class MinioUploader:
-    def __init__(self, bucket_name):
+    def __init__(self, bucket_name, part_size=None, parallel_uploads=None, max_connections=None):
         """
         初始化Minio客户端和存储桶
         :param bucket_name: 存储桶名称
+        :param part_size: multipart 分片大小(字节), 默认取 MINIO_PART_SIZE 或 16MB
+        :param parallel_uploads: 单个对象并发上传的分片数, 默认取 MINIO_PARALLEL_UPLOADS 或 4
+        :param max_connections: 共享连接池大小, 默认取 MINIO_MAX_CONNECTIONS 或 32
         """
+        # minio/urllib3 在创建上传器时才导入, 不上传文件的进程不加载
+        from minio import Minio
+        import urllib3
+        self.part_size = max(MIN_PART_SIZE, int(part_size or os.getenv("MINIO_PART_SIZE", 16 * 1024 * 1024)))
+        self.parallel_uploads = int(parallel_uploads or os.getenv("MINIO_PARALLEL_UPLOADS", 4))
+        max_connections = int(max_connections or os.getenv("MINIO_MAX_CONNECTIONS", 32))
+        # 所有上传共用一个 keep-alive 连接池, 批量和分片并发上传时复用连接
+        http_client = urllib3.PoolManager(
+            maxsize=max_connections,
+            block=True,
+            timeout=urllib3.Timeout(connect=10, read=300),
+            retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+        )
         self.minio_client = Minio(
             endpoint=os.getenv("MINIO_ENDPOINT"),  # MinIO服务器地址
             access_key=os.getenv("MINIO_ACCESS_KEY"),  # Access Key
             secret_key=os.getenv("MINIO_SECRET_KEY"),  # Secret Key
-            secure=os.getenv("MINIO_SECURE") == "True"  # 如果使用HTTPS，设置为True
+            secure=os.getenv("MINIO_SECURE") == "True",  # 如果使用HTTPS，设置为True
+            http_client=http_client
         )
         self.bucket_name = bucket_name
         self._ensure_bucket_exists()
@@ -31,35 +53,116 @@ class MinioUploader:
         else:
             print(f"Bucket '{self.bucket_name}' already exists.")
 
+    @staticmethod
+    def _object_name(filename):
+        # 同一秒内上传同名文件(如同一视频以不同参数提取的关键帧)时用随机串区分, 避免互相覆盖
+        timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime(time.time()))
+        return timestamp + '-' + uuid.uuid4().hex[:12] + '-' + secure_filename(filename)
+
+    @staticmethod
+    def _content_type(filename):
+        content_type, _ = guess_type(filename)
+        return content_type or "application/octet-stream"  # 默认类型
+
+    def _result(self, object_name):
+        """生成对象的代理地址和 Presigned URL"""
+        expires = timedelta(days=7)
+        presigned_url = self.minio_client.presigned_get_object(self.bucket_name, object_name, expires=expires)
+        minio_url = os.getenv("MINIO_ENDPOINT_PROXY") + "/" + self.bucket_name + "/" + object_name
+        return {"url": minio_url, "preview_url": presigned_url, "object_name": object_name}
+
+    @staticmethod
+    def _stream_length(stream):
+        """可 seek 的流返回剩余长度, 否则返回 -1 (按分片流式上传)"""
+        try:
+            if not stream.seekable():
+                return -1
+            start = stream.tell()
+            end = stream.seek(0, os.SEEK_END)
+            stream.seek(start)
+            return end - start
+        except (AttributeError, OSError, ValueError):
+            return -1
+
+    def upload_stream(self, stream, filename, length=-1, content_type=None, part_size=None):
+        """
+        将可读流直接写入MinIO, 不落地临时文件
+        大于一个分片的数据走 multipart, 分片并发上传
+        :param stream: 具有 read() 的文件对象
+        :param filename: 原始文件名, 用于生成对象名和推断类型
+        :param length: 数据长度, 未知时传 -1
+        :return: dict(url, preview_url, object_name)
+        """
+        object_name = self._object_name(filename)
+        if length is None or length < 0:
+            length = self._stream_length(stream)
+        self.minio_client.put_object(
+            self.bucket_name, object_name, stream, length,
+            content_type=content_type or self._content_type(filename),
+            part_size=max(MIN_PART_SIZE, part_size or self.part_size),
+            num_parallel_uploads=self.parallel_uploads)
+        return self._result(object_name)
+
+    def upload_path(self, file_path, filename=None, content_type=None):
+        """
+        上传本地文件
+        :return: dict(url, preview_url, object_name)
+        """
+        filename = filename or os.path.basename(file_path)
+        object_name = self._object_name(filename)
+        self.minio_client.fput_object(
+            self.bucket_name, object_name, file_path,
+            content_type=content_type or self._content_type(filename),
+            part_size=self.part_size,
+            num_parallel_uploads=self.parallel_uploads)
+        return self._result(object_name)
+
+    def upload_files(self, file_paths, max_workers=8):
+        """
+        并发上传多个本地文件(关键帧、不同清晰度的视频等)
+        :param file_paths: 本地路径列表
+        :return: 与输入顺序一致的 dict(url, preview_url, object_name) 列表
+        """
+        if not file_paths:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+            return list(executor.map(self.upload_path, file_paths))
+
+    def upload_directory(self, dir_path, max_workers=8):
+        """
+        并发上传目录下的所有文件, 结果按文件名排序(关键帧即按场景顺序)
+        :return: dict(url, preview_url, object_name) 列表
+        """
+        file_paths = [os.path.join(dir_path, name) for name in sorted(os.listdir(dir_path))]
+        return self.upload_files(file_paths, max_workers=max_workers)
+
     def upload_file(self, file):
         """
         上传文件到MinIO并生成Presigned URL
         :param file: 上传的文件对象
         :return: JSON响应
         """
-        # 保存文件到MinIO
-        timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime(time.time()))
-        filename = timestamp + '-' + secure_filename(file.filename)
-        file_path = os.path.join("/tmp", filename)  # 临时保存文件
-        file.save(file_path)
-
-        # 获取文件的MIME类型
-        content_type, _ = guess_type(file.filename)
-        if not content_type:
-            content_type = "application/octet-stream"  # 默认类型
-        print(f"获取到的content_type: {content_type}")
-
         try:
-            # 上传到MinIO
-            self.minio_client.fput_object(self.bucket_name, filename, file_path, content_type=content_type)
-
-            # 生成Presigned URL
-            expires = timedelta(days=7)
-            presigned_url = self.minio_client.presigned_get_object(self.bucket_name, filename, expires=expires)
-            print(f"Presigned URL for {filename}: {presigned_url}")
-            minio_url = os.getenv("MINIO_ENDPOINT_PROXY") + "/" + self.bucket_name + "/" + filename
-            return jsonify({"message": "File uploaded successfully", "url": minio_url, "preview_url": presigned_url})
+            # 直接读取请求中的文件流上传到MinIO
+            result = self.upload_stream(file.stream, file.filename, length=file.content_length or -1)
+            print(f"Presigned URL for {result['object_name']}: {result['preview_url']}")
+            return jsonify({"message": "File uploaded successfully", "url": result["url"],
+                            "preview_url": result["preview_url"]})
         except Exception as e:
             return jsonify({"error": str(e)}), 500
-        finally:
-            os.remove(file_path)  # 删除临时文件
\ No newline at end of file
+
+
+_uploader = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader():
+    """
+    进程内共享的上传器, 不依赖 Flask 应用上下文, 后台任务和接口共用同一个连接池
+    """
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                _uploader = MinioUploader(os.getenv("BUCKET_NAME"))
+    return _uploader